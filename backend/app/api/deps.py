@@ -0,0 +1,110 @@
+import hmac
+import math
+from collections.abc import AsyncIterator
+
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.auth import AuthError, authenticator
+from app.core.config import settings
+from app.core.db import ShardRouter, UserMoving, get_shards
+from app.core.ratelimit import rate_limiter
+
+
+async def _request_field(request: Request, name: str):
+    value = request.query_params.get(name)
+    if value is None:
+        # FastAPI has already parsed the body by the time dependencies run, so these are cached reads.
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            body = await request.json()
+            value = body.get(name) if isinstance(body, dict) else None
+        elif content_type.startswith("multipart/form-data"):
+            value = (await request.form()).get(name)
+    return value
+
+
+def _as_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _client_key(request: Request) -> str:
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def current_user(request: Request, authorization: str = Header("")) -> int:
+    # The Telegram user behind the request's session token (see POST /api/auth/session).
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        user_id = authenticator.authenticate(token)
+    except AuthError as exc:
+        raise HTTPException(status_code=401, detail=str(exc), headers={"WWW-Authenticate": "Bearer"}) from exc
+    request.state.user_id = user_id
+    return user_id
+
+
+def rate_limit(route_class: str):
+    async def dependency(request: Request) -> None:
+        wait = await rate_limiter.check(route_class, _client_key(request))
+        if wait > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+    return dependency
+
+
+def admin_token_valid(token: str) -> bool:
+    # Admin access stays closed until ADMIN_TOKEN is configured.
+    return bool(settings.admin_token) and hmac.compare_digest(token, settings.admin_token)
+
+
+async def require_admin(x_admin_token: str = Header("")) -> None:
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+async def primary_session(shards: ShardRouter = Depends(get_shards)) -> AsyncIterator[AsyncSession]:
+    async with shards.primary() as session:
+        yield session
+
+
+def shard_session(id_field: str | None = None):
+    # Opens a session on the shard holding the request's data: the signed-in user's shard, or the
+    # shard of the id in path parameter `id_field` (or of the first id when that names a body list).
+    async def dependency(
+        request: Request, shards: ShardRouter = Depends(get_shards), user_id: int = Depends(current_user)
+    ) -> AsyncIterator[AsyncSession]:
+        try:
+            # Resolved for id-routed requests too: it refuses users whose data is being moved.
+            shard = await shards.shard_for_user(user_id)
+        except UserMoving as exc:
+            raise HTTPException(
+                status_code=503, detail=str(exc), headers={"Retry-After": str(math.ceil(exc.retry_after))}
+            ) from exc
+        if id_field is not None:
+            value = request.path_params.get(id_field)
+            if value is None:
+                value = await _request_field(request, id_field)
+                value = value[0] if isinstance(value, list) and value else None
+            object_id = _as_int(value)
+            if object_id is not None:
+                shard = shards.shard_for_object(object_id)
+        async with shards.session(shard) as session:
+            yield session
+
+    return dependency
+
+
+user_session = shard_session()
+protocol_session = shard_session("protocol_id")
@@ -0,0 +1,15 @@
+import math
+
+from fastapi import HTTPException
+
+from app.services.upstream import UpstreamError, UpstreamUnavailable
+
+
+def upstream_http_error(exc: UpstreamError) -> HTTPException:
+    if isinstance(exc, UpstreamUnavailable):
+        return HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        )
+    return HTTPException(status_code=502, detail=str(exc))
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import AsyncIterator, Callable, Coroutine
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.types import Receive, Scope, Send
+
+from app.core.auth import AuthError, authenticator
+from app.core.idempotency import StoredResponse, idempotency_store
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Long enough for a from-audio pipeline; a duplicate still waiting after this gets a 409.
+WAIT_TIMEOUT = 120.0
+
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data") and "boundary=" in content_type:
+        # Clients pick a fresh multipart boundary per attempt; it must not make a retry look new.
+        boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip('"')
+        body = body.replace(boundary.encode(), b"")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _replay(stored: StoredResponse) -> Response:
+    response = Response(content=stored.body, status_code=stored.status_code)
+    response.raw_headers = [(k.encode(), v.encode()) for k, v in stored.headers]
+    response.headers["Content-Length"] = str(len(stored.body))
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _stored_headers(response: Response) -> list[tuple[str, str]]:
+    return [(k.decode(), v.decode()) for k, v in response.raw_headers if k.lower() != b"content-length"]
+
+
+def _caller(request: Request) -> str | None:
+    # Keys are scoped to the signed-in user, so one user's stored response is never replayed to
+    # another. A bad token returns None and the request goes straight to the endpoint's 401.
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    try:
+        return f"user:{authenticator.authenticate(token)}"
+    except AuthError:
+        return None
+
+
+def _is_final(status_code: int) -> bool:
+    # Server errors and rate limiting are worth retrying, so they are not pinned to the key.
+    return status_code < 500 and status_code != 429
+
+
+def _stream_status(response: StreamingResponse, body: bytes) -> int:
+    # NDJSON pipelines report a failure in-band, as a closing {"event": "error", "status": ...}
+    # line sent after the 200; that status decides whether the stream is pinned.
+    if response.media_type != "application/x-ndjson":
+        return response.status_code
+    try:
+        event = json.loads(body.rstrip().rpartition(b"\n")[2])
+    except ValueError:
+        return response.status_code
+    if isinstance(event, dict) and event.get("event") == "error" and isinstance(event.get("status"), int):
+        return event["status"]
+    return response.status_code
+
+
+# Serves POSTs that carry an Idempotency-Key: the first response is stored and replayed for
+# retries without running the endpoint again; duplicates arriving meanwhile wait for it.
+class IdempotentRoute(APIRoute):
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            caller = _caller(request)
+            if request.method != "POST" or not key or caller is None:
+                return await original(request)
+            body = await request.body()
+            fingerprint = _fingerprint(request, body)
+            store_key = f"{caller}:{request.url.path}:{key}"
+
+            while True:
+                stored = await idempotency_store.get(store_key)
+                if stored is not None:
+                    if stored.fingerprint != fingerprint:
+                        return JSONResponse(
+                            status_code=422,
+                            content={"detail": f"{IDEMPOTENCY_HEADER} was reused with a different request"},
+                        )
+                    idempotency_store.replayed += 1
+                    return _replay(stored)
+                inflight = idempotency_store.claim(store_key)
+                if inflight is None:
+                    break
+                try:
+                    await asyncio.wait_for(inflight.wait(), timeout=WAIT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return JSONResponse(
+                        status_code=409,
+                        content={"detail": "A request with this idempotency key is still in progress"},
+                        headers={"Retry-After": "5"},
+                    )
+
+            try:
+                response = await original(request)
+            except BaseException:
+                idempotency_store.release(store_key)
+                raise
+            if not _is_final(response.status_code):
+                idempotency_store.release(store_key)
+                return response
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _record_stream(response, response.body_iterator, store_key, fingerprint)
+                return _ReleasingResponse(response, store_key)
+            try:
+                stored = StoredResponse(fingerprint, response.status_code, _stored_headers(response), response.body)
+                await idempotency_store.save(store_key, stored)
+            finally:
+                idempotency_store.release(store_key)
+            return response
+
+        return handler
+
+
+class _ReleasingResponse(Response):
+    # Sends a streamed response, then releases its key however sending ended. The body iterator's own
+    # cleanup is not enough: a client gone before the body was first iterated never runs it.
+    def __init__(self, response: StreamingResponse, store_key: str) -> None:
+        self.response = response
+        self.store_key = store_key
+        # Class defaults on Response would otherwise shadow the wrapped response's values.
+        self.media_type, self.charset = response.media_type, response.charset
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.response, name)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            idempotency_store.release(self.store_key)
+
+
+async def _record_stream(
+    response: StreamingResponse, body: AsyncIterator[bytes | str], store_key: str, fingerprint: str
+) -> AsyncIterator[bytes]:
+    # Streams through unchanged and stores the whole body once it completes; an interrupted
+    # stream or one that ended in a retryable error stores nothing, so a retry runs the endpoint again.
+    chunks: list[bytes] = []
+    async for chunk in body:
+        chunk = chunk if isinstance(chunk, bytes) else chunk.encode(response.charset)
+        chunks.append(chunk)
+        yield chunk
+    content = b"".join(chunks)
+    if _is_final(_stream_status(response, content)):
+        await idempotency_store.save(
+            store_key, StoredResponse(fingerprint, response.status_code, _stored_headers(response), content)
+        )
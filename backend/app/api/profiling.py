@@ -0,0 +1,38 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.deps import admin_token_valid
+from app.core.profiling import ProfileTrigger, profile_trigger
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+class ProfilingMiddleware:
+    # Profiles a request when an admin asks with "X-Profile: 1" plus X-Admin-Token, or when it is
+    # picked by PROFILE_SAMPLE_RATE. Plain ASGI so the app runs in the request's own task, the one
+    # the profiler attributes samples to.
+    def __init__(self, app: ASGIApp, trigger: ProfileTrigger = profile_trigger) -> None:
+        self.app = app
+        self.trigger = trigger
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = self.trigger.begin(f"{scope['method']} {scope['path']}")
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            await self.trigger.finish(profile)
+
+    def _wanted(self, scope: Scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER) == b"1":
+            return admin_token_valid(headers.get(b"x-admin-token", b"").decode("latin-1"))
+        return self.trigger.sampled()
@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from pydantic import BaseModel
 
+from app.api.deps import current_user, rate_limit
+from app.api.errors import upstream_http_error
 from app.core.config import settings
 from app.services.transcribe import transcribe_audio
+from app.services.upstream import UpstreamError
 
 
-router = APIRouter(prefix="/audio", tags=["audio"])
+router = APIRouter(prefix="/audio", tags=["audio"], dependencies=[Depends(current_user)])
 
 
 class TranscriptionResponse(BaseModel):
     text: str
 
 
-@router.post("/transcribe")
+@router.post("/transcribe", dependencies=[Depends(rate_limit("llm"))])
 async def transcribe(file: UploadFile = File(...)) -> TranscriptionResponse:
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY is not set")
@@ -20,6 +23,8 @@ async def transcribe(file: UploadFile = File(...)) -> TranscriptionResponse:
         raise HTTPException(status_code=400, detail="No file provided")
     try:
         text = await transcribe_audio(file)
+    except UpstreamError as exc:
+        raise upstream_http_error(exc) from exc
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     return TranscriptionResponse(text=text)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from app.core.auth import AuthError, authenticator
+from app.core.config import settings
+
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+
+class SessionRequest(BaseModel):
+    init_data: str | None = None
+    # Only honoured with AUTH_DEV_LOGIN=1.
+    user_id: int | None = None
+
+
+class SessionOut(BaseModel):
+    token: str
+    user_id: int
+    expires_at: int
+
+
+@router.post("/session")
+async def create_session(payload: SessionRequest) -> SessionOut:
+    try:
+        if payload.init_data:
+            session = authenticator.login(payload.init_data)
+        elif settings.auth_dev_login and payload.user_id is not None:
+            session = authenticator.issue(payload.user_id)
+        else:
+            raise AuthError("initData is required")
+    except AuthError as exc:
+        raise HTTPException(status_code=401, detail=str(exc)) from exc
+    return SessionOut(
+        token=session.token, user_id=session.identity.user_id, expires_at=int(session.identity.expires_at)
+    )
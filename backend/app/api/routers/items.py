@@ -2,14 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_session
+from app.api.deps import current_user, protocol_session, rate_limit, shard_session
+from app.api.errors import upstream_http_error
+from app.api.idempotency import IdempotentRoute
 from app.services.parser import ProtocolParser
 from app.services.items import ItemService
-from app.storage.repositories import ItemRepository
+from app.services.upstream import UpstreamError
 
 
-router = APIRouter(prefix="/items", tags=["items"])
-protocol_items_router = APIRouter(prefix="/protocols", tags=["items"])
+router = APIRouter(
+    prefix="/items", tags=["items"], route_class=IdempotentRoute, dependencies=[Depends(current_user)]
+)
+protocol_items_router = APIRouter(
+    prefix="/protocols", tags=["items"], route_class=IdempotentRoute, dependencies=[Depends(current_user)]
+)
+item_session = shard_session("item_id")
 
 
 class ItemOut(BaseModel):
@@ -39,53 +46,79 @@ class QuickItemsResponse(BaseModel):
 
 
 @protocol_items_router.get("/{protocol_id}/items")
-async def list_items(protocol_id: int, session: AsyncSession = Depends(get_session)) -> list[ItemOut]:
+async def list_items(
+    protocol_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(protocol_session)
+) -> list[ItemOut]:
     service = ItemService(session)
-    items = await service.list(protocol_id)
+    items = await service.list(user_id, protocol_id)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
     return [ItemOut(id=i.id, title=i.title, order_index=i.order_index) for i in items]
 
 
-@protocol_items_router.post("/{protocol_id}/items")
-async def create_item(protocol_id: int, payload: ItemCreate, session: AsyncSession = Depends(get_session)) -> ItemOut:
+@protocol_items_router.post("/{protocol_id}/items", dependencies=[Depends(rate_limit("write"))])
+async def create_item(
+    protocol_id: int,
+    payload: ItemCreate,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(protocol_session),
+) -> ItemOut:
     service = ItemService(session)
-    created = await service.create(protocol_id, payload.title)
+    created = await service.create(user_id, protocol_id, payload.title)
+    if created is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
     return ItemOut(id=created.id, title=created.title, order_index=created.order_index)
 
 
-@protocol_items_router.post("/{protocol_id}/items/quick-create")
+@protocol_items_router.post("/{protocol_id}/items/quick-create", dependencies=[Depends(rate_limit("llm"))])
 async def quick_create_items(
-    protocol_id: int, payload: QuickItemsRequest, session: AsyncSession = Depends(get_session)
+    protocol_id: int,
+    payload: QuickItemsRequest,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(protocol_session),
 ) -> QuickItemsResponse:
     parser = ProtocolParser()
     try:
         parsed = await parser.parse_items(payload.text)
+    except UpstreamError as exc:
+        raise upstream_http_error(exc) from exc
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=422, detail={"error": str(exc), "text": payload.text}) from exc
 
-    repo = ItemRepository(session)
-    existing = await repo.list(protocol_id)
-    start_index = len(existing)
-    created_items = []
-    for offset, title in enumerate(parsed.items):
-        item = await repo.create(protocol_id, title, start_index + offset)
-        created_items.append(ItemOut(id=item.id, title=item.title, order_index=item.order_index))
-    await session.commit()
-    return QuickItemsResponse(items=created_items)
+    service = ItemService(session)
+    created = await service.append_many(user_id, protocol_id, parsed.items)
+    if created is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
+    return QuickItemsResponse(items=[ItemOut(id=i.id, title=i.title, order_index=i.order_index) for i in created])
 
 
 @router.patch("/{item_id}")
-async def rename_item(item_id: int, payload: ItemRename, session: AsyncSession = Depends(get_session)) -> None:
+async def rename_item(
+    item_id: int,
+    payload: ItemRename,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(item_session),
+) -> None:
     service = ItemService(session)
-    await service.rename(item_id, payload.title)
+    if not await service.rename(user_id, item_id, payload.title):
+        raise HTTPException(status_code=404, detail="Item not found")
 
 
 @router.delete("/{item_id}")
-async def delete_item(item_id: int, session: AsyncSession = Depends(get_session)) -> None:
+async def delete_item(
+    item_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(item_session)
+) -> None:
     service = ItemService(session)
-    await service.delete(item_id)
+    if not await service.delete(user_id, item_id):
+        raise HTTPException(status_code=404, detail="Item not found")
 
 
-@router.post("/reorder")
-async def reorder_items(payload: ReorderRequest, session: AsyncSession = Depends(get_session)) -> None:
+@router.post("/reorder", dependencies=[Depends(rate_limit("write"))])
+async def reorder_items(
+    payload: ReorderRequest,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(shard_session("ordered_ids")),
+) -> None:
     service = ItemService(session)
-    await service.reorder(payload.ordered_ids)
+    if not await service.reorder(user_id, payload.ordered_ids):
+        raise HTTPException(status_code=404, detail="Item not found")
@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_session
+from app.api.deps import current_user, protocol_session, rate_limit, shard_session, user_session
+from app.api.errors import upstream_http_error
+from app.api.idempotency import IdempotentRoute
+from app.core.config import settings
+from app.core.db import ShardRouter, UserMoving, get_shards
 from app.services.parser import ProtocolParser
 from app.services.protocols import ProtocolService
-from app.storage.repositories import ItemRepository, ProtocolRepository, UserRepository
+from app.services.transcribe import transcribe_bytes
+from app.services.upstream import UpstreamError
 from app.api.routers.items import ItemOut
 
+logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/protocols", tags=["protocols"])
+router = APIRouter(
+    prefix="/protocols", tags=["protocols"], route_class=IdempotentRoute, dependencies=[Depends(current_user)]
+)
 
 
 class ProtocolOut(BaseModel):
@@ -18,8 +32,16 @@ class ProtocolOut(BaseModel):
     order_index: int
 
 
+class ProtocolOverviewOut(BaseModel):
+    id: int
+    title: str
+    order_index: int
+    item_count: int
+    checked_count: int
+    last_activity_at: datetime | None
+
+
 class ProtocolCreate(BaseModel):
-    user_id: int
     title: str
 
 
@@ -31,8 +53,11 @@ class ReorderRequest(BaseModel):
     ordered_ids: list[int]
 
 
+class CloneRequest(BaseModel):
+    title: str | None = None
+
+
 class QuickCreateRequest(BaseModel):
-    user_id: int
     text: str
 
 
@@ -42,60 +67,156 @@ class QuickCreateResponse(BaseModel):
 
 
 @router.get("/")
-async def list_protocols(user_id: int, session: AsyncSession = Depends(get_session)) -> list[ProtocolOut]:
+async def list_protocols(
+    user_id: int = Depends(current_user), session: AsyncSession = Depends(user_session)
+) -> list[ProtocolOut]:
     service = ProtocolService(session)
     items = await service.list(user_id)
     return [ProtocolOut(id=p.id, title=p.title, order_index=p.order_index) for p in items]
 
 
-@router.post("/")
-async def create_protocol(payload: ProtocolCreate, session: AsyncSession = Depends(get_session)) -> ProtocolOut:
+@router.get("/overview")
+async def protocols_overview(
+    user_id: int = Depends(current_user), session: AsyncSession = Depends(user_session)
+) -> list[ProtocolOverviewOut]:
+    service = ProtocolService(session)
+    rows = await service.overview(user_id)
+    return [
+        ProtocolOverviewOut(
+            id=r.id,
+            title=r.title,
+            order_index=r.order_index,
+            item_count=r.item_count,
+            checked_count=r.checked_count,
+            last_activity_at=r.last_activity_at,
+        )
+        for r in rows
+    ]
+
+
+@router.post("/", dependencies=[Depends(rate_limit("write"))])
+async def create_protocol(
+    payload: ProtocolCreate, user_id: int = Depends(current_user), session: AsyncSession = Depends(user_session)
+) -> ProtocolOut:
     service = ProtocolService(session)
-    created = await service.create(payload.user_id, payload.title)
+    created = await service.create(user_id, payload.title)
     return ProtocolOut(id=created.id, title=created.title, order_index=created.order_index)
 
 
-@router.post("/quick-create")
-async def quick_create(payload: QuickCreateRequest, session: AsyncSession = Depends(get_session)) -> QuickCreateResponse:
+@router.post("/quick-create", dependencies=[Depends(rate_limit("llm"))])
+async def quick_create(
+    payload: QuickCreateRequest, user_id: int = Depends(current_user), session: AsyncSession = Depends(user_session)
+) -> QuickCreateResponse:
     try:
         parser = ProtocolParser()
         parsed = await parser.parse_protocol(payload.text)
+    except UpstreamError as exc:
+        raise upstream_http_error(exc) from exc
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=422, detail={"error": str(exc), "text": payload.text}) from exc
 
-    protocol_repo = ProtocolRepository(session)
-    user_repo = UserRepository(session)
-    item_repo = ItemRepository(session)
-
-    await user_repo.ensure(payload.user_id)
-    protocols = await protocol_repo.list(payload.user_id)
-    protocol = await protocol_repo.create(payload.user_id, parsed.title, len(protocols))
-
-    created_items = []
-    for index, title in enumerate(parsed.items):
-        item = await item_repo.create(protocol.id, title, index)
-        created_items.append(ItemOut(id=item.id, title=item.title, order_index=item.order_index))
-
-    await session.commit()
+    service = ProtocolService(session)
+    protocol, items = await service.quick_create(user_id, parsed.title, parsed.items)
     return QuickCreateResponse(
         protocol=ProtocolOut(id=protocol.id, title=protocol.title, order_index=protocol.order_index),
-        items=created_items,
+        items=[ItemOut(id=i.id, title=i.title, order_index=i.order_index) for i in items],
     )
 
 
+def _event(name: str, **payload) -> bytes:
+    return (json.dumps({"event": name, **payload}, ensure_ascii=False) + "\n").encode()
+
+
+@router.post("/from-audio", dependencies=[Depends(rate_limit("llm"))])
+async def create_from_audio(
+    file: UploadFile = File(...), user_id: int = Depends(current_user), shards: ShardRouter = Depends(get_shards)
+) -> StreamingResponse:
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY is not set")
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    # Read the upload before streaming starts; the form is closed once the handler returns.
+    filename, content, content_type = file.filename, await file.read(), file.content_type
+
+    async def pipeline() -> AsyncIterator[bytes]:
+        try:
+            text = await transcribe_bytes(filename, content, content_type)
+            yield _event("transcribed", text=text)
+            parsed = await ProtocolParser().parse_protocol(text)
+            yield _event("parsed", title=parsed.title, items=parsed.items)
+            async with shards.session_for_user(user_id) as session:
+                protocol, items = await ProtocolService(session).quick_create(user_id, parsed.title, parsed.items)
+            yield _event(
+                "created",
+                protocol=ProtocolOut(id=protocol.id, title=protocol.title, order_index=protocol.order_index).model_dump(),
+                items=[ItemOut(id=i.id, title=i.title, order_index=i.order_index).model_dump() for i in items],
+            )
+        except UpstreamError as exc:
+            error = upstream_http_error(exc)
+            yield _event("error", status=error.status_code, detail=error.detail)
+        except UserMoving as exc:
+            yield _event("error", status=503, detail=str(exc))
+        except ValueError as exc:
+            # The transcript could not be parsed into a protocol.
+            yield _event("error", status=422, detail=str(exc))
+        except Exception as exc:  # noqa: BLE001
+            # Anything else is on our side; a 500 is not stored for the Idempotency-Key, so a retry reruns.
+            logger.exception("from-audio pipeline failed")
+            yield _event("error", status=500, detail=str(exc))
+
+    return StreamingResponse(pipeline(), media_type="application/x-ndjson")
+
+
 @router.patch("/{protocol_id}")
-async def rename_protocol(protocol_id: int, payload: ProtocolRename, session: AsyncSession = Depends(get_session)) -> None:
+async def rename_protocol(
+    protocol_id: int,
+    payload: ProtocolRename,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(protocol_session),
+) -> None:
     service = ProtocolService(session)
-    await service.rename(protocol_id, payload.title)
+    if not await service.rename(user_id, protocol_id, payload.title):
+        raise HTTPException(status_code=404, detail="Protocol not found")
 
 
 @router.delete("/{protocol_id}")
-async def delete_protocol(protocol_id: int, session: AsyncSession = Depends(get_session)) -> None:
+async def delete_protocol(
+    protocol_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(protocol_session)
+) -> None:
+    service = ProtocolService(session)
+    if not await service.delete(user_id, protocol_id):
+        raise HTTPException(status_code=404, detail="Protocol not found")
+
+
+@router.post("/{protocol_id}/clone", dependencies=[Depends(rate_limit("write"))])
+async def clone_protocol(
+    protocol_id: int,
+    payload: CloneRequest,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(protocol_session),
+) -> ProtocolOut:
+    service = ProtocolService(session)
+    cloned = await service.clone(protocol_id, user_id, payload.title)
+    if cloned is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
+    return ProtocolOut(id=cloned.id, title=cloned.title, order_index=cloned.order_index)
+
+
+@router.post("/{protocol_id}/restore")
+async def restore_protocol(
+    protocol_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(protocol_session)
+) -> None:
     service = ProtocolService(session)
-    await service.delete(protocol_id)
+    if not await service.restore(user_id, protocol_id):
+        raise HTTPException(status_code=404, detail="Protocol cannot be restored")
 
 
-@router.post("/reorder")
-async def reorder_protocols(payload: ReorderRequest, session: AsyncSession = Depends(get_session)) -> None:
+@router.post("/reorder", dependencies=[Depends(rate_limit("write"))])
+async def reorder_protocols(
+    payload: ReorderRequest,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(shard_session("ordered_ids")),
+) -> None:
     service = ProtocolService(session)
-    await service.reorder(payload.ordered_ids)
+    if not await service.reorder(user_id, payload.ordered_ids):
+        raise HTTPException(status_code=404, detail="Protocol not found")
@@ -0,0 +1,160 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, field_validator
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import current_user, protocol_session, rate_limit, shard_session
+from app.api.idempotency import IdempotentRoute
+from app.services.schedules import ScheduleService, next_occurrence
+
+
+router = APIRouter(prefix="/schedules", tags=["schedules"], dependencies=[Depends(current_user)])
+protocol_schedules_router = APIRouter(
+    prefix="/protocols", tags=["schedules"], route_class=IdempotentRoute, dependencies=[Depends(current_user)]
+)
+schedule_session = shard_session("schedule_id")
+
+
+class ScheduleOut(BaseModel):
+    id: int
+    protocol_id: int
+    time: str
+    weekdays: list[int]
+    timezone: str
+    enabled: bool
+    next_run_at: datetime | None
+
+
+class ScheduleFields(BaseModel):
+    # Weekdays are 0 (Monday) to 6 (Sunday); time is local "HH:MM" in the given IANA timezone.
+    time: str | None = None
+    weekdays: list[int] | None = None
+    timezone: str | None = None
+
+    @field_validator("time")
+    @classmethod
+    def _check_time(cls, value: str | None) -> str | None:
+        if value is not None:
+            datetime.strptime(value, "%H:%M")
+        return value
+
+    @field_validator("weekdays")
+    @classmethod
+    def _check_weekdays(cls, value: list[int] | None) -> list[int] | None:
+        if value is not None and (not value or any(day not in range(7) for day in value)):
+            raise ValueError("weekdays must be a non-empty list of 0..6")
+        return value
+
+    @field_validator("timezone")
+    @classmethod
+    def _check_timezone(cls, value: str | None) -> str | None:
+        if value is not None:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError) as exc:
+                raise ValueError(f"unknown timezone {value!r}") from exc
+        return value
+
+
+class ScheduleCreate(ScheduleFields):
+    time: str
+    weekdays: list[int] = list(range(7))
+    timezone: str = "UTC"
+
+
+class ScheduleUpdate(ScheduleFields):
+    enabled: bool | None = None
+
+
+def _minute_of_day(time: str) -> int:
+    hour, minute = time.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def _weekday_mask(weekdays: list[int]) -> int:
+    mask = 0
+    for day in weekdays:
+        mask |= 1 << day
+    return mask
+
+
+def _schedule_out(schedule) -> ScheduleOut:
+    next_run_at = None
+    if schedule.enabled:
+        next_run_at = next_occurrence(
+            schedule.minute_of_day, schedule.weekdays, schedule.timezone, datetime.now(timezone.utc)
+        )
+    return ScheduleOut(
+        id=schedule.id,
+        protocol_id=schedule.protocol_id,
+        time=f"{schedule.minute_of_day // 60:02d}:{schedule.minute_of_day % 60:02d}",
+        weekdays=[day for day in range(7) if schedule.weekdays & (1 << day)],
+        timezone=schedule.timezone,
+        enabled=schedule.enabled,
+        next_run_at=next_run_at,
+    )
+
+
+@protocol_schedules_router.get("/{protocol_id}/schedules")
+async def list_schedules(
+    protocol_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(protocol_session)
+) -> list[ScheduleOut]:
+    service = ScheduleService(session)
+    schedules = await service.list(user_id, protocol_id)
+    if schedules is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
+    return [_schedule_out(s) for s in schedules]
+
+
+@protocol_schedules_router.post("/{protocol_id}/schedules", dependencies=[Depends(rate_limit("write"))])
+async def create_schedule(
+    protocol_id: int,
+    payload: ScheduleCreate,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(protocol_session),
+) -> ScheduleOut:
+    service = ScheduleService(session)
+    schedule = await service.create(
+        user_id,
+        protocol_id,
+        _minute_of_day(payload.time),
+        _weekday_mask(payload.weekdays),
+        payload.timezone,
+    )
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
+    return _schedule_out(schedule)
+
+
+@router.patch("/{schedule_id}")
+async def update_schedule(
+    schedule_id: int,
+    payload: ScheduleUpdate,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(schedule_session),
+) -> ScheduleOut:
+    values = {}
+    if payload.time is not None:
+        values["minute_of_day"] = _minute_of_day(payload.time)
+    if payload.weekdays is not None:
+        values["weekdays"] = _weekday_mask(payload.weekdays)
+    if payload.timezone is not None:
+        values["timezone"] = payload.timezone
+    if payload.enabled is not None:
+        values["enabled"] = payload.enabled
+    service = ScheduleService(session)
+    schedule = await service.update(user_id, schedule_id, **values)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return _schedule_out(schedule)
+
+
+@router.delete("/{schedule_id}")
+async def delete_schedule(
+    schedule_id: int, user_id: int = Depends(current_user), session: AsyncSession = Depends(schedule_session)
+) -> None:
+    service = ScheduleService(session)
+    if not await service.delete(user_id, schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
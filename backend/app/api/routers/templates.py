@@ -0,0 +1,94 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import current_user, primary_session, rate_limit, require_admin
+from app.api.idempotency import IdempotentRoute
+from app.api.routers.items import ItemOut
+from app.api.routers.protocols import ProtocolOut
+from app.core.db import PRIMARY_SHARD, ShardRouter, get_shards
+from app.services.templates import TemplateService
+
+
+router = APIRouter(prefix="/templates", tags=["templates"], route_class=IdempotentRoute)
+
+
+class TemplateOut(BaseModel):
+    id: int
+    title: str
+    item_count: int
+
+
+class TemplatePublish(BaseModel):
+    protocol_id: int
+    title: str | None = None
+
+
+class InstantiateRequest(BaseModel):
+    title: str | None = None
+
+
+@asynccontextmanager
+async def _protocol_session(shards: ShardRouter, shard: int) -> AsyncIterator[AsyncSession | None]:
+    # None keeps TemplateService on the primary session, where it can copy with INSERT ... SELECT.
+    if shard == PRIMARY_SHARD:
+        yield None
+        return
+    async with shards.session(shard) as session:
+        yield session
+
+
+@router.get("/", dependencies=[Depends(current_user)])
+async def list_templates(session: AsyncSession = Depends(primary_session)) -> list[TemplateOut]:
+    service = TemplateService(session)
+    rows = await service.list()
+    return [TemplateOut(id=t.id, title=t.title, item_count=count) for t, count in rows]
+
+
+@router.get("/{template_id}/items", dependencies=[Depends(current_user)])
+async def list_template_items(template_id: int, session: AsyncSession = Depends(primary_session)) -> list[ItemOut]:
+    service = TemplateService(session)
+    items = await service.items(template_id)
+    return [ItemOut(id=i.id, title=i.title, order_index=i.order_index) for i in items]
+
+
+@router.post("/", dependencies=[Depends(require_admin)])
+async def publish_template(
+    payload: TemplatePublish,
+    session: AsyncSession = Depends(primary_session),
+    shards: ShardRouter = Depends(get_shards),
+) -> TemplateOut:
+    shard = shards.shard_for_object(payload.protocol_id)
+    async with _protocol_session(shards, shard) as protocol_session:
+        service = TemplateService(session, protocol_session)
+        published = await service.publish(payload.protocol_id, payload.title)
+    if published is None:
+        raise HTTPException(status_code=404, detail="Protocol not found")
+    template, item_count = published
+    return TemplateOut(id=template.id, title=template.title, item_count=item_count)
+
+
+@router.delete("/{template_id}", dependencies=[Depends(require_admin)])
+async def delete_template(template_id: int, session: AsyncSession = Depends(primary_session)) -> None:
+    service = TemplateService(session)
+    await service.delete(template_id)
+
+
+@router.post("/{template_id}/instantiate", dependencies=[Depends(current_user), Depends(rate_limit("write"))])
+async def instantiate_template(
+    template_id: int,
+    payload: InstantiateRequest,
+    user_id: int = Depends(current_user),
+    session: AsyncSession = Depends(primary_session),
+    shards: ShardRouter = Depends(get_shards),
+) -> ProtocolOut:
+    shard = await shards.shard_for_user(user_id)
+    async with _protocol_session(shards, shard) as protocol_session:
+        service = TemplateService(session, protocol_session)
+        protocol = await service.instantiate(template_id, user_id, payload.title)
+    if protocol is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return ProtocolOut(id=protocol.id, title=protocol.title, order_index=protocol.order_index)
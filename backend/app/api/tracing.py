@@ -0,0 +1,41 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.tracing import Tracer, tracer
+
+
+def _route_template(scope: Scope) -> str | None:
+    route = getattr(scope.get("route"), "path", None)
+    if route is None:
+        return None
+    # Newer FastAPI versions leave include_router prefixes off route.path; take them from the request path.
+    extra = scope["path"].rstrip("/").count("/") - route.rstrip("/").count("/")
+    prefix = "/".join(scope["path"].split("/")[: extra + 1]) if extra > 0 else ""
+    return prefix + route
+
+
+class TracingMiddleware:
+    # Opens the root span of each request; it is renamed to the matched route once routing is done,
+    # so traces group by "/api/protocols/{protocol_id}" rather than by concrete ids.
+    def __init__(self, app: ASGIApp, tracer: Tracer = tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.tracer.exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"]}) as span:
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.attributes["http.status_code"] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = _route_template(scope)
+                if route is not None:
+                    span.name = f"{scope['method']} {route}"
+                    span.attributes["http.route"] = route
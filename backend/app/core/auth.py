@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from urllib.parse import parse_qsl
+
+from app.core.config import settings
+
+
+class AuthError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Identity:
+    user_id: int
+    expires_at: float
+
+
+@dataclass(frozen=True)
+class Session:
+    token: str
+    identity: Identity
+
+
+def check_init_data(init_data: str, bot_token: str) -> tuple[str, dict[str, str]]:
+    # Telegram signs the Mini App's initData with HMAC-SHA256(key=HMAC-SHA256("WebAppData", bot_token))
+    # over its sorted "key=value" lines, hash excluded. Returns the hash and the signed fields.
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    if not received:
+        raise AuthError("initData has no hash")
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise AuthError("initData signature mismatch")
+    return received, fields
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+# Verifies Telegram initData once and hands out short-lived session tokens
+# ("<user_id>.<expires_at>.<signature>") that any API replica sharing the secret accepts. Verified
+# initData hashes and token signatures are remembered in a bounded LRU until they expire, so an
+# authenticated request normally costs one dictionary lookup rather than an HMAC.
+class Authenticator:
+    def __init__(
+        self,
+        bot_token: str,
+        secret: str,
+        token_ttl: float = 3600,
+        init_data_max_age: float = 86400,
+        cache_size: int = 100_000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.bot_token = bot_token
+        # Without a configured secret no token can be issued or accepted.
+        self.secret = secret.encode()
+        self.token_ttl = token_ttl
+        self.init_data_max_age = init_data_max_age
+        self.cache_size = cache_size
+        self.clock = clock
+        self._verified: OrderedDict[str, Identity] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def login(self, init_data: str) -> Session:
+        if not self.bot_token:
+            raise AuthError("Telegram login is not configured")
+        # Keyed by Telegram's hash: an HMAC over every other field, so only a genuine initData has it.
+        identity = self._cached(f"init:{dict(parse_qsl(init_data)).get('hash', '')}")
+        if identity is None:
+            identity = self._verify_init_data(init_data)
+        return self.issue(identity.user_id)
+
+    def issue(self, user_id: int) -> Session:
+        if not self.secret:
+            raise AuthError("Sessions are not configured")
+        expires_at = int(self.clock() + self.token_ttl)
+        payload = f"{user_id}.{expires_at}"
+        token = f"{payload}.{self._sign(payload)}"
+        identity = Identity(user_id, expires_at)
+        self._remember(f"token:{token}", identity)
+        return Session(token, identity)
+
+    def authenticate(self, token: str) -> int:
+        identity = self._cached(f"token:{token}")
+        if identity is None:
+            identity = self._verify_token(token)
+        return identity.user_id
+
+    def clear(self) -> None:
+        self._verified.clear()
+
+    def _verify_init_data(self, init_data: str) -> Identity:
+        received, fields = check_init_data(init_data, self.bot_token)
+        try:
+            auth_date = int(fields["auth_date"])
+            user_id = int(json.loads(fields["user"])["id"])
+        except (KeyError, TypeError, ValueError) as exc:
+            raise AuthError("initData has no user") from exc
+        expires_at = auth_date + self.init_data_max_age
+        if expires_at <= self.clock():
+            raise AuthError("initData has expired")
+        identity = Identity(user_id, expires_at)
+        self._remember(f"init:{received}", identity)
+        return identity
+
+    def _verify_token(self, token: str) -> Identity:
+        payload, _, signature = token.rpartition(".")
+        if not self.secret or not hmac.compare_digest(self._sign(payload), signature):
+            raise AuthError("Invalid session token")
+        user_id, _, expires_at = payload.partition(".")
+        try:
+            identity = Identity(int(user_id), int(expires_at))
+        except ValueError as exc:
+            raise AuthError("Invalid session token") from exc
+        if identity.expires_at <= self.clock():
+            raise AuthError("Session expired")
+        self._remember(f"token:{token}", identity)
+        return identity
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest())
+
+    def _cached(self, key: str) -> Identity | None:
+        identity = self._verified.get(key)
+        if identity is None:
+            self.misses += 1
+            return None
+        if identity.expires_at <= self.clock():
+            del self._verified[key]
+            self.misses += 1
+            return None
+        self._verified.move_to_end(key)
+        self.hits += 1
+        return identity
+
+    def _remember(self, key: str, identity: Identity) -> None:
+        self._verified[key] = identity
+        self._verified.move_to_end(key)
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+
+
+def _session_secret() -> str:
+    if settings.session_secret:
+        return settings.session_secret
+    if settings.bot_token:
+        # Derived rather than the bot token itself, so a leaked session key cannot drive the bot.
+        return hmac.new(b"session", settings.bot_token.encode(), hashlib.sha256).hexdigest()
+    return ""
+
+
+authenticator = Authenticator(
+    settings.bot_token,
+    _session_secret(),
+    token_ttl=settings.session_ttl_seconds,
+    init_data_max_age=settings.init_data_max_age_seconds,
+    cache_size=settings.session_cache_size,
+)
@@ -1,5 +1,19 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable, Sequence
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Integer, Table, delete, event, false, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.util import await_only
 
 from app.core.config import settings
 
@@ -8,10 +22,275 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(settings.database_url, echo=False)
+# Shard n hands out protocol, item and schedule ids from [n << 40, (n + 1) << 40), so an id names its
+# shard without a lookup (the rebalancer renumbers the rows it moves). That stays below 2**53, which
+# the Mini App's JSON numbers can hold.
+SHARD_ID_BITS = 40
+PRIMARY_SHARD = 0
+SHARDED_TABLES = ("protocols", "items", "schedules")
+
+
+def shard_of(object_id: int) -> int:
+    return object_id >> SHARD_ID_BITS
+
+
+def id_base(shard: int) -> int:
+    return shard << SHARD_ID_BITS
+
+
+# Users moved off their ring position by the rebalancer. Only the primary shard's copy is read.
+shard_directory = Table(
+    "shard_directory",
+    Base.metadata,
+    Column("user_id", BigInteger, primary_key=True),
+    Column("shard", Integer, nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+    # Set while the rebalancer copies the user's rows; their requests are refused meanwhile.
+    Column("moving", Boolean, nullable=False, default=False, server_default=false()),
+)
+
+
+class UserMoving(Exception):
+    def __init__(self, user_id: int, retry_after: float = 5) -> None:
+        super().__init__(f"User {user_id} is being moved to another shard")
+        self.user_id = user_id
+        self.retry_after = retry_after
+
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+_HOLDS_WRITE_LOCK = "sqlite_write_queue"
+
+
+class SQLiteWriteQueue:
+    # SQLite has a single writer. pysqlite only opens a transaction at the first write statement, so a
+    # connection holds the database write lock from there until commit or rollback; this lock spans the
+    # same window. Writers in this process then queue in arrival order instead of polling the file lock,
+    # and busy_timeout is left for writers in other processes (bot and API on one file).
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+        self.writes = 0
+        self.queued = 0
+
+    def install(self, engine: AsyncEngine) -> None:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        # Released as the commit or rollback is issued; a writer let in that early waits out the rest
+        # on busy_timeout.
+        event.listen(sync_engine, "commit", self._release_connection)
+        event.listen(sync_engine, "rollback", self._release_connection)
+        # Connections returned or dropped without either must not keep the lock.
+        event.listen(sync_engine.pool, "reset", self._release_on_reset)
+        event.listen(sync_engine.pool, "invalidate", self._release_on_invalidate)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if conn.info.get(_HOLDS_WRITE_LOCK) or not statement.lstrip().upper().startswith(_WRITE_STATEMENTS):
+            return
+        if self.lock.locked():
+            self.queued += 1
+        await_only(asyncio.wait_for(self.lock.acquire(), self.timeout))
+        conn.info[_HOLDS_WRITE_LOCK] = True
+        self.writes += 1
+
+    def _release_connection(self, conn) -> None:
+        self._release(conn.info)
+
+    def _release_on_reset(self, dbapi_connection, connection_record, reset_state) -> None:
+        self._release(connection_record.info)
+
+    def _release_on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        self._release(connection_record.info)
+
+    def _release(self, info: dict) -> None:
+        if info.pop(_HOLDS_WRITE_LOCK, False):
+            self.lock.release()
+
+
+def tune_sqlite(
+    engine: AsyncEngine,
+    synchronous: str = "NORMAL",
+    cache_mb: int = 64,
+    busy_timeout_ms: int = 5000,
+) -> SQLiteWriteQueue:
+    # WAL lets readers run alongside the writer; with it, synchronous=NORMAL fsyncs at checkpoints
+    # rather than on every commit: a power cut can lose the last commits, never corrupt the file.
+    @event.listens_for(engine.sync_engine, "connect")
+    def _pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{cache_mb * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    queue = SQLiteWriteQueue(timeout=busy_timeout_ms / 1000)
+    queue.install(engine)
+    return queue
+
+
+def _engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(url, echo=False)
+    if engine.dialect.name == sqlite.dialect.name and settings.sqlite_tuned:
+        tune_sqlite(
+            engine,
+            synchronous=settings.sqlite_synchronous,
+            cache_mb=settings.sqlite_cache_mb,
+            busy_timeout_ms=settings.sqlite_busy_timeout_ms,
+        )
+    return engine
+
+
+def _sessionmaker(url: str) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(_engine(url), expire_on_commit=False, class_=AsyncSession)
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Each shard owns `vnodes` points on the ring; a user belongs to the first point at or after
+    # their hash. Adding a shard only takes users from their neighbours, about 1/N of them in total.
+    def __init__(self, shards: Sequence[int], vnodes: int = 128) -> None:
+        points = sorted(
+            (_ring_hash(f"shard-{shard}#{replica}"), shard) for shard in shards for replica in range(vnodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: int) -> int:
+        index = bisect.bisect_left(self._hashes, _ring_hash(f"user-{key}"))
+        return self._shards[index % len(self._shards)]
+
+
+class ShardRouter:
+    def __init__(
+        self,
+        sessionmakers: Sequence[async_sessionmaker[AsyncSession]],
+        vnodes: int = 128,
+        cache_ttl: float = 30,
+        cache_size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.sessionmakers = list(sessionmakers)
+        self.ring = HashRing(range(len(self.sessionmakers)), vnodes)
+        # Directory entries are cached briefly; a rebalancer move becomes visible to other
+        # processes once their entries expire.
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.clock = clock
+        self._users: OrderedDict[int, tuple[int, float]] = OrderedDict()
+
+    @classmethod
+    def from_urls(cls, urls: Sequence[str], **kwargs) -> ShardRouter:
+        return cls([_sessionmaker(url) for url in urls], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.sessionmakers)
+
+    @property
+    def primary(self) -> async_sessionmaker[AsyncSession]:
+        return self.sessionmakers[PRIMARY_SHARD]
+
+    def session(self, shard: int) -> AsyncSession:
+        return self.sessionmakers[shard]()
+
+    async def shard_for_user(self, user_id: int) -> int:
+        if len(self.sessionmakers) == 1:
+            return PRIMARY_SHARD
+        entry = self._users.get(user_id)
+        if entry is not None and entry[1] > self.clock():
+            self._users.move_to_end(user_id)
+            return entry[0]
+        async with self.primary() as session:
+            row = (
+                await session.execute(
+                    select(shard_directory.c.shard, shard_directory.c.moving).where(
+                        shard_directory.c.user_id == user_id
+                    )
+                )
+            ).first()
+        if row is not None and row.moving:
+            # Not cached: the flag clears as soon as the move commits.
+            raise UserMoving(user_id)
+        pinned = row.shard if row is not None else None
+        shard = pinned if pinned is not None and pinned < len(self.sessionmakers) else self.ring.shard_for(user_id)
+        self._users[user_id] = (shard, self.clock() + self.cache_ttl)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.cache_size:
+            self._users.popitem(last=False)
+        return shard
+
+    def shard_for_object(self, object_id: int) -> int:
+        shard = shard_of(object_id)
+        # Ids from an unknown range fall back to the primary, which answers "not found".
+        return shard if 0 <= shard < len(self.sessionmakers) else PRIMARY_SHARD
+
+    @asynccontextmanager
+    async def session_for_user(self, user_id: int) -> AsyncIterator[AsyncSession]:
+        async with self.session(await self.shard_for_user(user_id)) as session:
+            yield session
+
+    async def pin(self, user_id: int, shard: int | None, moving: bool = False) -> None:
+        # Pins a user to a shard, or with None returns them to their ring position.
+        async with self.primary() as session:
+            await session.execute(delete(shard_directory).where(shard_directory.c.user_id == user_id))
+            if shard is not None:
+                await session.execute(
+                    shard_directory.insert().values(
+                        user_id=user_id, shard=shard, moving=moving, updated_at=datetime.now(timezone.utc)
+                    )
+                )
+            await session.commit()
+        self.forget(user_id)
+
+    def forget(self, user_id: int | None = None) -> None:
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(user_id, None)
+
+    async def prepare(self) -> None:
+        for shard, sessionmaker in enumerate(self.sessionmakers):
+            async with sessionmaker.kw["bind"].begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await _ensure_id_range(conn, shard)
+
+    async def dispose(self) -> None:
+        for sessionmaker in self.sessionmakers:
+            await sessionmaker.kw["bind"].dispose()
+
+
+async def _ensure_id_range(conn: AsyncConnection, shard: int) -> None:
+    # Points each sharded table's id sequence at the shard's range, keeping any ids already used.
+    base, limit = id_base(shard), id_base(shard + 1)
+    for table in SHARDED_TABLES:
+        last = await conn.scalar(
+            text(f"SELECT COALESCE(MAX(id), :base) FROM {table} WHERE id >= :base AND id < :limit"),
+            {"base": base, "limit": limit},
+        )
+        if conn.dialect.name == sqlite.dialect.name:
+            await conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :table"), {"table": table})
+            await conn.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :seq)"), {"table": table, "seq": last}
+            )
+        elif conn.dialect.name == postgresql.dialect.name and shard != PRIMARY_SHARD:
+            await conn.execute(
+                text("SELECT setval(pg_get_serial_sequence(:table, 'id'), :seq)"), {"table": table, "seq": last}
+            )
+
+
+engine = _engine(settings.database_url)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+# DATABASE_URL is shard 0; DATABASE_SHARD_URLS appends shards 1..N. Only ever append: the ring and
+# the id ranges are keyed by position.
+shards = ShardRouter(
+    [AsyncSessionLocal, *(_sessionmaker(url) for url in settings.database_shard_urls)],
+    cache_ttl=settings.shard_cache_ttl_seconds,
+)
+
 
-async def get_session() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
-        yield session
+def get_shards() -> ShardRouter:
+    return shards
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Protocol
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class IdempotencyBackend(Protocol):
+    # Keeps first responses per idempotency key until they expire. A shared implementation
+    # (e.g. Redis) lets a retry that lands on another worker be served from the same entry.
+    async def get(self, key: str) -> StoredResponse | None: ...
+
+    async def set(self, key: str, response: StoredResponse, ttl: float) -> None: ...
+
+
+class InMemoryIdempotencyBackend:
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, StoredResponse]] = OrderedDict()
+
+    async def get(self, key: str) -> StoredResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        return response
+
+    async def set(self, key: str, response: StoredResponse, ttl: float) -> None:
+        self._entries[key] = (self.clock() + ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+
+class IdempotencyStore:
+    def __init__(self, backend: IdempotencyBackend | None = None, ttl: float = 86400) -> None:
+        self.backend = backend or InMemoryIdempotencyBackend()
+        self.ttl = ttl
+        self._inflight: dict[str, asyncio.Event] = {}
+        self.replayed = 0
+        self.waited = 0
+
+    async def get(self, key: str) -> StoredResponse | None:
+        return await self.backend.get(key)
+
+    async def save(self, key: str, response: StoredResponse) -> None:
+        await self.backend.set(key, response, self.ttl)
+
+    def claim(self, key: str) -> asyncio.Event | None:
+        # None means the caller now owns the key and must release() it; otherwise wait on the
+        # returned event and look the key up again.
+        event = self._inflight.get(key)
+        if event is None:
+            self._inflight[key] = asyncio.Event()
+        else:
+            self.waited += 1
+        return event
+
+    def release(self, key: str) -> None:
+        event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+idempotency_store = IdempotencyStore(
+    InMemoryIdempotencyBackend(max_keys=settings.idempotency_max_keys),
+    ttl=settings.idempotency_ttl_seconds,
+)
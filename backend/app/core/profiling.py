@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from types import FrameType
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{frame.f_lineno})"
+
+
+def _folded_stack(frame: FrameType | None) -> str:
+    # Root-first and ';'-joined, the "folded" format flamegraph.pl and speedscope read. Frames from
+    # the event loop itself are cut off: they are the same for every sample.
+    labels = []
+    while frame is not None and not frame.f_code.co_filename.startswith(_ASYNCIO_DIR):
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels)) or "(event loop)"
+
+
+@dataclass
+class Profile:
+    label: str
+    task: asyncio.Task
+    loop: asyncio.AbstractEventLoop
+    thread_id: int
+    id: str = ""
+    started: float = field(default_factory=time.perf_counter)
+    samples: Counter[str] = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+
+# A statistical profiler for single requests. One sampler thread serves every active profile: each
+# tick it reads the event-loop thread's current frame and credits the stack to the profiled task
+# that is running at that moment, so concurrent requests on the same loop do not pollute it.
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self._active: dict[asyncio.Task, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def begin(self, label: str) -> Profile:
+        task = asyncio.current_task()
+        if task is None:
+            raise RuntimeError("profiling needs a running task")
+        profile = Profile(label, task, asyncio.get_running_loop(), threading.get_ident())
+        with self._lock:
+            self._active[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile) -> Profile:
+        with self._lock:
+            self._active.pop(profile.task, None)
+        profile.elapsed = time.perf_counter() - profile.started
+        return profile
+
+    def _sample(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                profiles = list(self._active.values())
+            frames = sys._current_frames()
+            for profile in profiles:
+                if asyncio.current_task(profile.loop) is profile.task:
+                    profile.samples[_folded_stack(frames.get(profile.thread_id))] += 1
+
+
+class ProfileTrigger:
+    # Decides which requests are profiled and stores their profiles. Disabled, the cost per request
+    # is the caller's header check plus one comparison.
+    def __init__(self, directory: str | Path, sample_rate: float = 0.0, interval: float = 0.001) -> None:
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.profiler = SamplingProfiler(interval)
+        self.written = 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, label: str) -> Profile:
+        profile = self.profiler.begin(label)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        profile.id = f"{stamp}-{re.sub(r'[^A-Za-z0-9._-]+', '_', label).strip('_')[:80]}"
+        return profile
+
+    async def finish(self, profile: Profile) -> Path:
+        self.profiler.end(profile)
+        path = self.directory / f"{profile.id}.folded"
+        lines = [f"{stack} {count}\n" for stack, count in profile.samples.most_common()]
+        await asyncio.to_thread(self._write, path, lines)
+        self.written += 1
+        logger.info(
+            "Profiled %s: %.1f ms, %d samples -> %s",
+            profile.label,
+            profile.elapsed * 1000,
+            sum(profile.samples.values()),
+            path,
+        )
+        return path
+
+    @staticmethod
+    def _write(path: Path, lines: list[str]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(lines))
+
+
+@dataclass
+class Stall:
+    duration: float
+    task: str | None
+    stack: str
+
+
+# Reports event-loop stalls. A heartbeat coroutine stamps the time every `interval`; a watchdog
+# thread that sees the stamp older than `threshold` captures the loop thread's stack while the
+# blocking code is still on it, then the stall is logged once the loop runs again.
+class LoopLagMonitor:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.02, max_stalls: int = 50) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.max_stalls = max_stalls
+        self.stalls: list[Stall] = []
+        self.stall_count = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._pending: tuple[float, str | None, str] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread_id = 0
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    def stats(self) -> dict[str, float]:
+        return {"stalls": self.stall_count, "max_lag_ms": round(self.max_lag * 1000, 1)}
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - self._beat - self.interval
+            self._beat = now
+            self.max_lag = max(self.max_lag, lag)
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                self._report(Stall(lag, pending[1], pending[2]))
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.interval):
+            if self._pending is not None or time.monotonic() - self._beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            task = asyncio.current_task(self._loop)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self._pending = (time.monotonic(), task.get_name() if task is not None else None, stack)
+
+    def _report(self, stall: Stall) -> None:
+        self.stall_count += 1
+        self.stalls.append(stall)
+        del self.stalls[: -self.max_stalls]
+        logger.warning(
+            "Event loop blocked for %.0f ms in task %s:\n%s", stall.duration * 1000, stall.task, stall.stack
+        )
+
+
+profile_trigger = ProfileTrigger(
+    settings.profile_dir, settings.profile_sample_rate, interval=settings.profile_interval_ms / 1000
+)
+# Only started when LOOP_LAG_THRESHOLD_MS is set.
+loop_monitor = LoopLagMonitor(threshold=settings.loop_lag_threshold_ms / 1000)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Protocol
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+class RateLimitBackend(Protocol):
+    # Returns 0 when the request is admitted, otherwise seconds until a token is available.
+    # A shared implementation (e.g. Redis) lets several workers enforce one budget.
+    async def acquire(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> float: ...
+
+
+class InMemoryRateLimitBackend:
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> float:
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (float(rule.burst), now))
+        tokens = min(float(rule.burst), tokens + (now - updated) * rule.rate)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rule.rate if rule.rate > 0 else float("inf")
+        self._buckets[key] = (tokens, now)
+        # Idle buckets are full by definition, so evicting the least recently used is lossless
+        # for anyone who has not been seen for a while.
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rules: dict[str, RateLimitRule],
+        backend: RateLimitBackend | None = None,
+        enabled: bool = True,
+    ) -> None:
+        self.rules = rules
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.enabled = enabled
+        self.counters: dict[str, dict[str, int]] = {name: {"allowed": 0, "limited": 0} for name in rules}
+
+    async def check(self, route_class: str, key: str, cost: float = 1.0) -> float:
+        rule = self.rules.get(route_class)
+        if not self.enabled or rule is None:
+            return 0.0
+        wait = await self.backend.acquire(f"{route_class}:{key}", rule, cost)
+        self.counters[route_class]["limited" if wait > 0 else "allowed"] += 1
+        return wait
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        return {name: dict(counts) for name, counts in self.counters.items()}
+
+
+rate_limiter = RateLimiter(
+    {
+        "llm": RateLimitRule(per_minute=settings.rate_limit_llm_per_minute, burst=5),
+        "write": RateLimitRule(per_minute=settings.rate_limit_write_per_minute, burst=30),
+        "bot": RateLimitRule(per_minute=settings.rate_limit_bot_per_minute, burst=20),
+    },
+    enabled=settings.rate_limit_enabled,
+)
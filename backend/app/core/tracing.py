@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    duration: float = 0.0
+    error: str | None = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class SpanExporter(Protocol):
+    # Called on the event loop (and from SQLAlchemy's sync hooks) for every finished span: must not block.
+    def export(self, span: Span) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class InMemorySpanExporter:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSpanExporter:
+    # One JSON object per span, appended by a writer thread so the event loop never waits on the disk.
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._queue: queue.SimpleQueue[Span | None] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write, name="span-writer", daemon=True)
+                    self._thread.start()
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as out:
+            while (span := self._queue.get()) is not None:
+                out.write(json.dumps(span.to_dict(), default=str) + "\n")
+                if self._queue.empty():
+                    out.flush()
+
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_NO_SPAN = nullcontext()
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+class _SpanScope:
+    def __init__(self, tracer: Tracer, name: str, attributes: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = self.tracer.start(self.name, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self.token)
+        self.tracer.end(self.span, exc)
+
+
+# Spans live in a context variable, so tasks created inside a span (create_task copies the context)
+# and SQLAlchemy's greenlets report under it. With no exporter set, span() hands back a shared no-op
+# context manager and the instrumented code pays one attribute check.
+class Tracer:
+    def __init__(self, exporter: SpanExporter | None = None) -> None:
+        self.exporter = exporter
+
+    def span(self, name: str, **attributes: Any) -> _SpanScope | nullcontext:
+        if self.exporter is None:
+            return _NO_SPAN
+        return _SpanScope(self, name, attributes)
+
+    def start(self, name: str, attributes: dict[str, Any] | None = None) -> Span:
+        # Starts a span under the current one without making it current; pair with end().
+        parent = _current.get()
+        return Span(
+            name,
+            parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}",
+            f"{random.getrandbits(64):016x}",
+            parent.span_id if parent is not None else None,
+            attributes or {},
+        )
+
+    def end(self, span: Span, exc: BaseException | None = None) -> None:
+        span.duration = time.perf_counter() - span._started
+        if exc is not None:
+            span.error = f"{type(exc).__name__}: {exc}"
+        exporter = self.exporter
+        if exporter is not None:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.exception("Span export failed")
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+tracer = Tracer(JsonLinesSpanExporter(settings.trace_file) if settings.trace_file else None)
+
+
+def _traced_function(fn, name: str):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if tracer.exporter is None:
+            return await fn(*args, **kwargs)
+        with tracer.span(name):
+            return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+def traced(target):
+    # On a class, wraps each public coroutine method in a "Class.method" span; on a coroutine
+    # function, wraps just that function.
+    if not isinstance(target, type):
+        return _traced_function(target, target.__qualname__)
+    for name, member in list(vars(target).items()):
+        if not name.startswith("_") and inspect.isfunction(member) and inspect.iscoroutinefunction(member):
+            setattr(target, name, _traced_function(member, f"{target.__name__}.{name}"))
+    return target
+
+
+# SQL statements become spans when they run inside a trace; stray queries from background loops
+# would otherwise each start a trace of their own.
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany) -> None:
+    if tracer.exporter is None or context is None or _current.get() is None:
+        return
+    context._trace_span = tracer.start(
+        f"sql {statement.lstrip().split(None, 1)[0].upper()}",
+        {"db.system": conn.dialect.name, "db.statement": statement[:500], "db.executemany": executemany},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany) -> None:
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.attributes["db.rowcount"] = cursor.rowcount
+        tracer.end(span)
+
+
+@event.listens_for(Engine, "handle_error")
+def _sql_failed(exception_context) -> None:
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        tracer.end(span, exception_context.original_exception)
@@ -25,3 +25,13 @@ class ItemStatus:
     item_id: int
     checked: bool
     updated_at: datetime
+
+
+@dataclass(frozen=True)
+class ProtocolOverview:
+    id: int
+    title: str
+    order_index: int
+    item_count: int
+    checked_count: int
+    last_activity_at: datetime | None
@@ -1,8 +1,19 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routers import audio, items, protocols
-from app.core.db import Base, engine
+from app.api.deps import require_admin
+from app.api.profiling import ProfilingMiddleware
+from app.api.routers import audio, auth, items, protocols, schedules, templates
+from app.api.tracing import TracingMiddleware
+from app.core.config import settings
+from app.core.db import shards
+from app.core.profiling import loop_monitor
+from app.core.ratelimit import rate_limiter
+from app.core.tracing import tracer
+from app.services.purge import Purger
+from app.services.upstream import close_upstream
 
 app = FastAPI(title="Personal Protocol Manager API", redirect_slashes=False)
 
@@ -14,19 +25,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TracingMiddleware)
 
+app.include_router(auth.router, prefix="/api")
 app.include_router(protocols.router, prefix="/api")
 app.include_router(items.router, prefix="/api")
 app.include_router(items.protocol_items_router, prefix="/api")
 app.include_router(audio.router, prefix="/api")
+app.include_router(templates.router, prefix="/api")
+app.include_router(schedules.router, prefix="/api")
+app.include_router(schedules.protocol_schedules_router, prefix="/api")
+
+purgers = [
+    Purger(
+        sessionmaker,
+        grace=settings.delete_grace_seconds,
+        interval=settings.purge_interval_seconds,
+        batch_size=settings.purge_batch_size,
+        pause=settings.purge_pause_ms / 1000,
+    )
+    for sessionmaker in shards.sessionmakers
+]
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await shards.prepare()
+    for purger in purgers:
+        purger.start()
+    if settings.loop_lag_threshold_ms > 0:
+        loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    for purger in purgers:
+        await purger.stop()
+    await loop_monitor.stop()
+    await close_upstream()
+    await asyncio.to_thread(tracer.close)
 
 
 @app.get("/health")
 async def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/metrics/rate-limits", dependencies=[Depends(require_admin)])
+async def rate_limit_metrics() -> dict[str, dict[str, int]]:
+    return rate_limiter.snapshot()
+
+
+@app.get("/metrics/loop-lag", dependencies=[Depends(require_admin)])
+async def loop_lag_metrics() -> dict[str, float]:
+    return loop_monitor.stats()
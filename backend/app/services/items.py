@@ -2,32 +2,83 @@ from __future__ import annotations
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.storage.repositories import ItemRepository
+from app.core.tracing import traced
+from app.storage.cache import protocol_content
+from app.storage.repositories import ItemRepository, ProtocolRepository
 
 
+@traced
 class ItemService:
     def __init__(self, session: AsyncSession) -> None:
         self.repo = ItemRepository(session)
+        self.protocol_repo = ProtocolRepository(session)
         self.session = session
 
-    async def list(self, protocol_id: int):
+    async def list(self, user_id: int, protocol_id: int):
+        if await self.protocol_repo.get(protocol_id, user_id) is None:
+            return None
         return await self.repo.list(protocol_id)
 
-    async def create(self, protocol_id: int, title: str):
+    async def titles(self, protocol_id: int, version: int) -> tuple[tuple[int, str], ...]:
+        key = (protocol_id, version, "items")
+        cached = protocol_content.get(key)
+        if cached is not None:
+            return cached
+        items = tuple((i.id, i.title) for i in await self.repo.list(protocol_id))
+        # A write committed between reading `version` and the list would file new content under
+        # the old version; only cache when the version is unchanged after the read.
+        if await self.protocol_repo.get_version(protocol_id) == version:
+            protocol_content.set(key, items)
+        return items
+
+    async def create(self, user_id: int, protocol_id: int, title: str):
+        if await self.protocol_repo.get(protocol_id, user_id) is None:
+            return None
         items = await self.repo.list(protocol_id)
         order_index = len(items)
         item = await self.repo.create(protocol_id, title, order_index)
+        await self.protocol_repo.bump_version(protocol_id)
         await self.session.commit()
+        protocol_content.invalidate(protocol_id)
         return item
 
-    async def rename(self, item_id: int, title: str):
+    async def append_many(self, user_id: int, protocol_id: int, titles: list[str]):
+        if await self.protocol_repo.get(protocol_id, user_id) is None:
+            return None
+        items = await self.repo.list(protocol_id)
+        created = await self.repo.bulk_create(protocol_id, titles, start_index=len(items))
+        await self.protocol_repo.bump_version(protocol_id)
+        await self.session.commit()
+        protocol_content.invalidate(protocol_id)
+        return created
+
+    async def rename(self, user_id: int, item_id: int, title: str) -> bool:
+        if not await self.repo.existing_ids([item_id], user_id):
+            return False
         await self.repo.rename(item_id, title)
+        protocol_ids = await self.protocol_repo.bump_version_for_items([item_id])
         await self.session.commit()
+        self._invalidate(protocol_ids)
+        return True
 
-    async def delete(self, item_id: int):
+    async def delete(self, user_id: int, item_id: int) -> bool:
+        if not await self.repo.existing_ids([item_id], user_id):
+            return False
+        protocol_ids = await self.protocol_repo.bump_version_for_items([item_id])
         await self.repo.delete(item_id)
         await self.session.commit()
+        self._invalidate(protocol_ids)
+        return True
 
-    async def reorder(self, ordered_ids: list[int]):
+    async def reorder(self, user_id: int, ordered_ids: list[int]) -> bool:
+        if await self.repo.existing_ids(ordered_ids, user_id) != set(ordered_ids):
+            return False
         await self.repo.reorder(ordered_ids)
+        protocol_ids = await self.protocol_repo.bump_version_for_items(ordered_ids)
         await self.session.commit()
+        self._invalidate(protocol_ids)
+        return True
+
+    def _invalidate(self, protocol_ids: list[int]) -> None:
+        for protocol_id in protocol_ids:
+            protocol_content.invalidate(protocol_id)
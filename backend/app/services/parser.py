@@ -4,9 +4,9 @@ import json
 from dataclasses import dataclass
 import re
 
-import httpx
-
 from app.core.config import settings
+from app.core.tracing import traced
+from app.services.upstream import UpstreamUnavailable, get_upstream
 
 
 @dataclass(frozen=True)
@@ -20,6 +20,7 @@ class ItemsParseResult:
     items: list[str]
 
 
+@traced
 class ProtocolParser:
     def __init__(self) -> None:
         if not settings.openai_api_key:
@@ -37,11 +38,7 @@ class ProtocolParser:
                 {"role": "user", "content": user},
             ],
         }
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
+        data = await get_upstream().post_json("/chat/completions", payload, timeout=20)
         content = data["choices"][0]["message"]["content"]
         return json.loads(content)
 
@@ -55,7 +52,10 @@ class ProtocolParser:
             "use the left part as title and parse the rest as items."
         )
         user = f"Parse this into a protocol:\n{text}"
-        data = await self._call_llm(system, user)
+        try:
+            data = await self._call_llm(system, user)
+        except UpstreamUnavailable:
+            return _local_parse_protocol(text)
         if data.get("fallback"):
             cleaned = text.strip()
             if cleaned and len(cleaned) <= 40 and len(cleaned.split()) <= 3:
@@ -80,7 +80,10 @@ class ProtocolParser:
             "If input is a single short phrase, return it as the only item."
         )
         user = f"Parse this into items:\n{text}"
-        data = await self._call_llm(system, user)
+        try:
+            data = await self._call_llm(system, user)
+        except UpstreamUnavailable:
+            return _local_parse_items(text)
         if data.get("fallback"):
             cleaned = text.strip()
             if cleaned and len(cleaned) <= 40 and len(cleaned.split()) <= 3:
@@ -108,3 +111,33 @@ def _infer_title_from_items(items: list[str]) -> str:
     if len(items) == 1:
         return first[:40]
     return first if len(first.split()) <= 3 else "Checklist"
+
+
+_TITLE_DELIMITER = re.compile(r"\s*(?::|—|\s-\s)\s*")
+_ITEM_SEPARATOR = re.compile(r"\s*(?:\n|;|,)\s*")
+
+
+def _split_items(text: str) -> list[str]:
+    items = [part.strip(" -•*\t") for part in _ITEM_SEPARATOR.split(text)]
+    return [item for item in items if item]
+
+
+def _local_parse_protocol(text: str) -> ProtocolParseResult:
+    # Mirrors the rules of the LLM prompt for when the upstream is unavailable.
+    cleaned = text.strip()
+    if not cleaned:
+        raise ValueError("Unable to parse")
+    head, *rest = _TITLE_DELIMITER.split(cleaned, maxsplit=1)
+    if rest and head and "\n" not in head:
+        return ProtocolParseResult(title=head[:255], items=_split_items(rest[0]))
+    items = _split_items(cleaned)
+    if len(items) <= 1:
+        return ProtocolParseResult(title=cleaned[:255], items=[])
+    return ProtocolParseResult(title=_infer_title_from_items(items), items=items)
+
+
+def _local_parse_items(text: str) -> ItemsParseResult:
+    items = _split_items(text)
+    if not items:
+        raise ValueError("Unable to parse")
+    return ItemsParseResult(items=items)
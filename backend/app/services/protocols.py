@@ -1,38 +1,87 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.storage.repositories import ProtocolRepository, UserRepository
+from app.core.config import settings
+from app.core.tracing import traced
+from app.storage.cache import protocol_content
+from app.storage.repositories import ItemRepository, ProtocolRepository, ScheduleRepository, UserRepository
 
 
+@traced
 class ProtocolService:
     def __init__(self, session: AsyncSession) -> None:
         self.repo = ProtocolRepository(session)
         self.user_repo = UserRepository(session)
+        self.item_repo = ItemRepository(session)
+        self.schedule_repo = ScheduleRepository(session)
         self.session = session
 
     async def list(self, user_id: int):
         return await self.repo.list(user_id)
 
+    async def overview(self, user_id: int):
+        return await self.repo.overview(user_id)
+
     async def create(self, user_id: int, title: str):
         await self.user_repo.ensure(user_id)
-        protocols = await self.repo.list(user_id)
-        order_index = len(protocols)
+        order_index = await self.repo.next_order_index(user_id)
         protocol = await self.repo.create(user_id, title, order_index)
         await self.session.commit()
         return protocol
 
+    async def quick_create(self, user_id: int, title: str, item_titles: list[str]):
+        await self.user_repo.ensure(user_id)
+        protocol = await self.repo.create(user_id, title, await self.repo.next_order_index(user_id))
+        items = await self.item_repo.bulk_create(protocol.id, item_titles)
+        await self.session.commit()
+        return protocol, items
+
+    async def clone(self, protocol_id: int, user_id: int, title: str | None = None):
+        source = await self.repo.get(protocol_id, user_id)
+        if source is None:
+            return None
+        order_index = await self.repo.next_order_index(user_id)
+        protocol = await self.repo.create(user_id, title or f"{source.title} (copy)", order_index)
+        await self.item_repo.copy_from(source.id, protocol.id)
+        await self.session.commit()
+        return protocol
+
     async def get(self, protocol_id: int):
         return await self.repo.get(protocol_id)
 
-    async def rename(self, protocol_id: int, title: str):
+    async def version(self, protocol_id: int) -> int | None:
+        return await self.repo.get_version(protocol_id)
+
+    async def rename(self, user_id: int, protocol_id: int, title: str) -> bool:
+        if await self.repo.get(protocol_id, user_id) is None:
+            return False
         await self.repo.rename(protocol_id, title)
         await self.session.commit()
+        return True
 
-    async def delete(self, protocol_id: int):
+    async def delete(self, user_id: int, protocol_id: int) -> bool:
+        if await self.repo.get(protocol_id, user_id) is None:
+            return False
         await self.repo.delete(protocol_id)
+        await self.schedule_repo.touch_protocol(protocol_id)
+        await self.session.commit()
+        protocol_content.invalidate(protocol_id)
+        return True
+
+    async def restore(self, user_id: int, protocol_id: int) -> bool:
+        deleted_after = datetime.now(timezone.utc) - timedelta(seconds=settings.delete_grace_seconds)
+        restored = await self.repo.restore(protocol_id, user_id, deleted_after)
+        if restored:
+            await self.schedule_repo.touch_protocol(protocol_id)
         await self.session.commit()
+        return restored
 
-    async def reorder(self, ordered_ids: list[int]):
+    async def reorder(self, user_id: int, ordered_ids: list[int]) -> bool:
+        if not set(ordered_ids) <= {p.id for p in await self.repo.list(user_id)}:
+            return False
         await self.repo.reorder(ordered_ids)
         await self.session.commit()
+        return True
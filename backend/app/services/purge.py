@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.storage.repositories import ItemRepository, ProtocolRepository, ScheduleRepository
+
+logger = logging.getLogger(__name__)
+
+
+# Hard-deletes protocols whose tombstone is older than the grace period. Each batch is its own
+# short transaction followed by a pause, so purging a huge protocol never holds long locks.
+class Purger:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        grace: float = 86400,
+        interval: float = 60,
+        batch_size: int = 500,
+        pause: float = 0.05,
+    ) -> None:
+        self.session_factory = session_factory
+        self.grace = grace
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+        self.protocols_purged = 0
+        self.items_purged = 0
+        self.schedules_purged = 0
+
+    async def run_once(self) -> int:
+        # Restores only succeed while deleted_at is inside the grace window, and this only picks
+        # tombstones outside it, so a protocol is never restored halfway through its purge.
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace)
+        async with self.session_factory() as session:
+            # Schedule tombstones only need to outlive the bot scheduler's reload interval.
+            self.schedules_purged += await ScheduleRepository(session).purge_deleted(cutoff)
+            await session.commit()
+            protocol_ids = await ProtocolRepository(session).deleted_before(cutoff, limit=100)
+        for protocol_id in protocol_ids:
+            await self._purge_protocol(protocol_id)
+            if self._stopping.is_set():
+                break
+        return len(protocol_ids)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _purge_protocol(self, protocol_id: int) -> None:
+        while not self._stopping.is_set():
+            async with self.session_factory() as session:
+                purged = await ItemRepository(session).purge_batch(protocol_id, self.batch_size)
+                if purged == 0:
+                    await ProtocolRepository(session).purge(protocol_id)
+                await session.commit()
+            if purged == 0:
+                self.protocols_purged += 1
+                return
+            self.items_purged += purged
+            await asyncio.sleep(self.pause)
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.run_once()
+            except Exception:  # noqa: BLE001
+                logger.exception("Purge pass failed; will retry")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.core.db import ShardRouter
+from app.storage import models
+from app.storage.repositories import ScheduleRepository, UserDataRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Move:
+    user_id: int
+    source: int
+    target: int
+
+
+# Moves users between shards, one user per transaction on each side. Moved rows are renumbered into
+# the target shard's id range, so keyboards already sent for them answer "not found" afterwards.
+# Users are first marked as moving, which makes every process refuse their requests once its cached
+# directory entry expires; only after that `settle` time are the rows copied and the source deleted,
+# so no write can land on the source after it was copied. Their schedules are tombstoned on the
+# source at the same time, so the source shard's reminder scheduler drops them during the settle.
+class Rebalancer:
+    def __init__(self, shards: ShardRouter, batch_size: int = 500, settle: float | None = None) -> None:
+        self.shards = shards
+        self.batch_size = batch_size
+        # Other processes' directory cache TTL or the scheduler's reload interval, whichever is
+        # longer, plus time for requests that resolved the shard just before their entry expired.
+        if settle is None:
+            settle = max(shards.cache_ttl, settings.reminder_reload_seconds) + 5
+        self.settle = settle
+        self.users_moved = 0
+        self.rows_moved = 0
+
+    async def placements(self) -> AsyncIterator[tuple[int, int]]:
+        # Yields (user_id, shard) for every user row; the data is where its users row is.
+        for shard in range(len(self.shards)):
+            after_id = -(2**63)
+            while True:
+                async with self.shards.session(shard) as session:
+                    user_ids = await UserDataRepository(session).user_ids(after_id, self.batch_size)
+                for user_id in user_ids:
+                    yield user_id, shard
+                if len(user_ids) < self.batch_size:
+                    break
+                after_id = user_ids[-1]
+
+    async def plan(self) -> list[Move]:
+        return [
+            Move(user_id, shard, self.shards.ring.shard_for(user_id))
+            async for user_id, shard in self.placements()
+            if self.shards.ring.shard_for(user_id) != shard
+        ]
+
+    async def pin_current(self) -> int:
+        # Run with the new shard list before deploying it: users the new ring would look for
+        # elsewhere stay reachable where they are until they are moved.
+        moves = await self.plan()
+        for move in moves:
+            await self.shards.pin(move.user_id, move.source)
+        return len(moves)
+
+    async def run(self) -> int:
+        moves = await self.plan()
+        # Batched so the settle wait is paid once per batch rather than once per user.
+        for start in range(0, len(moves), self.batch_size):
+            await self.move_batch(moves[start : start + self.batch_size])
+        return len(moves)
+
+    async def move(self, user_id: int, source: int, target: int) -> int:
+        return await self.move_batch([Move(user_id, source, target)])
+
+    async def move_batch(self, moves: list[Move]) -> int:
+        moves = [move for move in moves if move.source != move.target]
+        if not moves:
+            return 0
+        retired_at = datetime.now(timezone.utc)
+        moved = count = 0
+        try:
+            for move in moves:
+                await self.shards.pin(move.user_id, move.source, moving=True)
+                await self._retire_schedules(move, retired_at)
+            await asyncio.sleep(self.settle)
+            for move in moves:
+                count += await self._transfer(move, retired_at)
+                moved += 1
+        finally:
+            # Users not transferred (an error, or a cancelled run) go back to serving from the source.
+            for move in moves[moved:]:
+                await self._place(move.user_id, move.source)
+                async with self.shards.session(move.source) as session:
+                    await ScheduleRepository(session).revive_for_user(move.user_id, retired_at)
+                    await session.commit()
+        return count
+
+    async def _retire_schedules(self, move: Move, retired_at: datetime) -> None:
+        async with self.shards.session(move.source) as session:
+            await ScheduleRepository(session).retire_for_user(move.user_id, retired_at)
+            await session.commit()
+
+    async def _place(self, user_id: int, shard: int) -> None:
+        await self.shards.pin(user_id, None if self.shards.ring.shard_for(user_id) == shard else shard)
+
+    async def _transfer(self, move: Move, retired_at: datetime) -> int:
+        user_id, source, target = move.user_id, move.source, move.target
+        async with self.shards.session(source) as session:
+            rows = await UserDataRepository(session).export(user_id, retired_at)
+        if not rows[models.User]:
+            await self._place(user_id, source)
+            return 0
+        async with self.shards.session(target) as session:
+            repo = UserDataRepository(session)
+            # Leftovers of an interrupted earlier move are replaced rather than conflicting.
+            await repo.delete(user_id)
+            count = await repo.import_rows(rows)
+            await session.commit()
+        await self._place(user_id, target)
+        async with self.shards.session(source) as session:
+            await UserDataRepository(session).delete(user_id)
+            await session.commit()
+
+        self.users_moved += 1
+        self.rows_moved += count
+        logger.info("Moved user %s from shard %s to %s (%s rows)", user_id, source, target, count)
+        return count
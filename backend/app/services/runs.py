@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Protocol
+
+from app.core.db import ShardRouter
+from app.storage.repositories import ItemRepository, ItemStatusRepository
+
+logger = logging.getLogger(__name__)
+
+RunKey = tuple[int, int]  # (user_id, protocol_id)
+
+
+@dataclass
+class RunState:
+    item_ids: frozenset[int]
+    checked: set[int] = field(default_factory=set)
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.item_ids) and self.checked >= self.item_ids
+
+
+class RunStateBackend(Protocol):
+    # Holds the live checked bitmap of active runs. A shared implementation (e.g. Redis hashes)
+    # lets several bot workers render from the same state.
+    async def get(self, key: RunKey) -> RunState | None: ...
+
+    async def set(self, key: RunKey, state: RunState) -> None: ...
+
+    async def delete(self, key: RunKey) -> None: ...
+
+
+class InMemoryRunStateBackend:
+    def __init__(self, max_runs: int = 50_000) -> None:
+        self.max_runs = max_runs
+        self._runs: OrderedDict[RunKey, RunState] = OrderedDict()
+
+    async def get(self, key: RunKey) -> RunState | None:
+        state = self._runs.get(key)
+        if state is not None:
+            self._runs.move_to_end(key)
+        return state
+
+    async def set(self, key: RunKey, state: RunState) -> None:
+        # Evicting is safe: a later get() reloads from item_status plus any unflushed taps.
+        self._runs[key] = state
+        self._runs.move_to_end(key)
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+
+    async def delete(self, key: RunKey) -> None:
+        self._runs.pop(key, None)
+
+
+class RunStateStore:
+    def __init__(
+        self,
+        shards: ShardRouter,
+        backend: RunStateBackend | None = None,
+        flush_interval: float = 0.5,
+    ) -> None:
+        # flush_interval is the durability window: taps younger than this may be lost on a crash.
+        # 0 makes every toggle write through before returning.
+        self.shards = shards
+        self.backend = backend or InMemoryRunStateBackend()
+        self.flush_interval = flush_interval
+        self._dirty: dict[tuple[int, int, int], tuple[bool, datetime]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._closing = False
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    async def start_run(self, user_id: int, protocol_id: int, item_ids: list[int]) -> RunState:
+        async with self._flush_lock:
+            # Drop unflushed taps from the previous run so they cannot land after the reset.
+            for dirty_key in [k for k in self._dirty if k[:2] == (user_id, protocol_id)]:
+                del self._dirty[dirty_key]
+            async with self.shards.session_for_user(user_id) as session:
+                await ItemStatusRepository(session).reset_for_protocol(user_id, protocol_id)
+                await session.commit()
+        state = RunState(item_ids=frozenset(item_ids))
+        await self.backend.set((user_id, protocol_id), state)
+        return state
+
+    async def get(self, user_id: int, protocol_id: int) -> RunState:
+        state = await self.backend.get((user_id, protocol_id))
+        if state is None:
+            state = await self._load(user_id, protocol_id)
+        return state
+
+    async def reload(self, user_id: int, protocol_id: int) -> RunState:
+        return await self._load(user_id, protocol_id)
+
+    async def toggle(self, user_id: int, protocol_id: int, item_id: int) -> RunState:
+        state = await self.get(user_id, protocol_id)
+        if item_id not in state.item_ids:
+            # Items may have been added in the Mini App since the run was loaded.
+            state = await self._load(user_id, protocol_id)
+            if item_id not in state.item_ids:
+                return state
+        checked = item_id not in state.checked
+        if checked:
+            state.checked.add(item_id)
+        else:
+            state.checked.discard(item_id)
+        await self.backend.set((user_id, protocol_id), state)
+        self._dirty[(user_id, protocol_id, item_id)] = (checked, datetime.now(timezone.utc))
+
+        if self.flush_interval <= 0 or self._closing:
+            await self.flush()
+        else:
+            self._ensure_flusher()
+            if state.complete:
+                self._wakeup.set()
+        return state
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            flushed = 0
+            try:
+                by_shard: dict[int, dict] = defaultdict(dict)
+                for key, value in batch.items():
+                    by_shard[await self.shards.shard_for_user(key[0])][key] = value
+                # One transaction per shard; upserts are idempotent, so a retry after a partial
+                # failure rewrites the shards that already committed.
+                for shard, part in by_shard.items():
+                    async with self.shards.session(shard) as session:
+                        existing = await ItemRepository(session).existing_ids(list({k[2] for k in part}))
+                        rows = [
+                            {"user_id": u, "protocol_id": p, "item_id": i, "checked": checked, "updated_at": at}
+                            for (u, p, i), (checked, at) in part.items()
+                            if i in existing
+                        ]
+                        await ItemStatusRepository(session).upsert_many(rows)
+                        await session.commit()
+                    flushed += len(rows)
+            except BaseException:
+                # Put the batch back without clobbering taps that arrived meanwhile.
+                for key, value in batch.items():
+                    self._dirty.setdefault(key, value)
+                raise
+            self.flushes += 1
+            self.rows_flushed += flushed
+
+    async def close(self) -> None:
+        # Let the flusher finish its current batch rather than cancelling it mid-write.
+        self._closing = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def _load(self, user_id: int, protocol_id: int) -> RunState:
+        async with self.shards.session_for_user(user_id) as session:
+            items = await ItemRepository(session).list(protocol_id)
+            statuses = await ItemStatusRepository(session).list_for_protocol(user_id, protocol_id)
+        state = RunState(item_ids=frozenset(i.id for i in items), checked={s.item_id for s in statuses if s.checked})
+        # Unflushed taps are newer than what the database returned.
+        for (u, p, item_id), (checked, _) in self._dirty.items():
+            if (u, p) != (user_id, protocol_id):
+                continue
+            if checked:
+                state.checked.add(item_id)
+            else:
+                state.checked.discard(item_id)
+        await self.backend.set((user_id, protocol_id), state)
+        return state
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("Run state flush failed; will retry")
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.tracing import traced
+from app.storage.repositories import ProtocolRepository, ScheduleRepository, UserRepository
+
+ALL_WEEKDAYS = 0b1111111
+
+
+def next_occurrence(minute_of_day: int, weekdays: int, timezone_name: str, after: datetime) -> datetime | None:
+    # First local time-of-day strictly after `after` on an enabled weekday, returned in UTC.
+    if not weekdays & ALL_WEEKDAYS:
+        return None
+    tz = ZoneInfo(timezone_name)
+    local_day = after.astimezone(tz).date()
+    hour, minute = divmod(minute_of_day, 60)
+    for offset in range(8):
+        day = local_day + timedelta(days=offset)
+        if not weekdays & (1 << day.weekday()):
+            continue
+        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz).astimezone(timezone.utc)
+        if candidate > after:
+            return candidate
+    return None
+
+
+@traced
+class ScheduleService:
+    def __init__(self, session: AsyncSession) -> None:
+        self.repo = ScheduleRepository(session)
+        self.protocol_repo = ProtocolRepository(session)
+        self.user_repo = UserRepository(session)
+        self.session = session
+
+    async def list(self, user_id: int, protocol_id: int):
+        if await self.protocol_repo.get(protocol_id, user_id) is None:
+            return None
+        return await self.repo.list_for_protocol(protocol_id)
+
+    async def get(self, schedule_id: int):
+        return await self.repo.get(schedule_id)
+
+    async def create(self, user_id: int, protocol_id: int, minute_of_day: int, weekdays: int, timezone_name: str):
+        if await self.protocol_repo.get(protocol_id, user_id) is None:
+            return None
+        await self.user_repo.ensure(user_id)
+        schedule = await self.repo.create(user_id, protocol_id, minute_of_day, weekdays, timezone_name)
+        await self.session.commit()
+        return schedule
+
+    async def update(self, user_id: int, schedule_id: int, **values):
+        if await self.repo.get(schedule_id, user_id) is None:
+            return None
+        await self.repo.update(schedule_id, **values)
+        await self.session.commit()
+        return await self.repo.get(schedule_id)
+
+    async def delete(self, user_id: int, schedule_id: int) -> bool:
+        if await self.repo.get(schedule_id, user_id) is None:
+            return False
+        await self.repo.delete(schedule_id)
+        await self.session.commit()
+        return True
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.tracing import traced
 from app.storage.repositories import ItemRepository, ItemStatusRepository
 
 
+@traced
 class ItemStatusService:
     def __init__(self, session: AsyncSession) -> None:
         self.repo = ItemStatusRepository(session)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.tracing import traced
+from app.storage.repositories import ItemRepository, ProtocolRepository, TemplateRepository, UserRepository
+
+
+@traced
+class TemplateService:
+    def __init__(self, session: AsyncSession, protocol_session: AsyncSession | None = None) -> None:
+        # Templates live on the primary shard; protocol_session is the protocol owner's shard when
+        # that is a different database.
+        self.repo = TemplateRepository(session)
+        self.protocol_session = protocol_session or session
+        self.protocol_repo = ProtocolRepository(self.protocol_session)
+        self.item_repo = ItemRepository(self.protocol_session)
+        self.user_repo = UserRepository(self.protocol_session)
+        self.session = session
+
+    async def list(self):
+        return await self.repo.list()
+
+    async def items(self, template_id: int):
+        return await self.repo.list_items(template_id)
+
+    async def publish(self, protocol_id: int, title: str | None = None):
+        protocol = await self.protocol_repo.get(protocol_id)
+        if protocol is None:
+            return None
+        template = await self.repo.create(title or protocol.title)
+        if self.protocol_session is self.session:
+            item_count = await self.repo.copy_items_from_protocol(protocol.id, template.id)
+        else:
+            items = await self.item_repo.list(protocol.id)
+            item_count = await self.repo.add_items(template.id, [(i.title, i.order_index) for i in items])
+        await self.session.commit()
+        return template, item_count
+
+    async def delete(self, template_id: int):
+        await self.repo.delete(template_id)
+        await self.session.commit()
+
+    async def instantiate(self, template_id: int, user_id: int, title: str | None = None):
+        template = await self.repo.get(template_id)
+        if template is None:
+            return None
+        await self.user_repo.ensure(user_id)
+        order_index = await self.protocol_repo.next_order_index(user_id)
+        protocol = await self.protocol_repo.create(user_id, title or template.title, order_index)
+        if self.protocol_session is self.session:
+            await self.item_repo.copy_from_template(template.id, protocol.id)
+        else:
+            items = await self.repo.list_items(template.id)
+            await self.item_repo.bulk_create(protocol.id, [i.title for i in items])
+        await self.protocol_session.commit()
+        return protocol
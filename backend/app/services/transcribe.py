@@ -1,27 +1,23 @@
 from __future__ import annotations
 
-import httpx
-
 from app.core.config import settings
+from app.core.tracing import traced
+from app.services.upstream import get_upstream
 
 
+@traced
 async def transcribe_audio(file) -> str:
+    return await transcribe_bytes(file.filename, await file.read(), file.content_type)
+
+
+@traced
+async def transcribe_bytes(filename: str, content: bytes, content_type: str | None = None) -> str:
     if not settings.openai_api_key:
         raise RuntimeError("OPENAI_API_KEY is not set")
 
-    headers = {"Authorization": f"Bearer {settings.openai_api_key}"}
-    files = {"file": (file.filename, await file.read(), file.content_type or "application/octet-stream")}
+    files = {"file": (filename, content, content_type or "application/octet-stream")}
     data = {"model": settings.openai_stt_model}
-
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/audio/transcriptions",
-            headers=headers,
-            files=files,
-            data=data,
-        )
-        resp.raise_for_status()
-        payload = resp.json()
+    payload = await get_upstream().post_multipart("/audio/transcriptions", data=data, files=files, timeout=30)
 
     text = (payload.get("text") or "").strip()
     if not text:
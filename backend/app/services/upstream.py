@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.tracing import tracer
+
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(RuntimeError):
+    def __init__(self, message: str, status_code: int | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UpstreamUnavailable(UpstreamError):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message, status_code=503)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            # Let exactly one probe through; everyone else keeps failing fast.
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self._probing = False
+
+    def release(self) -> None:
+        # A probe that ended without a verdict (cancelled, undecodable body) lets the next call probe.
+        self._probing = False
+
+
+class UpstreamClient:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        *,
+        max_concurrency: int = 8,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        breaker: CircuitBreaker | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self._headers, transport=self._transport
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post_json(self, path: str, payload: dict, *, timeout: float) -> dict:
+        key = _fingerprint(path, json.dumps(payload, sort_keys=True).encode())
+        return await self._singleflight(key, lambda: self._request(path, timeout, json=payload))
+
+    async def post_multipart(self, path: str, data: dict, files: dict, *, timeout: float) -> dict:
+        parts = [json.dumps(data, sort_keys=True).encode()]
+        parts += [name.encode() + b"\0" + f[1] for name, f in sorted(files.items())]
+        key = _fingerprint(path, *parts)
+        return await self._singleflight(key, lambda: self._request(path, timeout, data=data, files=files))
+
+    async def _singleflight(self, key: str, call: Callable[[], Awaitable[dict]]) -> dict:
+        task = self._inflight.get(key)
+        if task is None:
+            # The upstream call runs as its own task so a cancelled caller does not
+            # cancel it for everyone else waiting on the same key.
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _request(self, path: str, timeout: float, **kwargs: Any) -> dict:
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("Upstream circuit is open", retry_after=self.breaker.retry_after())
+        try:
+            return await self._attempts(path, timeout, **kwargs)
+        finally:
+            if probe:
+                self.breaker.release()
+
+    async def _attempts(self, path: str, timeout: float, **kwargs: Any) -> dict:
+        last_error = "Upstream request failed"
+        for attempt in range(self.max_retries + 1):
+            retry_after: float | None = None
+            try:
+                async with self._semaphore:
+                    with tracer.span(
+                        f"POST {path}", **{"http.url": self.base_url + path, "upstream.attempt": attempt}
+                    ) as span:
+                        resp = await self._http().post(path, timeout=timeout, **kwargs)
+                        if span is not None:
+                            span.attributes["http.status_code"] = resp.status_code
+            except httpx.TransportError as exc:
+                last_error = f"{type(exc).__name__}: {exc}"
+            else:
+                if resp.status_code < 400:
+                    self.breaker.record_success()
+                    return resp.json()
+                if resp.status_code not in RETRYABLE_STATUSES:
+                    # Caller errors (bad key, bad payload) still mean the upstream is up and answering.
+                    self.breaker.record_success()
+                    raise UpstreamError(f"Upstream returned {resp.status_code}", status_code=resp.status_code)
+                last_error = f"Upstream returned {resp.status_code}"
+                retry_after = _parse_retry_after(resp.headers.get("retry-after"))
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.breaker.record_failure()
+        raise UpstreamUnavailable(last_error, retry_after=max(self.breaker.retry_after(), 1.0))
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        ceiling = min(self.backoff_max, self.backoff_base * (2**attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+
+def _fingerprint(path: str, *parts: bytes) -> str:
+    digest = hashlib.sha256(path.encode())
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+_upstream: UpstreamClient | None = None
+
+
+def get_upstream() -> UpstreamClient:
+    global _upstream
+    if _upstream is None:
+        _upstream = UpstreamClient(
+            settings.openai_base_url,
+            settings.openai_api_key,
+            max_concurrency=settings.upstream_max_concurrency,
+            max_retries=settings.upstream_max_retries,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.upstream_breaker_threshold,
+                reset_timeout=settings.upstream_breaker_reset_seconds,
+            ),
+        )
+    return _upstream
+
+
+def set_upstream(client: UpstreamClient | None) -> None:
+    global _upstream
+    _upstream = client
+
+
+async def close_upstream() -> None:
+    if _upstream is not None:
+        await _upstream.aclose()
@@ -1,8 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.tracing import traced
 from app.storage.repositories import UserRepository
 
 
+@traced
 class UserService:
     def __init__(self, session: AsyncSession) -> None:
         self.repo = UserRepository(session)
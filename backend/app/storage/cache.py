@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from app.core.config import settings
+
+
+class LRUSet:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, None] = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        if key not in self._entries:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: Hashable) -> None:
+        self._entries[key] = None
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Telegram ids of users known to exist in the database. Users are never deleted, so a hit is
+# always safe to trust; a miss just costs one INSERT ... ON CONFLICT DO NOTHING.
+known_users = LRUSet(settings.known_user_cache_size)
+
+
+class ProtocolContentCache:
+    # Entries are keyed by (protocol_id, version, kind, ...). Every item write bumps the version,
+    # so a stale entry is simply never looked up again; invalidate() only reclaims the memory early.
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, Any] = OrderedDict()
+        self._by_protocol: dict[int, set[tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> Any | None:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: tuple, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._by_protocol.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._untrack(evicted)
+
+    def invalidate(self, protocol_id: int) -> None:
+        for key in self._by_protocol.pop(protocol_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_protocol.clear()
+
+    def _untrack(self, key: tuple) -> None:
+        keys = self._by_protocol.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_protocol[key[0]]
+
+
+# Item lists and rendered keyboards per protocol version, shared by services and the bot.
+protocol_content = ProtocolContentCache(settings.protocol_cache_size)
@@ -1,10 +1,14 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, Integer, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
 
+# Sharded ids carry the shard in their high bits (see app.core.db). SQLite needs plain INTEGER for
+# its rowid primary keys, which are 64-bit anyway.
+ShardedId = BigInteger().with_variant(Integer, "sqlite")
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,11 +22,28 @@ class User(Base):
 
 class Protocol(Base):
     __tablename__ = "protocols"
+    __table_args__ = (
+        # Serves the per-user filter and the ORDER BY order_index of every list query.
+        Index("ix_protocols_user_id_order_index", "user_id", "order_index"),
+        # Only tombstones are indexed; the purger is the one reader.
+        Index(
+            "ix_protocols_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+            sqlite_where=text("deleted_at IS NOT NULL"),
+        ),
+        # Without AUTOINCREMENT SQLite would not keep ids inside the shard's range.
+        {"sqlite_autoincrement": True},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.tg_id"), index=True)
+    id: Mapped[int] = mapped_column(ShardedId, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.tg_id"))
     title: Mapped[str] = mapped_column(String(255))
     order_index: Mapped[int] = mapped_column(Integer)
+    # Bumped on every item change so cached or already-sent keyboards can detect staleness.
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Set on delete; the row and its items stay until the purger removes them after the grace period.
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     user: Mapped[User] = relationship(back_populates="protocols")
     items: Mapped[list["Item"]] = relationship(back_populates="protocol", cascade="all, delete-orphan")
@@ -30,9 +51,13 @@ class Protocol(Base):
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_protocol_id_order_index", "protocol_id", "order_index"),
+        {"sqlite_autoincrement": True},
+    )
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    protocol_id: Mapped[int] = mapped_column(Integer, ForeignKey("protocols.id", ondelete="CASCADE"), index=True)
+    id: Mapped[int] = mapped_column(ShardedId, primary_key=True, autoincrement=True)
+    protocol_id: Mapped[int] = mapped_column(ShardedId, ForeignKey("protocols.id", ondelete="CASCADE"))
     title: Mapped[str] = mapped_column(String(255))
     order_index: Mapped[int] = mapped_column(Integer)
 
@@ -42,11 +67,59 @@ class Item(Base):
 class ItemStatus(Base):
     __tablename__ = "item_status"
     __table_args__ = (
-        UniqueConstraint("user_id", "protocol_id", "item_id", name="uq_item_status"),
+        # Lets item deletes (and their FK cascade) find statuses without scanning the table.
+        Index("ix_item_status_item_id", "item_id"),
     )
 
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.tg_id"), primary_key=True)
-    protocol_id: Mapped[int] = mapped_column(Integer, ForeignKey("protocols.id", ondelete="CASCADE"), primary_key=True)
-    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True)
+    protocol_id: Mapped[int] = mapped_column(
+        ShardedId, ForeignKey("protocols.id", ondelete="CASCADE"), primary_key=True
+    )
+    item_id: Mapped[int] = mapped_column(ShardedId, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True)
     checked: Mapped[bool] = mapped_column(Boolean, default=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+class Template(Base):
+    __tablename__ = "templates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    title: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    items: Mapped[list["TemplateItem"]] = relationship(back_populates="template", cascade="all, delete-orphan")
+
+
+class TemplateItem(Base):
+    __tablename__ = "template_items"
+    __table_args__ = (
+        Index("ix_template_items_template_id_order_index", "template_id", "order_index"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    template_id: Mapped[int] = mapped_column(Integer, ForeignKey("templates.id", ondelete="CASCADE"))
+    title: Mapped[str] = mapped_column(String(255))
+    order_index: Mapped[int] = mapped_column(Integer)
+
+    template: Mapped[Template] = relationship(back_populates="items")
+
+
+class Schedule(Base):
+    __tablename__ = "schedules"
+    __table_args__ = (
+        # The bot scheduler reloads incrementally by updated_at.
+        Index("ix_schedules_updated_at", "updated_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id: Mapped[int] = mapped_column(ShardedId, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.tg_id"))
+    protocol_id: Mapped[int] = mapped_column(ShardedId, ForeignKey("protocols.id", ondelete="CASCADE"), index=True)
+    minute_of_day: Mapped[int] = mapped_column(Integer)
+    # Bit 0 is Monday, bit 6 is Sunday.
+    weekdays: Mapped[int] = mapped_column(Integer, default=0b1111111)
+    timezone: Mapped[str] = mapped_column(String(64), default="UTC")
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Deletes are tombstones so the bot scheduler's updated_at poll sees them; the purger removes them.
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -3,28 +3,128 @@ from __future__ import annotations
 from collections.abc import Sequence
 from datetime import datetime, timezone
 
-from sqlalchemy import delete, select, update
+from sqlalchemy import Integer, and_, case, delete, event, exists, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from app.core.tracing import traced
+from app.domain.models import ProtocolOverview
 from app.storage import models
+from app.storage.cache import known_users
 
 
+def _dialect_insert(session: AsyncSession, table):
+    # ON CONFLICT clauses live on the dialect-specific insert constructs.
+    if session.bind is not None and session.bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def _live_protocol(protocol_id_column, user_id: int | None = None):
+    # Rows under a tombstoned protocol are hidden with it until the purger removes them; given
+    # `user_id`, so are rows under another user's protocol.
+    clause = exists().where(models.Protocol.id == protocol_id_column, models.Protocol.deleted_at.is_(None))
+    if user_id is not None:
+        clause = clause.where(models.Protocol.user_id == user_id)
+    return clause
+
+
+@traced
 class ProtocolRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
     async def list(self, user_id: int) -> Sequence[models.Protocol]:
         result = await self.session.execute(
-            select(models.Protocol).where(models.Protocol.user_id == user_id).order_by(models.Protocol.order_index)
+            select(models.Protocol)
+            .where(models.Protocol.user_id == user_id, models.Protocol.deleted_at.is_(None))
+            .order_by(models.Protocol.order_index)
         )
         return result.scalars().all()
 
-    async def get(self, protocol_id: int) -> models.Protocol | None:
+    async def overview(self, user_id: int) -> list[ProtocolOverview]:
+        # One grouped scan: item_status joins at most one row per item (its primary key
+        # starts with user_id, protocol_id), so COUNT(items.id) is not inflated. Grouping and
+        # ordering by (order_index, id) follow ix_protocols_user_id_order_index, so no sort is needed.
+        status = models.ItemStatus
         result = await self.session.execute(
-            select(models.Protocol).where(models.Protocol.id == protocol_id)
+            select(
+                models.Protocol.id,
+                models.Protocol.title,
+                models.Protocol.order_index,
+                func.count(models.Item.id),
+                func.count(case((status.checked.is_(True), 1))),
+                func.max(status.updated_at),
+            )
+            .outerjoin(models.Item, models.Item.protocol_id == models.Protocol.id)
+            .outerjoin(
+                status,
+                and_(
+                    status.user_id == user_id,
+                    status.protocol_id == models.Protocol.id,
+                    status.item_id == models.Item.id,
+                ),
+            )
+            .where(models.Protocol.user_id == user_id, models.Protocol.deleted_at.is_(None))
+            .group_by(models.Protocol.order_index, models.Protocol.id)
+            .order_by(models.Protocol.order_index, models.Protocol.id)
         )
+        return [
+            ProtocolOverview(
+                id=row[0],
+                title=row[1],
+                order_index=row[2],
+                item_count=row[3],
+                checked_count=row[4],
+                last_activity_at=row[5],
+            )
+            for row in result.all()
+        ]
+
+    async def get(self, protocol_id: int, user_id: int | None = None) -> models.Protocol | None:
+        query = select(models.Protocol).where(models.Protocol.id == protocol_id, models.Protocol.deleted_at.is_(None))
+        if user_id is not None:
+            query = query.where(models.Protocol.user_id == user_id)
+        result = await self.session.execute(query)
         return result.scalar_one_or_none()
 
+    async def get_version(self, protocol_id: int) -> int | None:
+        result = await self.session.execute(
+            select(models.Protocol.version).where(
+                models.Protocol.id == protocol_id, models.Protocol.deleted_at.is_(None)
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def bump_version(self, protocol_id: int) -> None:
+        await self.session.execute(
+            update(models.Protocol)
+            .where(models.Protocol.id == protocol_id)
+            .values(version=models.Protocol.version + 1)
+        )
+
+    async def bump_version_for_items(self, item_ids: list[int]) -> list[int]:
+        result = await self.session.execute(
+            update(models.Protocol)
+            .where(
+                models.Protocol.id.in_(select(models.Item.protocol_id).where(models.Item.id.in_(item_ids))),
+                models.Protocol.deleted_at.is_(None),
+            )
+            .values(version=models.Protocol.version + 1)
+            .returning(models.Protocol.id)
+        )
+        return list(result.scalars().all())
+
+    async def next_order_index(self, user_id: int) -> int:
+        # Tombstones count too: a restored protocol must not share its slot with a newer one.
+        result = await self.session.execute(
+            select(func.coalesce(func.max(models.Protocol.order_index) + 1, 0)).where(
+                models.Protocol.user_id == user_id
+            )
+        )
+        return result.scalar_one()
+
     async def create(self, user_id: int, title: str, order_index: int) -> models.Protocol:
         protocol = models.Protocol(user_id=user_id, title=title, order_index=order_index)
         self.session.add(protocol)
@@ -37,7 +137,40 @@ class ProtocolRepository:
         )
 
     async def delete(self, protocol_id: int) -> None:
-        await self.session.execute(delete(models.Protocol).where(models.Protocol.id == protocol_id))
+        # Tombstone only; the purger removes the row, its items and statuses in small batches.
+        await self.session.execute(
+            update(models.Protocol)
+            .where(models.Protocol.id == protocol_id, models.Protocol.deleted_at.is_(None))
+            .values(deleted_at=datetime.now(timezone.utc))
+        )
+
+    async def restore(self, protocol_id: int, user_id: int, deleted_after: datetime) -> bool:
+        # Comes back at the end of the list; its old slot may have been reused by a reorder since.
+        order_index = await self.next_order_index(user_id)
+        result = await self.session.execute(
+            update(models.Protocol)
+            .where(
+                models.Protocol.id == protocol_id,
+                models.Protocol.user_id == user_id,
+                models.Protocol.deleted_at >= deleted_after,
+            )
+            .values(deleted_at=None, order_index=order_index)
+        )
+        return result.rowcount > 0
+
+    async def deleted_before(self, cutoff: datetime, limit: int) -> list[int]:
+        result = await self.session.execute(
+            select(models.Protocol.id)
+            .where(models.Protocol.deleted_at < cutoff)
+            .order_by(models.Protocol.deleted_at)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def purge(self, protocol_id: int) -> None:
+        await self.session.execute(
+            delete(models.Protocol).where(models.Protocol.id == protocol_id, models.Protocol.deleted_at.is_not(None))
+        )
 
     async def reorder(self, ordered_ids: list[int]) -> None:
         for index, protocol_id in enumerate(ordered_ids):
@@ -46,18 +179,21 @@ class ProtocolRepository:
             )
 
 
+@traced
 class ItemRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
     async def get(self, item_id: int) -> models.Item | None:
-        result = await self.session.execute(select(models.Item).where(models.Item.id == item_id))
+        result = await self.session.execute(
+            select(models.Item).where(models.Item.id == item_id, _live_protocol(models.Item.protocol_id))
+        )
         return result.scalar_one_or_none()
 
     async def list(self, protocol_id: int) -> Sequence[models.Item]:
         result = await self.session.execute(
             select(models.Item)
-            .where(models.Item.protocol_id == protocol_id)
+            .where(models.Item.protocol_id == protocol_id, _live_protocol(models.Item.protocol_id))
             .order_by(models.Item.order_index)
         )
         return result.scalars().all()
@@ -68,17 +204,79 @@ class ItemRepository:
         await self.session.flush()
         return item
 
+    async def bulk_create(self, protocol_id: int, titles: list[str], start_index: int = 0) -> Sequence[models.Item]:
+        if not titles:
+            return []
+        result = await self.session.scalars(
+            insert(models.Item).returning(models.Item, sort_by_parameter_order=True),
+            [
+                {"protocol_id": protocol_id, "title": title, "order_index": start_index + offset}
+                for offset, title in enumerate(titles)
+            ],
+        )
+        return result.all()
+
     async def rename(self, item_id: int, title: str) -> None:
-        await self.session.execute(update(models.Item).where(models.Item.id == item_id).values(title=title))
+        await self.session.execute(
+            update(models.Item)
+            .where(models.Item.id == item_id, _live_protocol(models.Item.protocol_id))
+            .values(title=title)
+        )
 
     async def delete(self, item_id: int) -> None:
-        await self.session.execute(delete(models.Item).where(models.Item.id == item_id))
+        await self.session.execute(
+            delete(models.Item).where(models.Item.id == item_id, _live_protocol(models.Item.protocol_id))
+        )
+
+    async def copy_from(self, source_protocol_id: int, protocol_id: int) -> int:
+        # INSERT ... SELECT keeps the rows inside the database however long the protocol is.
+        result = await self.session.execute(
+            insert(models.Item).from_select(
+                ["protocol_id", "title", "order_index"],
+                select(literal(protocol_id, models.ShardedId), models.Item.title, models.Item.order_index).where(
+                    models.Item.protocol_id == source_protocol_id
+                ),
+            )
+        )
+        return result.rowcount
+
+    async def copy_from_template(self, template_id: int, protocol_id: int) -> int:
+        result = await self.session.execute(
+            insert(models.Item).from_select(
+                ["protocol_id", "title", "order_index"],
+                select(
+                    literal(protocol_id, models.ShardedId), models.TemplateItem.title, models.TemplateItem.order_index
+                ).where(models.TemplateItem.template_id == template_id),
+            )
+        )
+        return result.rowcount
+
+    async def purge_batch(self, protocol_id: int, limit: int) -> int:
+        result = await self.session.execute(
+            select(models.Item.id).where(models.Item.protocol_id == protocol_id).limit(limit)
+        )
+        item_ids = list(result.scalars().all())
+        if item_ids:
+            await self.session.execute(delete(models.ItemStatus).where(models.ItemStatus.item_id.in_(item_ids)))
+            await self.session.execute(delete(models.Item).where(models.Item.id.in_(item_ids)))
+        return len(item_ids)
+
+    async def existing_ids(self, item_ids: list[int], user_id: int | None = None) -> set[int]:
+        result = await self.session.execute(
+            select(models.Item.id).where(models.Item.id.in_(item_ids), _live_protocol(models.Item.protocol_id, user_id))
+        )
+        return set(result.scalars().all())
 
     async def reorder(self, ordered_ids: list[int]) -> None:
         for index, item_id in enumerate(ordered_ids):
-            await self.session.execute(update(models.Item).where(models.Item.id == item_id).values(order_index=index))
+            await self.session.execute(
+                update(models.Item)
+                .where(models.Item.id == item_id, _live_protocol(models.Item.protocol_id))
+                .values(order_index=index)
+            )
 
 
+@traced
 class ItemStatusRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
@@ -88,6 +286,7 @@ class ItemStatusRepository:
             select(models.ItemStatus).where(
                 models.ItemStatus.user_id == user_id,
                 models.ItemStatus.protocol_id == protocol_id,
+                _live_protocol(models.ItemStatus.protocol_id),
             )
         )
         return result.scalars().all()
@@ -98,6 +297,7 @@ class ItemStatusRepository:
                 models.ItemStatus.user_id == user_id,
                 models.ItemStatus.protocol_id == protocol_id,
                 models.ItemStatus.item_id == item_id,
+                _live_protocol(models.ItemStatus.protocol_id),
             )
         )
         return result.scalar_one_or_none()
@@ -113,6 +313,18 @@ class ItemStatusRepository:
             status.checked = checked
             status.updated_at = datetime.now(timezone.utc)
 
+    async def upsert_many(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        stmt = _dialect_insert(self.session, models.ItemStatus)
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[models.ItemStatus.user_id, models.ItemStatus.protocol_id, models.ItemStatus.item_id],
+                set_={"checked": stmt.excluded.checked, "updated_at": stmt.excluded.updated_at},
+            ),
+            rows,
+        )
+
     async def reset_for_protocol(self, user_id: int, protocol_id: int) -> None:
         await self.session.execute(
             update(models.ItemStatus)
@@ -124,6 +336,254 @@ class ItemStatusRepository:
         )
 
 
+@traced
+class TemplateRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def list(self) -> list[tuple[models.Template, int]]:
+        result = await self.session.execute(
+            select(models.Template, func.count(models.TemplateItem.id))
+            .outerjoin(models.TemplateItem, models.TemplateItem.template_id == models.Template.id)
+            .group_by(models.Template.id)
+            .order_by(models.Template.id)
+        )
+        return [(template, item_count) for template, item_count in result.all()]
+
+    async def get(self, template_id: int) -> models.Template | None:
+        result = await self.session.execute(select(models.Template).where(models.Template.id == template_id))
+        return result.scalar_one_or_none()
+
+    async def list_items(self, template_id: int) -> Sequence[models.TemplateItem]:
+        result = await self.session.execute(
+            select(models.TemplateItem)
+            .where(models.TemplateItem.template_id == template_id)
+            .order_by(models.TemplateItem.order_index)
+        )
+        return result.scalars().all()
+
+    async def create(self, title: str) -> models.Template:
+        template = models.Template(title=title)
+        self.session.add(template)
+        await self.session.flush()
+        return template
+
+    async def copy_items_from_protocol(self, protocol_id: int, template_id: int) -> int:
+        result = await self.session.execute(
+            insert(models.TemplateItem).from_select(
+                ["template_id", "title", "order_index"],
+                select(literal(template_id, Integer), models.Item.title, models.Item.order_index).where(
+                    models.Item.protocol_id == protocol_id
+                ),
+            )
+        )
+        return result.rowcount
+
+    async def add_items(self, template_id: int, items: Sequence[tuple[str, int]]) -> int:
+        # For a protocol on another shard, where INSERT ... SELECT cannot reach.
+        if items:
+            await self.session.execute(
+                insert(models.TemplateItem),
+                [{"template_id": template_id, "title": title, "order_index": index} for title, index in items],
+            )
+        return len(items)
+
+    async def delete(self, template_id: int) -> None:
+        await self.session.execute(delete(models.Template).where(models.Template.id == template_id))
+
+
+@traced
+class ScheduleRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def list_for_protocol(self, protocol_id: int) -> Sequence[models.Schedule]:
+        result = await self.session.execute(
+            select(models.Schedule)
+            .where(models.Schedule.protocol_id == protocol_id, models.Schedule.deleted_at.is_(None))
+            .order_by(models.Schedule.id)
+        )
+        return result.scalars().all()
+
+    async def get(self, schedule_id: int, user_id: int | None = None) -> models.Schedule | None:
+        query = select(models.Schedule).where(models.Schedule.id == schedule_id, models.Schedule.deleted_at.is_(None))
+        if user_id is not None:
+            query = query.where(_live_protocol(models.Schedule.protocol_id, user_id))
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none()
+
+    async def create(
+        self, user_id: int, protocol_id: int, minute_of_day: int, weekdays: int, timezone_name: str
+    ) -> models.Schedule:
+        schedule = models.Schedule(
+            user_id=user_id,
+            protocol_id=protocol_id,
+            minute_of_day=minute_of_day,
+            weekdays=weekdays,
+            timezone=timezone_name,
+            enabled=True,
+        )
+        self.session.add(schedule)
+        await self.session.flush()
+        return schedule
+
+    async def update(self, schedule_id: int, **values) -> None:
+        # Every change moves updated_at forward so the bot scheduler picks it up on its next reload.
+        await self.session.execute(
+            update(models.Schedule)
+            .where(models.Schedule.id == schedule_id, models.Schedule.deleted_at.is_(None))
+            .values(**values, updated_at=datetime.now(timezone.utc))
+        )
+
+    async def delete(self, schedule_id: int) -> None:
+        now = datetime.now(timezone.utc)
+        await self.session.execute(
+            update(models.Schedule)
+            .where(models.Schedule.id == schedule_id, models.Schedule.deleted_at.is_(None))
+            .values(deleted_at=now, updated_at=now)
+        )
+
+    async def touch_protocol(self, protocol_id: int) -> None:
+        # Deleting or restoring a protocol changes whether its schedules fire; moving updated_at
+        # makes the scheduler re-read them.
+        await self.session.execute(
+            update(models.Schedule)
+            .where(models.Schedule.protocol_id == protocol_id, models.Schedule.deleted_at.is_(None))
+            .values(updated_at=datetime.now(timezone.utc))
+        )
+
+    async def retire_for_user(self, user_id: int, at: datetime) -> None:
+        # Tombstones a moving user's schedules so this shard's scheduler drops them; the rebalancer
+        # brings them back to life on the target shard, or here again if the move fails.
+        await self.session.execute(
+            update(models.Schedule)
+            .where(models.Schedule.user_id == user_id, models.Schedule.deleted_at.is_(None))
+            .values(deleted_at=at, updated_at=at)
+        )
+
+    async def revive_for_user(self, user_id: int, retired_at: datetime) -> None:
+        await self.session.execute(
+            update(models.Schedule)
+            .where(models.Schedule.user_id == user_id, models.Schedule.deleted_at >= retired_at)
+            .values(deleted_at=None, updated_at=datetime.now(timezone.utc))
+        )
+
+    async def purge_deleted(self, cutoff: datetime) -> int:
+        result = await self.session.execute(delete(models.Schedule).where(models.Schedule.deleted_at < cutoff))
+        return result.rowcount
+
+    async def list_enabled(self, after_id: int, limit: int) -> Sequence[models.Schedule]:
+        result = await self.session.execute(
+            select(models.Schedule)
+            .where(
+                models.Schedule.id > after_id,
+                models.Schedule.enabled.is_(True),
+                models.Schedule.deleted_at.is_(None),
+                _live_protocol(models.Schedule.protocol_id),
+            )
+            .order_by(models.Schedule.id)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def changed_since(self, since: datetime, after_id: int, limit: int) -> list[tuple[models.Schedule, bool]]:
+        # Keyset over (updated_at, id) so pages never skip rows sharing a timestamp. Each row comes
+        # with whether it should fire: enabled, not deleted, and under a live protocol.
+        active = and_(
+            models.Schedule.enabled.is_(True),
+            models.Schedule.deleted_at.is_(None),
+            _live_protocol(models.Schedule.protocol_id),
+        )
+        result = await self.session.execute(
+            select(models.Schedule, active)
+            .where(
+                models.Schedule.updated_at >= since,
+                (models.Schedule.updated_at > since) | (models.Schedule.id > after_id),
+            )
+            .order_by(models.Schedule.updated_at, models.Schedule.id)
+            .limit(limit)
+        )
+        return [(schedule, bool(is_active)) for schedule, is_active in result.all()]
+
+
+# Tables holding a user's rows; everything the rebalancer moves between shards.
+USER_TABLES = (models.User, models.Protocol, models.Item, models.ItemStatus, models.Schedule)
+
+
+@traced
+class UserDataRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def user_ids(self, after_id: int, limit: int) -> list[int]:
+        result = await self.session.execute(
+            select(models.User.tg_id).where(models.User.tg_id > after_id).order_by(models.User.tg_id).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def export(self, user_id: int, retired_at: datetime) -> dict[type, list[dict]]:
+        # Schedules are the live ones plus those retired for this move; older tombstones stay behind.
+        protocol_ids = select(models.Protocol.id).where(models.Protocol.user_id == user_id)
+        filters = {
+            models.User: models.User.tg_id == user_id,
+            models.Protocol: models.Protocol.user_id == user_id,
+            models.Item: models.Item.protocol_id.in_(protocol_ids),
+            models.ItemStatus: models.ItemStatus.user_id == user_id,
+            models.Schedule: and_(
+                models.Schedule.user_id == user_id,
+                models.Schedule.deleted_at.is_(None) | (models.Schedule.deleted_at >= retired_at),
+            ),
+        }
+        rows = {}
+        for model in USER_TABLES:
+            columns = model.__table__.columns
+            result = await self.session.execute(select(*columns).where(filters[model]))
+            rows[model] = [dict(row._mapping) for row in result]
+        return rows
+
+    async def import_rows(self, rows: dict[type, list[dict]]) -> int:
+        # Rows take fresh ids from this shard's sequences, so ids keep naming their shard; references
+        # are remapped table by table.
+        if rows[models.User]:
+            await self.session.execute(insert(models.User), rows[models.User])
+        protocol_ids = await self._insert_renumbered(models.Protocol, rows[models.Protocol], {})
+        item_ids = await self._insert_renumbered(models.Item, rows[models.Item], {"protocol_id": protocol_ids})
+        # Schedules arrive live and freshly stamped: this shard's scheduler only reads rows whose
+        # updated_at is past its watermark.
+        now = datetime.now(timezone.utc)
+        schedules = [{**row, "deleted_at": None, "updated_at": now} for row in rows[models.Schedule]]
+        await self._insert_renumbered(models.Schedule, schedules, {"protocol_id": protocol_ids})
+        statuses = [
+            {**row, "protocol_id": protocol_ids[row["protocol_id"]], "item_id": item_ids[row["item_id"]]}
+            for row in rows[models.ItemStatus]
+            if row["item_id"] in item_ids
+        ]
+        if statuses:
+            await self.session.execute(insert(models.ItemStatus), statuses)
+        return sum(len(batch) for model, batch in rows.items() if model is not models.ItemStatus) + len(statuses)
+
+    async def _insert_renumbered(
+        self, model, rows: list[dict], references: dict[str, dict[int, int]]
+    ) -> dict[int, int]:
+        if not rows:
+            return {}
+        values = [
+            {key: references[key][value] if key in references else value for key, value in row.items() if key != "id"}
+            for row in rows
+        ]
+        result = await self.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), values)
+        return dict(zip((row["id"] for row in rows), result.all()))
+
+    async def delete(self, user_id: int) -> None:
+        protocol_ids = select(models.Protocol.id).where(models.Protocol.user_id == user_id)
+        await self.session.execute(delete(models.ItemStatus).where(models.ItemStatus.user_id == user_id))
+        await self.session.execute(delete(models.Schedule).where(models.Schedule.user_id == user_id))
+        await self.session.execute(delete(models.Item).where(models.Item.protocol_id.in_(protocol_ids)))
+        await self.session.execute(delete(models.Protocol).where(models.Protocol.user_id == user_id))
+        await self.session.execute(delete(models.User).where(models.User.tg_id == user_id))
+
+
+@traced
 class UserRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
@@ -134,10 +594,24 @@ class UserRepository:
         )
         return result.scalar_one_or_none()
 
-    async def ensure(self, tg_id: int, username: str | None = None) -> models.User:
-        user = await self.get(tg_id)
-        if user is None:
-            user = models.User(tg_id=tg_id, username=username)
-            self.session.add(user)
-            await self.session.flush()
-        return user
+    async def ensure(self, tg_id: int, username: str | None = None) -> None:
+        pending = self.session.sync_session.info.setdefault("pending_known_users", set())
+        if tg_id in known_users or tg_id in pending:
+            return
+        await self.session.execute(
+            _dialect_insert(self.session, models.User)
+            .values(tg_id=tg_id, username=username)
+            .on_conflict_do_nothing(index_elements=[models.User.tg_id])
+        )
+        pending.add(tg_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed_users(session: Session) -> None:
+    for tg_id in session.info.pop("pending_known_users", ()):
+        known_users.add(tg_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session) -> None:
+    session.info.pop("pending_known_users", None)
@@ -0,0 +1,76 @@
+"""Bot update throughput: sequential dispatch vs the keyed worker pool, on a fake Bot API.
+
+Run: python backend/benchmarks/bench_bot_dispatch.py [--users 50] [--updates 10] [--workers 16]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+for path in (BACKEND, BACKEND.parent, BACKEND / "tests"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from aiogram import Dispatcher, F, Router
+from aiogram.types import Message
+
+from bot.concurrency import KeyedTaskPool, OrderedUpdateMiddleware
+from fakes import make_bot, message_update
+
+
+def build_router(work_seconds: float) -> Router:
+    router = Router()
+
+    @router.message(F.text)
+    async def handler(message: Message) -> None:
+        # Stands in for a database round trip followed by a Bot API call.
+        await asyncio.sleep(work_seconds)
+        await message.answer("ok")
+
+    return router
+
+
+async def run(users: int, updates: int, workers: int, work_seconds: float, latency: float) -> None:
+    bot = make_bot(latency)
+    total = users * updates
+    pool = KeyedTaskPool(workers=workers, max_pending=total) if workers > 0 else None
+    dp = Dispatcher()
+    if pool is not None:
+        pool.start()
+        dp.update.outer_middleware(OrderedUpdateMiddleware(pool))
+    dp.include_router(build_router(work_seconds))
+
+    started = time.perf_counter()
+    update_id = 0
+    for _ in range(updates):
+        for user_id in range(1, users + 1):
+            update_id += 1
+            await dp.feed_update(bot, message_update(update_id, user_id, "tap"))
+    if pool is not None:
+        await pool.stop(drain=True)
+    elapsed = time.perf_counter() - started
+
+    label = "sequential" if pool is None else f"pool({workers})"
+    depth = pool.stats()["max_pending_seen"] if pool is not None else 0
+    print(f"{label:<12} {total / elapsed:9.1f} updates/s  {elapsed:6.2f} s  max queue depth {depth}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--work-ms", type=float, default=5.0)
+    parser.add_argument("--api-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for workers in (0, args.workers):
+        await run(args.users, args.updates, workers, args.work_ms / 1000, args.api_latency_ms / 1000)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
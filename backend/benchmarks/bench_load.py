@@ -0,0 +1,297 @@
+"""Mixed API + bot load at a fixed open-loop arrival rate, e.g. everyone starting a protocol at 7:00.
+
+Each scenario gets Poisson arrivals at its own rate whether or not earlier calls have finished, so a
+slow server shows up as queueing in the latencies instead of as fewer requests. Latency is measured
+from the scheduled arrival. The API runs in-process over ASGI; quick-create calls a fake LLM and the
+bot handlers answer a fake Bot API.
+
+Run: python backend/benchmarks/bench_load.py [--duration 20] [--users 300]
+         [--mix overview=40,items=40,toggle=120,reorder=5,quick_create=2,open=10]
+         [--out results.json] [--compare previous.json]
+Set BENCH_DATABASE_URL to run against PostgreSQL instead of a temp SQLite file.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+for path in (BACKEND, BACKEND.parent, BACKEND / "tests"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+import httpx
+from aiogram import Dispatcher
+
+from app.core.auth import authenticator
+from app.core.db import ShardRouter, get_shards
+from app.core.ratelimit import rate_limiter
+from app.main import app
+from app.services import parser as parser_module
+from app.services.protocols import ProtocolService
+from app.services.runs import RunStateStore
+from app.services.upstream import UpstreamClient, set_upstream
+from bot import handlers
+from bot.edits import EditScheduler
+from bot.keyboards import encode_toggle, items_keyboard
+from fakes import FakeOpenAI, auth_headers, callback_update, make_bot
+
+SCENARIOS = ("overview", "items", "toggle", "reorder", "quick_create", "open")
+DEFAULT_MIX = "overview=40,items=40,toggle=120,reorder=5,quick_create=2,open=10"
+ITEM_TITLES = ["Water", "Vitamins", "Stretch", "Meditate", "Journal", "Walk", "Read", "Plan"]
+
+
+@dataclass
+class UserData:
+    protocol_id: int
+    item_ids: list[int]
+    version: int
+    headers: dict[str, str]
+
+
+@dataclass
+class Result:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, duration: float) -> dict[str, float]:
+        cuts = statistics.quantiles(self.latencies, n=100) if len(self.latencies) > 1 else [0.0] * 99
+        total = len(self.latencies) + self.errors
+        return {
+            "requests": total,
+            "throughput": round(len(self.latencies) / duration, 1),
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "p50_ms": round(cuts[49] * 1000, 2),
+            "p95_ms": round(cuts[94] * 1000, 2),
+            "p99_ms": round(cuts[98] * 1000, 2),
+            "max_ms": round(max(self.latencies, default=0.0) * 1000, 2),
+        }
+
+
+class Harness:
+    def __init__(self, client: httpx.AsyncClient, dp: Dispatcher, users: dict[int, UserData]) -> None:
+        self.client = client
+        self.dp = dp
+        self.bot = make_bot(latency=0.03)
+        self.users = users
+        self.update_id = 0
+
+    def _next_update(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    @staticmethod
+    def _check(response: httpx.Response) -> None:
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code}")
+
+    async def overview(self, user_id: int) -> None:
+        self._check(await self.client.get("/api/protocols/overview", headers=self.users[user_id].headers))
+
+    async def items(self, user_id: int) -> None:
+        data = self.users[user_id]
+        self._check(await self.client.get(f"/api/protocols/{data.protocol_id}/items", headers=data.headers))
+
+    async def reorder(self, user_id: int) -> None:
+        data = self.users[user_id]
+        ordered = random.sample(data.item_ids, len(data.item_ids))
+        self._check(await self.client.post("/api/items/reorder", json={"ordered_ids": ordered}, headers=data.headers))
+
+    async def quick_create(self, user_id: int) -> None:
+        headers = self.users[user_id].headers
+        response = await self.client.post("/api/protocols/quick-create", json={"text": "Evening: tea"}, headers=headers)
+        self._check(response)
+
+    async def toggle(self, user_id: int) -> None:
+        data = self.users[user_id]
+        markup = items_keyboard(
+            [(item_id, f"Item {item_id}", False) for item_id in data.item_ids], data.protocol_id, data.version
+        )
+        item_id = random.choice(data.item_ids)
+        update = callback_update(
+            self._next_update(), user_id, encode_toggle(data.protocol_id, item_id, data.version), reply_markup=markup
+        )
+        await self.dp.feed_update(self.bot, update)
+
+    async def open(self, user_id: int) -> None:
+        update = callback_update(self._next_update(), user_id, f"p:{self.users[user_id].protocol_id}")
+        await self.dp.feed_update(self.bot, update)
+
+
+async def seed(shards: ShardRouter, users: int, items: int) -> dict[int, UserData]:
+    data = {}
+    for user_id in range(1, users + 1):
+        async with shards.session_for_user(user_id) as session:
+            service = ProtocolService(session)
+            protocol, created = await service.quick_create(user_id, "Morning", (ITEM_TITLES * 8)[:items])
+            data[user_id] = UserData(
+                protocol.id, [item.id for item in created], await service.version(protocol.id), auth_headers(user_id)
+            )
+        await handlers.run_store.start_run(user_id, protocol.id, data[user_id].item_ids)
+    return data
+
+
+async def arrivals(
+    call: Callable[[int], Awaitable[None]], rate: float, duration: float, users: int, result: Result
+) -> None:
+    async def timed(scheduled: float) -> None:
+        try:
+            await call(random.randint(1, users))
+        except Exception:
+            result.errors += 1
+        else:
+            result.latencies.append(time.perf_counter() - scheduled)
+
+    tasks = []
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += random.expovariate(rate)
+        if scheduled - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(asyncio.create_task(timed(scheduled)))
+    await asyncio.gather(*tasks)
+
+
+async def sample_pool(shards: ShardRouter, samples: list[tuple[int, int]], stop: asyncio.Event) -> None:
+    pools = [sessionmaker.kw["bind"].sync_engine.pool for sessionmaker in shards.sessionmakers]
+    while not stop.is_set():
+        in_use = sum(pool.checkedout() for pool in pools if hasattr(pool, "checkedout"))
+        capacity = sum(pool.size() + max(pool._max_overflow, 0) for pool in pools if hasattr(pool, "size"))
+        samples.append((in_use, capacity))
+        await asyncio.sleep(0.01)
+
+
+def pool_summary(samples: list[tuple[int, int]]) -> dict[str, float]:
+    if not samples:
+        return {}
+    in_use = [used for used, _ in samples]
+    return {
+        "capacity": samples[0][1],
+        "mean_in_use": round(statistics.fmean(in_use), 2),
+        "max_in_use": max(in_use),
+        "saturated_share": round(sum(1 for used, capacity in samples if used >= capacity) / len(samples), 4),
+    }
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, rate = part.split("=")
+        mix[name.strip()] = float(rate)
+    return mix
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BACKEND, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def report(results: dict, previous: dict | None) -> None:
+    print(f"{'scenario':<14}{'req/s':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results["scenarios"].items():
+        line = (
+            f"{name:<14}{stats['throughput']:>9.1f}{stats['error_rate']:>9.2%}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+        before = (previous or {}).get("scenarios", {}).get(name)
+        if before and before["p95_ms"]:
+            line += f"   p95 {stats['p95_ms'] / before['p95_ms'] - 1:+.0%} vs {previous['revision']}"
+        print(line)
+    pool = results["pool"]
+    if pool:
+        print(
+            f"db pool: {pool['mean_in_use']:.1f} mean / {pool['max_in_use']} max of {pool['capacity']} connections,"
+            f" saturated {pool['saturated_share']:.1%} of samples"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--items", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=arrivals per second, comma-separated")
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    parser.add_argument("--out", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    if unknown := set(mix) - set(SCENARIOS):
+        parser.error(f"unknown scenarios {sorted(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    # Per-user limits would turn the synthetic users' traffic into 429s.
+    rate_limiter.enabled = False
+    # Each synthetic user gets a session token up front, as the Mini App would after signing in.
+    authenticator.secret = authenticator.secret or b"bench"
+    fake = FakeOpenAI(delay=args.llm_delay)
+    set_upstream(UpstreamClient("http://fake-openai", "k", transport=httpx.ASGITransport(app=fake.app)))
+    parser_module.settings = dataclasses.replace(parser_module.settings, openai_api_key="k")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = ShardRouter.from_urls([os.getenv("BENCH_DATABASE_URL") or f"sqlite+aiosqlite:///{tmp}/load.db"])
+        await shards.prepare()
+        app.dependency_overrides[get_shards] = lambda: shards
+        handlers.shards = shards
+        handlers.run_store = RunStateStore(shards, flush_interval=0.5)
+        handlers.edit_scheduler = EditScheduler()
+        dp = Dispatcher()
+        dp.include_router(handlers.router)
+
+        users = await seed(shards, args.users, args.items)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+            harness = Harness(client, dp, users)
+            outcomes = {name: Result() for name in mix}
+            samples: list[tuple[int, int]] = []
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(sample_pool(shards, samples, stop))
+            print(f"{args.users} users, {args.duration:.0f} s, arrivals/s: {args.mix}")
+            await asyncio.gather(
+                *(
+                    arrivals(getattr(harness, name), rate, args.duration, args.users, outcomes[name])
+                    for name, rate in mix.items()
+                )
+            )
+            stop.set()
+            await sampler
+
+        await handlers.edit_scheduler.flush()
+        await handlers.run_store.close()
+        await shards.dispose()
+        set_upstream(None)
+
+    results = {
+        "revision": git_revision(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"duration": args.duration, "users": args.users, "items": args.items, "mix": mix},
+        "scenarios": {name: outcome.summary(args.duration) for name, outcome in outcomes.items()},
+        "pool": pool_summary(samples),
+    }
+    previous = json.loads(args.compare.read_text()) if args.compare else None
+    report(results, previous)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Protocol overview at 1k protocols per user: one GROUP BY vs the N+1 client pattern.
+
+Run: python backend/benchmarks/bench_overview.py [--protocols 1000] [--items 10]
+Set BENCH_DATABASE_URL to benchmark against PostgreSQL instead of a temp SQLite file.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+if str(BACKEND) not in sys.path:
+    sys.path.append(str(BACKEND))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.db import Base
+from app.storage import models
+from app.storage.repositories import ItemRepository, ProtocolRepository
+
+USER_ID = 1
+
+
+async def seed(session: AsyncSession, protocols: int, items: int) -> None:
+    await session.execute(insert(models.User), [{"tg_id": USER_ID, "username": "bench"}])
+    await session.execute(
+        insert(models.Protocol),
+        [{"id": p + 1, "user_id": USER_ID, "title": f"P{p}", "order_index": p} for p in range(protocols)],
+    )
+    await session.execute(
+        insert(models.Item),
+        [
+            {"protocol_id": p + 1, "title": f"I{i}", "order_index": i}
+            for p in range(protocols)
+            for i in range(items)
+        ],
+    )
+    await session.execute(
+        insert(models.ItemStatus),
+        [
+            {"user_id": USER_ID, "protocol_id": p + 1, "item_id": p * items + i + 1, "checked": True}
+            for p in range(protocols)
+            for i in range(0, items, 2)
+        ],
+    )
+    await session.commit()
+
+
+async def timed(label: str, fn, rounds: int) -> None:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await fn()
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"{label:<28} {elapsed * 1000:9.2f} ms/call")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocols", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.getenv("BENCH_DATABASE_URL") or f"sqlite+aiosqlite:///{tmp}/bench.db"
+        engine = create_async_engine(url)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+        async with session_factory() as session:
+            await seed(session, args.protocols, args.items)
+
+        async with session_factory() as session:
+            protocols = ProtocolRepository(session)
+            items = ItemRepository(session)
+
+            async def overview() -> None:
+                await protocols.overview(USER_ID)
+
+            async def n_plus_one() -> None:
+                for protocol in await protocols.list(USER_ID):
+                    await items.list(protocol.id)
+
+            print(f"{args.protocols} protocols x {args.items} items on {engine.dialect.name}")
+            await timed("overview (GROUP BY)", overview, args.rounds)
+            await timed("list + items per protocol", n_plus_one, args.rounds)
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
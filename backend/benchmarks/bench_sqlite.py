@@ -0,0 +1,86 @@
+"""Embedded SQLite: default settings vs the tuned mode (WAL, synchronous=NORMAL, write queue).
+
+Concurrent writers each create protocols one commit at a time while readers load overviews.
+
+Run: python backend/benchmarks/bench_sqlite.py [--writers 8] [--writes 50] [--readers 8]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+if str(BACKEND) not in sys.path:
+    sys.path.append(str(BACKEND))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.db import Base, tune_sqlite
+from app.services.protocols import ProtocolService
+from app.storage.repositories import ProtocolRepository
+
+
+async def run(label: str, url: str, tuned: bool, writers: int, writes: int, readers: int) -> None:
+    engine = create_async_engine(url)
+    if tuned:
+        tune_sqlite(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    errors = 0
+    read_latencies: list[float] = []
+    writing = True
+
+    async def writer(user_id: int) -> None:
+        nonlocal errors
+        for n in range(writes):
+            try:
+                async with sessionmaker() as session:
+                    await ProtocolService(session).create(user_id, f"P{n}")
+            except OperationalError:
+                errors += 1
+
+    async def reader(user_id: int) -> None:
+        while writing:
+            started = time.perf_counter()
+            async with sessionmaker() as session:
+                await ProtocolRepository(session).overview(user_id)
+            read_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    reading = [asyncio.create_task(reader(user_id)) for user_id in range(1, readers + 1)]
+    await asyncio.gather(*(writer(user_id) for user_id in range(1, writers + 1)))
+    elapsed = time.perf_counter() - started
+    writing = False
+    await asyncio.gather(*reading)
+    await engine.dispose()
+
+    p95 = statistics.quantiles(read_latencies, n=20)[-1] if len(read_latencies) > 1 else 0.0
+    print(
+        f"{label:<8} {writers * writes / elapsed:8.1f} writes/s  {len(read_latencies) / elapsed:8.1f} reads/s"
+        f"  read p95 {p95 * 1000:7.2f} ms  errors {errors}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.writes} commits, {args.readers} readers")
+    with tempfile.TemporaryDirectory() as tmp:
+        await run("default", f"sqlite+aiosqlite:///{tmp}/default.db", False, args.writers, args.writes, args.readers)
+        await run("tuned", f"sqlite+aiosqlite:///{tmp}/tuned.db", True, args.writers, args.writes, args.readers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+"""add protocol content version
+
+Revision ID: 0003_protocol_version
+Revises: 0002_timestamptz
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_protocol_version"
+down_revision = "0002_timestamptz"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "protocols",
+        sa.Column("version", sa.Integer(), server_default=sa.text("0"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("protocols", "version")
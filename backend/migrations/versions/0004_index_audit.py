@@ -0,0 +1,34 @@
+"""composite list indexes, drop duplicate item_status constraint
+
+Revision ID: 0004_index_audit
+Revises: 0003_protocol_version
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_index_audit"
+down_revision = "0003_protocol_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The composite indexes lead with the old single-column ones, so those become redundant.
+    op.create_index("ix_protocols_user_id_order_index", "protocols", ["user_id", "order_index"], unique=False)
+    op.drop_index("ix_protocols_user_id", table_name="protocols")
+    op.create_index("ix_items_protocol_id_order_index", "items", ["protocol_id", "order_index"], unique=False)
+    op.drop_index("ix_items_protocol_id", table_name="items")
+    # Identical to the primary key.
+    op.drop_constraint("uq_item_status", "item_status", type_="unique")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint("uq_item_status", "item_status", ["user_id", "protocol_id", "item_id"])
+    op.create_index("ix_items_protocol_id", "items", ["protocol_id"], unique=False)
+    op.drop_index("ix_items_protocol_id_order_index", table_name="items")
+    op.create_index("ix_protocols_user_id", "protocols", ["user_id"], unique=False)
+    op.drop_index("ix_protocols_user_id_order_index", table_name="protocols")
@@ -0,0 +1,34 @@
+"""soft delete protocols
+
+Revision ID: 0005_soft_delete
+Revises: 0004_index_audit
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_soft_delete"
+down_revision = "0004_index_audit"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("protocols", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        "ix_protocols_deleted_at",
+        "protocols",
+        ["deleted_at"],
+        unique=False,
+        postgresql_where=sa.text("deleted_at IS NOT NULL"),
+    )
+    op.create_index("ix_item_status_item_id", "item_status", ["item_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_item_status_item_id", table_name="item_status")
+    op.drop_index("ix_protocols_deleted_at", table_name="protocols")
+    op.drop_column("protocols", "deleted_at")
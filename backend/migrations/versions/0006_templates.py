@@ -0,0 +1,46 @@
+"""shared protocol templates
+
+Revision ID: 0006_templates
+Revises: 0005_soft_delete
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_templates"
+down_revision = "0005_soft_delete"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "templates",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+    op.create_table(
+        "template_items",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("template_id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("order_index", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["template_id"], ["templates.id"], ondelete="CASCADE"),
+    )
+    op.create_index(
+        "ix_template_items_template_id_order_index",
+        "template_items",
+        ["template_id", "order_index"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_template_items_template_id_order_index", table_name="template_items")
+    op.drop_table("template_items")
+    op.drop_table("templates")
@@ -0,0 +1,40 @@
+"""protocol reminder schedules
+
+Revision ID: 0007_schedules
+Revises: 0006_templates
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_schedules"
+down_revision = "0006_templates"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "schedules",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("protocol_id", sa.Integer(), nullable=False),
+        sa.Column("minute_of_day", sa.Integer(), nullable=False),
+        sa.Column("weekdays", sa.Integer(), server_default=sa.text("127"), nullable=False),
+        sa.Column("timezone", sa.String(length=64), server_default="UTC", nullable=False),
+        sa.Column("enabled", sa.Boolean(), server_default=sa.text("true"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.tg_id"]),
+        sa.ForeignKeyConstraint(["protocol_id"], ["protocols.id"], ondelete="CASCADE"),
+    )
+    op.create_index("ix_schedules_protocol_id", "schedules", ["protocol_id"], unique=False)
+    op.create_index("ix_schedules_updated_at", "schedules", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_schedules_updated_at", table_name="schedules")
+    op.drop_index("ix_schedules_protocol_id", table_name="schedules")
+    op.drop_table("schedules")
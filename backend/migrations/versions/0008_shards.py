@@ -0,0 +1,49 @@
+"""bigint ids for sharded tables, shard directory
+
+Revision ID: 0008_shards
+Revises: 0007_schedules
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_shards"
+down_revision = "0007_schedules"
+branch_labels = None
+depends_on = None
+
+# Ids of shard n start at n << 40, past the range of INTEGER.
+ID_COLUMNS = [
+    ("protocols", "id"),
+    ("items", "id"),
+    ("items", "protocol_id"),
+    ("item_status", "protocol_id"),
+    ("item_status", "item_id"),
+    ("schedules", "id"),
+    ("schedules", "protocol_id"),
+]
+
+
+def upgrade() -> None:
+    for table, column in ID_COLUMNS:
+        op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer())
+    for table in ("protocols", "items", "schedules"):
+        op.execute(f"ALTER SEQUENCE {table}_id_seq AS bigint")
+    # Read from the primary database only; created everywhere so every shard has the same schema.
+    op.create_table(
+        "shard_directory",
+        sa.Column("user_id", sa.BigInteger(), primary_key=True),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("shard_directory")
+    for table in ("protocols", "items", "schedules"):
+        op.execute(f"ALTER SEQUENCE {table}_id_seq AS integer")
+    for table, column in ID_COLUMNS:
+        op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger())
@@ -0,0 +1,24 @@
+"""schedule tombstones
+
+Revision ID: 0009_schedule_tombstones
+Revises: 0008_shards
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009_schedule_tombstones"
+down_revision = "0008_shards"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("schedules", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("schedules", "deleted_at")
@@ -0,0 +1,26 @@
+"""mark users being moved between shards
+
+Revision ID: 0010_shard_moves
+Revises: 0009_schedule_tombstones
+Create Date: 2026-10-19
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_shard_moves"
+down_revision = "0009_schedule_tombstones"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "shard_directory", sa.Column("moving", sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("shard_directory", "moving")
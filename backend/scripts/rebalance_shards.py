@@ -0,0 +1,54 @@
+"""Move users to the shard the hash ring assigns them, or move one user by hand.
+
+Run: python backend/scripts/rebalance_shards.py [--dry-run | --pin-current | --user ID --to SHARD]
+Reads DATABASE_URL and DATABASE_SHARD_URLS like the app. To add a shard: append its URL, run
+--pin-current with the new list, deploy the new list, then run without flags to move users over.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+if str(BACKEND) not in sys.path:
+    sys.path.append(str(BACKEND))
+
+from app.core.db import shards
+from app.services.rebalance import Rebalancer
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="print the planned moves only")
+    mode.add_argument("--pin-current", action="store_true", help="pin misplaced users where they are")
+    parser.add_argument("--user", type=int)
+    parser.add_argument("--to", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    await shards.prepare()
+    rebalancer = Rebalancer(shards)
+    try:
+        if args.user is not None:
+            if args.to is None or not 0 <= args.to < len(shards):
+                parser.error(f"--to must be a shard between 0 and {len(shards) - 1}")
+            source = await shards.shard_for_user(args.user)
+            await rebalancer.move(args.user, source, args.to)
+        elif args.dry_run:
+            for move in await rebalancer.plan():
+                print(f"user {move.user_id}: shard {move.source} -> {move.target}")
+        elif args.pin_current:
+            print(f"pinned {await rebalancer.pin_current()} users")
+        else:
+            moved = await rebalancer.run()
+            print(f"moved {moved} users ({rebalancer.rows_moved} rows) across {len(shards)} shards")
+    finally:
+        await shards.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
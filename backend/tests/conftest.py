@@ -1,29 +1,82 @@
+import dataclasses
 import os
 import sys
 from pathlib import Path
 
+import httpx
+import pytest
 import pytest_asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 ROOT = Path(__file__).resolve().parents[2]
 BACKEND = ROOT / "backend"
 if str(BACKEND) not in sys.path:
     sys.path.append(str(BACKEND))
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
 
-from app.core.db import Base
+from app.api.routers import protocols as protocols_router
+from app.core.auth import authenticator
+from app.core.db import Base, ShardRouter, _engine, get_shards
+from app.main import app
+from app.services import parser as parser_module
+from app.services import transcribe as transcribe_module
+from app.services.upstream import UpstreamClient, set_upstream
 from app.storage import models  # noqa: F401
+from app.storage.cache import known_users, protocol_content
+from fakes import FakeOpenAI
+
+
+@pytest.fixture(autouse=True)
+def _clear_process_caches(monkeypatch):
+    known_users.clear()
+    protocol_content.clear()
+    authenticator.clear()
+    monkeypatch.setattr(authenticator, "secret", b"test-secret")
+    yield
 
 
 @pytest_asyncio.fixture
-async def db_session(tmp_path) -> AsyncSession:
+async def session_factory(tmp_path) -> async_sessionmaker[AsyncSession]:
     db_path = tmp_path / "test.db"
     url = f"sqlite+aiosqlite:///{db_path}"
-    engine = create_async_engine(url, future=True)
+    engine = _engine(url)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session(session_factory) -> AsyncSession:
     async with session_factory() as session:
         yield session
 
-    await engine.dispose()
+
+@pytest.fixture
+def shards(session_factory) -> ShardRouter:
+    return ShardRouter([session_factory])
+
+
+@pytest_asyncio.fixture
+async def api_client(shards) -> httpx.AsyncClient:
+    app.dependency_overrides[get_shards] = lambda: shards
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def fake_openai(monkeypatch) -> FakeOpenAI:
+    fake = FakeOpenAI()
+    set_upstream(
+        UpstreamClient("http://fake-openai", "k", backoff_base=0.001, transport=httpx.ASGITransport(app=fake.app))
+    )
+    for module in (protocols_router, parser_module, transcribe_module):
+        monkeypatch.setattr(module, "settings", dataclasses.replace(module.settings, openai_api_key="k"))
+    yield fake
+    set_upstream(None)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import typing
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.core.auth import authenticator
+
+
+class FakeOpenAI:
+    """Local stand-in for the OpenAI HTTP API, served in-process via httpx.ASGITransport."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.failures: list[int] = []
+        self.parsed = {"title": "Morning", "items": ["Water", "Vitamins"], "fallback": False}
+        self.transcript = "Morning: water, vitamins"
+        self.app = FastAPI()
+        self.app.post("/chat/completions")(self._chat)
+        self.app.post("/audio/transcriptions")(self._transcribe)
+
+    async def _respond(self, body: dict) -> JSONResponse:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.failures:
+            return JSONResponse({"error": "fake failure"}, status_code=self.failures.pop(0))
+        return JSONResponse(body)
+
+    async def _chat(self, request: Request) -> JSONResponse:
+        await request.json()
+        return await self._respond({"choices": [{"message": {"content": json.dumps(self.parsed)}}]})
+
+    async def _transcribe(self, request: Request) -> JSONResponse:
+        await request.body()
+        return await self._respond({"text": self.transcript})
+
+
+class FakeClock:
+    """Settable clock for code that takes a `clock` callable; `now` is a float or a datetime."""
+
+    def __init__(self, now=0.0) -> None:
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTelegramSession(BaseSession):
+    """Local stand-in for the Bot API: records every method call and returns canned results."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency
+        self.requests: list[TelegramMethod] = []
+        self.failures: list[Exception] = []
+        self._message_ids = 1000
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.requests.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failures:
+            raise self.failures.pop(0)
+        returning = method.__returning__
+        if returning is bool or bool in typing.get_args(returning):
+            return True
+        if returning is Message:
+            self._message_ids += 1
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=self._message_ids,
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return None
+
+    async def stream_content(self, url: str, *args, **kwargs):
+        raise AssertionError(f"unexpected file download in a test: {url}")
+        yield b""  # unreachable; keeps this an async generator like the real session's
+
+    async def close(self) -> None:
+        pass
+
+    def calls(self, name: str) -> list[TelegramMethod]:
+        return [m for m in self.requests if type(m).__name__ == name]
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    return Bot("42:TEST", session=FakeTelegramSession(latency))
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Update:
+    user = User(id=user_id, is_bot=False, first_name="U")
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=user_id, type="private"),
+            from_user=user,
+            text=text,
+        ),
+    )
+
+
+def callback_update(update_id: int, user_id: int, data: str, message_id: int = 1, reply_markup=None) -> Update:
+    user = User(id=user_id, is_bot=False, first_name="U")
+    message = Message(
+        message_id=message_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text="checklist",
+        reply_markup=reply_markup,
+    )
+    return Update(
+        update_id=update_id,
+        callback_query=CallbackQuery(
+            id=str(update_id), from_user=user, chat_instance="ci", message=message, data=data
+        ),
+    )
+
+
+def auth_headers(user_id: int) -> dict[str, str]:
+    return {"Authorization": f"Bearer {authenticator.issue(user_id).token}"}
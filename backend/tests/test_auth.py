@@ -0,0 +1,139 @@
+import dataclasses
+import hashlib
+import hmac
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+from app.api.routers import auth as auth_router
+from app.core.auth import Authenticator, AuthError, check_init_data
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.schedules import ALL_WEEKDAYS, ScheduleService
+from fakes import FakeClock, auth_headers
+
+BOT_TOKEN = "123456:test-bot-token"
+
+
+def signed_init_data(user_id: int, auth_date: int, bot_token: str = BOT_TOKEN) -> str:
+    fields = {"auth_date": str(auth_date), "query_id": "AAE", "user": json.dumps({"id": user_id, "first_name": "A"})}
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def test_init_data_signature_is_checked():
+    init_data = signed_init_data(7, 1_000_000)
+
+    _, fields = check_init_data(init_data, BOT_TOKEN)
+    assert json.loads(fields["user"])["id"] == 7
+    with pytest.raises(AuthError):
+        check_init_data(init_data, "654321:other-bot")
+    with pytest.raises(AuthError):
+        check_init_data(init_data.replace("auth_date=1000000", "auth_date=1000001"), BOT_TOKEN)
+    with pytest.raises(AuthError):
+        check_init_data("auth_date=1", BOT_TOKEN)
+
+
+def test_login_issues_tokens_and_caches_verification():
+    clock = FakeClock(1_000_000.0)
+    auth = Authenticator(BOT_TOKEN, "secret", token_ttl=60, init_data_max_age=3600, clock=clock)
+
+    session = auth.login(signed_init_data(7, int(clock.now)))
+    assert session.identity.user_id == 7
+    assert auth.authenticate(session.token) == 7
+    # Issued tokens are verified once; later requests are cache hits.
+    assert auth.hits == 1
+
+    # Another replica sharing the secret accepts the token without having issued it.
+    replica = Authenticator(BOT_TOKEN, "secret", clock=clock)
+    assert replica.authenticate(session.token) == 7
+    assert (replica.hits, replica.misses) == (0, 1)
+    assert replica.authenticate(session.token) == 7
+    assert replica.hits == 1
+
+    with pytest.raises(AuthError):
+        Authenticator(BOT_TOKEN, "other-secret", clock=clock).authenticate(session.token)
+    _, expires_at, signature = session.token.split(".")
+    with pytest.raises(AuthError):
+        replica.authenticate(f"8.{expires_at}.{signature}")
+
+
+def test_tokens_and_init_data_expire():
+    clock = FakeClock(1_000_000.0)
+    auth = Authenticator(BOT_TOKEN, "secret", token_ttl=60, init_data_max_age=3600, clock=clock)
+    init_data = signed_init_data(7, int(clock.now))
+    token = auth.login(init_data).token
+
+    clock.now += 61
+    with pytest.raises(AuthError, match="expired"):
+        auth.authenticate(token)
+    # The Mini App re-logs in with the same initData until Telegram's own auth_date gets too old.
+    assert auth.authenticate(auth.login(init_data).token) == 7
+
+    clock.now += 3600
+    with pytest.raises(AuthError, match="expired"):
+        auth.login(init_data)
+
+
+@pytest.mark.asyncio
+async def test_api_requires_a_session(monkeypatch, api_client, shards):
+    monkeypatch.setattr(auth_router, "authenticator", Authenticator(BOT_TOKEN, "test-secret"))
+    monkeypatch.setattr("app.api.deps.authenticator", auth_router.authenticator)
+    anonymous = await api_client.get("/api/protocols/")
+    forged = await api_client.get("/api/protocols/", headers={"Authorization": "Bearer 1.9999999999.forged"})
+    rejected = await api_client.post("/api/auth/session", json={"init_data": signed_init_data(7, 1, "0:other")})
+    dev_login = await api_client.post("/api/auth/session", json={"user_id": 7})
+    login = await api_client.post("/api/auth/session", json={"init_data": signed_init_data(7, 2_000_000_000)})
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+    created = await api_client.post("/api/protocols/", json={"title": "Morning"}, headers=headers)
+    listed = await api_client.get("/api/protocols/", headers=headers)
+
+    monkeypatch.setattr(auth_router, "settings", dataclasses.replace(auth_router.settings, auth_dev_login=True))
+    dev_enabled = await api_client.post("/api/auth/session", json={"user_id": 8})
+
+    assert anonymous.status_code == 401
+    assert anonymous.headers["WWW-Authenticate"] == "Bearer"
+    assert forged.status_code == 401
+    assert rejected.status_code == 401
+    assert dev_login.status_code == 401
+    assert login.status_code == 200
+    assert login.json()["user_id"] == 7
+    assert created.status_code == 200
+    assert [p["title"] for p in listed.json()] == ["Morning"]
+    async with shards.session_for_user(7) as session:
+        assert [p.title for p in await ProtocolService(session).list(7)] == ["Morning"]
+    assert dev_enabled.json()["user_id"] == 8
+
+
+@pytest.mark.asyncio
+async def test_api_hides_other_users_protocols(api_client, db_session):
+    protocol, items = await ProtocolService(db_session).quick_create(1, "Morning", ["Water", "Vitamins"])
+    schedule = await ScheduleService(db_session).create(1, protocol.id, 7 * 60, ALL_WEEKDAYS, "UTC")
+    item_ids = [i.id for i in items]
+
+    api_client.headers.update(auth_headers(2))
+    responses = [
+        await api_client.get(f"/api/protocols/{protocol.id}/items"),
+        await api_client.post(f"/api/protocols/{protocol.id}/items", json={"title": "Tea"}),
+        await api_client.patch(f"/api/items/{item_ids[0]}", json={"title": "Tea"}),
+        await api_client.delete(f"/api/items/{item_ids[0]}"),
+        await api_client.post("/api/items/reorder", json={"ordered_ids": item_ids[::-1]}),
+        await api_client.patch(f"/api/protocols/{protocol.id}", json={"title": "Mine"}),
+        await api_client.post("/api/protocols/reorder", json={"ordered_ids": [protocol.id]}),
+        await api_client.post(f"/api/protocols/{protocol.id}/clone", json={}),
+        await api_client.get(f"/api/protocols/{protocol.id}/schedules"),
+        await api_client.patch(f"/api/schedules/{schedule.id}", json={"enabled": False}),
+        await api_client.delete(f"/api/schedules/{schedule.id}"),
+        await api_client.delete(f"/api/protocols/{protocol.id}"),
+    ]
+
+    assert [r.status_code for r in responses] == [404] * len(responses)
+    assert [p.title for p in await ProtocolService(db_session).list(1)] == ["Morning"]
+    assert [i.title for i in await ItemService(db_session).list(1, protocol.id)] == ["Water", "Vitamins"]
+    assert [s.enabled for s in await ScheduleService(db_session).list(1, protocol.id)] == [True]
+    await ProtocolService(db_session).delete(1, protocol.id)
+    assert (await api_client.post(f"/api/protocols/{protocol.id}/restore")).status_code == 404
+    assert await ProtocolService(db_session).get(protocol.id) is None
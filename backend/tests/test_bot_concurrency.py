@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from aiogram import Dispatcher, F, Router
+from aiogram.types import Message
+
+from bot.concurrency import KeyedTaskPool, OrderedUpdateMiddleware
+from fakes import make_bot, message_update
+
+
+@pytest.mark.asyncio
+async def test_updates_run_concurrently_across_users_but_in_order_per_user():
+    seen: dict[int, list[str]] = {}
+    running = 0
+    peak = 0
+
+    router = Router()
+
+    @router.message(F.text)
+    async def handler(message: Message) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later updates finish faster, so only per-user serialization keeps them in order.
+        await asyncio.sleep(0.02 / int(message.text))
+        seen.setdefault(message.from_user.id, []).append(message.text)
+        running -= 1
+
+    pool = KeyedTaskPool(workers=4, max_pending=100)
+    pool.start()
+    dp = Dispatcher()
+    dp.update.outer_middleware(OrderedUpdateMiddleware(pool))
+    dp.include_router(router)
+    bot = make_bot()
+
+    update_id = 0
+    for step in range(1, 4):
+        for user_id in (1, 2, 3, 4):
+            update_id += 1
+            await dp.feed_update(bot, message_update(update_id, user_id, str(step)))
+    await pool.stop(drain=True)
+
+    assert seen == {user_id: ["1", "2", "3"] for user_id in (1, 2, 3, 4)}
+    assert peak == 4
+    stats = pool.stats()
+    assert stats["processed"] == 12
+    assert stats["pending"] == 0
+    assert stats["max_pending_seen"] == 12
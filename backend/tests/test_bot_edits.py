@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageReplyMarkup
+
+from app.core.ratelimit import RateLimitRule
+from bot.edits import EditScheduler
+from bot.keyboards import items_keyboard
+from fakes import make_bot
+
+
+def markup(checked: bool):
+    return items_keyboard([(1, "Water", checked)], protocol_id=7)
+
+
+@pytest.mark.asyncio
+async def test_rapid_edits_are_coalesced_to_the_latest_markup():
+    bot = make_bot()
+    scheduler = EditScheduler(window=0.02)
+    for i in range(5):
+        scheduler.schedule(bot, 1, 10, markup(i % 2 == 0))
+    scheduler.schedule(bot, 2, 20, markup(True))
+    await scheduler.flush()
+
+    edits = bot.session.calls("EditMessageReplyMarkup")
+    assert len(edits) == 2
+    by_chat = {e.chat_id: e.reply_markup for e in edits}
+    assert by_chat[1] == markup(True)
+    assert scheduler.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_respected():
+    bot = make_bot()
+    method = EditMessageReplyMarkup(chat_id=1, message_id=10)
+    bot.session.failures = [TelegramRetryAfter(method=method, message="Flood control", retry_after=0)]
+    scheduler = EditScheduler(window=0.0)
+    scheduler.schedule(bot, 1, 10, markup(True))
+    await scheduler.flush()
+
+    assert len(bot.session.calls("EditMessageReplyMarkup")) == 2
+    assert scheduler.stats()["retried"] == 1
+    assert scheduler.stats()["sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_per_chat_rate_spaces_out_edits():
+    bot = make_bot()
+    scheduler = EditScheduler(window=0.0, chat_rule=RateLimitRule(per_minute=600, burst=1))
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    scheduler.schedule(bot, 1, 10, markup(True))
+    await scheduler.flush()
+    scheduler.schedule(bot, 1, 10, markup(False))
+    await scheduler.flush()
+    assert loop.time() - started >= 0.09
+    assert len(bot.session.calls("EditMessageReplyMarkup")) == 2
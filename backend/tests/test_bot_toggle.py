@@ -0,0 +1,120 @@
+import pytest
+from aiogram import Dispatcher
+from sqlalchemy import event
+
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.runs import RunStateStore
+from bot import handlers
+from bot.edits import EditScheduler
+from app.storage.cache import protocol_content
+from bot.keyboards import cached_items_keyboard, decode_page, decode_toggle, encode_toggle, items_keyboard, page_of
+from fakes import callback_update, make_bot
+
+# A router can only be attached once, so all tests share one dispatcher.
+DP = Dispatcher()
+DP.include_router(handlers.router)
+
+
+def test_callback_data_roundtrip_is_compact():
+    data = encode_toggle(2_000_000_000, 2_000_000_001, 123_456)
+    assert decode_toggle(data) == (2_000_000_000, 2_000_000_001, 123_456)
+    assert len(data.encode()) <= 64
+
+
+@pytest.fixture
+def bot_env(monkeypatch, shards):
+    monkeypatch.setattr(handlers, "shards", shards)
+    monkeypatch.setattr(handlers, "run_store", RunStateStore(shards, flush_interval=60))
+    monkeypatch.setattr(handlers, "edit_scheduler", EditScheduler(window=0))
+    return DP, make_bot()
+
+
+def labels(markup):
+    return [row[0].text for row in markup.inline_keyboard]
+
+
+@pytest.mark.asyncio
+async def test_toggle_rerenders_from_message_markup(bot_env, db_session):
+    dp, bot = bot_env
+    protocol = await ProtocolService(db_session).create(123, "Morning")
+    water = await ItemService(db_session).create(123, protocol.id, "Water")
+    vitamins = await ItemService(db_session).create(123, protocol.id, "Vitamins")
+    version = await ProtocolService(db_session).version(protocol.id)
+    markup = items_keyboard([(water.id, "Water", False), (vitamins.id, "Vitamins", False)], protocol.id, version)
+    await handlers.run_store.start_run(123, protocol.id, [water.id, vitamins.id])
+
+    statements = []
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    update = callback_update(1, 123, encode_toggle(protocol.id, vitamins.id, version), reply_markup=markup)
+    await dp.feed_update(bot, update)
+    await handlers.edit_scheduler.flush()
+
+    # Only the version lookup reaches the database; the status write is deferred to the run store.
+    assert len(statements) == 1
+    edit = bot.session.calls("EditMessageReplyMarkup")[-1]
+    assert labels(edit.reply_markup) == ["Water", "✅ Vitamins"]
+    assert bot.session.calls("AnswerCallbackQuery")
+    await handlers.run_store.close()
+
+
+@pytest.mark.asyncio
+async def test_stale_keyboard_falls_back_to_full_reload(bot_env, db_session):
+    dp, bot = bot_env
+    protocol = await ProtocolService(db_session).create(123, "Morning")
+    water = await ItemService(db_session).create(123, protocol.id, "Water")
+    stale_version = await ProtocolService(db_session).version(protocol.id)
+    markup = items_keyboard([(water.id, "Water", False)], protocol.id, stale_version)
+    # Edited in the Mini App after the keyboard was sent.
+    await ItemService(db_session).create(123, protocol.id, "Stretch")
+
+    update = callback_update(1, 123, encode_toggle(protocol.id, water.id, stale_version), reply_markup=markup)
+    await dp.feed_update(bot, update)
+    await handlers.edit_scheduler.flush()
+
+    edit = bot.session.calls("EditMessageReplyMarkup")[-1]
+    assert labels(edit.reply_markup) == ["✅ Water", "Stretch"]
+    _, _, new_version = decode_toggle(edit.reply_markup.inline_keyboard[0][0].callback_data)
+    assert new_version == stale_version + 1
+    await handlers.run_store.close()
+
+
+@pytest.mark.asyncio
+async def test_reopening_protocol_reuses_cached_items_and_keyboard(bot_env, db_session):
+    dp, bot = bot_env
+    protocol = await ProtocolService(db_session).create(123, "Morning")
+    await ItemService(db_session).append_many(123, protocol.id, ["Water", "Vitamins"])
+    await dp.feed_update(bot, callback_update(1, 123, f"p:{protocol.id}"))
+
+    statements = []
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    await dp.feed_update(bot, callback_update(2, 123, f"p:{protocol.id}"))
+
+    assert not [s for s in statements if "FROM items" in s]
+    first, second = bot.session.calls("SendMessage")
+    assert second.reply_markup is first.reply_markup
+    assert labels(second.reply_markup) == ["Water", "Vitamins"]
+    await handlers.run_store.close()
+
+
+@pytest.mark.asyncio
+async def test_item_write_invalidates_cached_items(db_session):
+    protocol = await ProtocolService(db_session).create(123, "Morning")
+    water = await ItemService(db_session).create(123, protocol.id, "Water")
+    version = await ProtocolService(db_session).version(protocol.id)
+    assert await ItemService(db_session).titles(protocol.id, version) == ((water.id, "Water"),)
+
+    await ItemService(db_session).rename(123, water.id, "Warm water")
+    assert protocol_content.get((protocol.id, version, "items")) is None
+    new_version = await ProtocolService(db_session).version(protocol.id)
+    assert await ItemService(db_session).titles(protocol.id, new_version) == ((water.id, "Warm water"),)
+
+
+def test_long_protocols_are_paged_and_overlay_keeps_navigation():
+    items = [(i, f"Item {i}") for i in range(1, 46)]
+    markup = cached_items_keyboard(items, 7, 3, checked={41}, page=1)
+    assert labels(markup)[:5] == ["✅ Item 41", "Item 42", "Item 43", "Item 44", "Item 45"]
+    nav = markup.inline_keyboard[-1]
+    assert [b.text for b in nav] == ["‹", "2/2"]
+    assert decode_page(nav[0].callback_data) == (7, 0, 3)
+    assert page_of(items, 41) == 1
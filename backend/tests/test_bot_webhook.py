@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import pytest
+from aiogram import Dispatcher, Router
+from aiogram.types import CallbackQuery, Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.concurrency import KeyedTaskPool, OrderedUpdateMiddleware
+from bot.middlewares import DeduplicateUpdatesMiddleware
+from bot.webhook import create_webhook_app, ensure_webhook
+from fakes import make_bot
+
+UPDATES = json.loads((Path(__file__).parent / "data" / "telegram_updates.json").read_text())
+SECRET = "s3cret"
+PATH = "/telegram/webhook"
+
+
+@pytest.mark.asyncio
+async def test_webhook_verifies_secret_and_handles_recorded_updates():
+    handled: list[int] = []
+    router = Router()
+
+    @router.message()
+    async def on_message(message: Message) -> None:
+        handled.append(message.message_id)
+
+    @router.callback_query()
+    async def on_callback(call: CallbackQuery) -> None:
+        handled.append(call.message.message_id)
+
+    pool = KeyedTaskPool(workers=2)
+    pool.start()
+    dp = Dispatcher()
+    dp.update.outer_middleware(DeduplicateUpdatesMiddleware())
+    dp.update.outer_middleware(OrderedUpdateMiddleware(pool))
+    dp.include_router(router)
+    app = create_webhook_app(dp, make_bot(), secret_token=SECRET, path=PATH, pooled=True)
+
+    async with TestClient(TestServer(app)) as client:
+        rejected = await client.post(PATH, json=UPDATES[0], headers={"X-Telegram-Bot-Api-Secret-Token": "nope"})
+        assert rejected.status == 401
+
+        for update in UPDATES + UPDATES[:1]:  # Telegram redelivers the first update once.
+            resp = await client.post(PATH, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            assert resp.status == 200
+
+        health = await client.get("/healthz")
+        assert health.status == 200
+        await pool.join()
+
+    await pool.stop()
+    assert sorted(handled) == [101, 102, 103]
+
+
+@pytest.mark.asyncio
+async def test_ensure_webhook_pushes_a_rotated_secret():
+    router = Router()
+
+    @router.callback_query()
+    async def on_callback(call: CallbackQuery) -> None:
+        pass
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = make_bot()
+    await ensure_webhook(bot, dp, "https://bot.example" + PATH, SECRET)
+    await ensure_webhook(bot, dp, "https://bot.example" + PATH, "rotated")
+
+    calls = bot.session.calls("SetWebhook")
+    assert [call.secret_token for call in calls] == [SECRET, "rotated"]
+    assert calls[-1].allowed_updates == ["callback_query"]
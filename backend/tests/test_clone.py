@@ -0,0 +1,55 @@
+import dataclasses
+
+import pytest
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.templates import TemplateService
+from fakes import auth_headers
+
+
+@pytest.mark.asyncio
+async def test_clone_copies_items_with_one_insert_select(db_session):
+    service = ProtocolService(db_session)
+    source, _ = await service.quick_create(1, "Morning", [f"Step {i}" for i in range(2000)])
+
+    statements = []
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    clone = await service.clone(source.id, 1, "Morning (travel)")
+
+    inserts = [s for s in statements if s.startswith("INSERT INTO items")]
+    assert len(inserts) == 1 and "SELECT" in inserts[0]
+    assert clone.title == "Morning (travel)" and clone.order_index == 1
+    titles = [i.title for i in await ItemService(db_session).list(1, clone.id)]
+    assert titles[:2] == ["Step 0", "Step 1"] and len(titles) == 2000
+    # Another user's protocol cannot be cloned by id.
+    assert await service.clone(source.id, 2) is None
+
+
+@pytest.mark.asyncio
+async def test_templates_publish_and_instantiate(monkeypatch, api_client, db_session):
+    source, _ = await ProtocolService(db_session).quick_create(1, "Morning", ["Water", "Stretch"])
+    monkeypatch.setattr("app.api.deps.settings", dataclasses.replace(settings, admin_token="secret"))
+
+    denied = await api_client.post("/api/templates/", json={"protocol_id": source.id})
+    published = await api_client.post(
+        "/api/templates/", json={"protocol_id": source.id}, headers={"X-Admin-Token": "secret"}
+    )
+    api_client.headers.update(auth_headers(2))
+    listed = await api_client.get("/api/templates/")
+    created = await api_client.post(
+        f"/api/templates/{published.json()['id']}/instantiate", json={"title": "My morning"}
+    )
+    missing = await api_client.post("/api/templates/999/instantiate", json={})
+
+    assert denied.status_code == 403
+    assert published.json()["item_count"] == 2
+    assert [t["title"] for t in listed.json()] == ["Morning"]
+    assert created.json()["title"] == "My morning"
+    assert missing.status_code == 404
+    items = await ItemService(db_session).list(2, created.json()["id"])
+    assert [i.title for i in items] == ["Water", "Stretch"]
+    assert [p.title for p in await ProtocolService(db_session).list(2)] == ["My morning"]
+    assert len(await TemplateService(db_session).list()) == 1
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.api.routers import protocols as protocols_router
+from app.storage.repositories import ItemRepository
+from fakes import auth_headers
+
+
+@pytest.mark.asyncio
+async def test_from_audio_streams_pipeline_events(fake_openai, api_client, db_session):
+    resp = await api_client.post(
+        "/api/protocols/from-audio",
+        headers=auth_headers(123),
+        files={"file": ("audio.webm", b"fake-audio", "audio/webm")},
+    )
+    assert resp.status_code == 200
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert [e["event"] for e in events] == ["transcribed", "parsed", "created"]
+    assert events[0]["text"] == fake_openai.transcript
+    created = events[2]
+    assert created["protocol"]["title"] == "Morning"
+    assert [i["title"] for i in created["items"]] == ["Water", "Vitamins"]
+
+    items = await ItemRepository(db_session).list(created["protocol"]["id"])
+    assert [(i.title, i.order_index) for i in items] == [("Water", 0), ("Vitamins", 1)]
+
+
+@pytest.mark.asyncio
+async def test_from_audio_reports_internal_failures_as_500(fake_openai, api_client, monkeypatch):
+    quick_create = protocols_router.ProtocolService.quick_create
+    failures = [RuntimeError("database is locked")]
+
+    async def flaky(self, *args):
+        if failures:
+            raise failures.pop()
+        return await quick_create(self, *args)
+
+    monkeypatch.setattr(protocols_router.ProtocolService, "quick_create", flaky)
+    headers = {"Idempotency-Key": "audio-500", **auth_headers(123)}
+    request = dict(files={"file": ("audio.webm", b"fake-audio", "audio/webm")})
+    failed = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+    retry = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+
+    assert json.loads(failed.text.splitlines()[-1]) == {"event": "error", "status": 500, "detail": "database is locked"}
+    assert "Idempotent-Replayed" not in retry.headers
+    assert json.loads(retry.text.splitlines()[-1])["event"] == "created"
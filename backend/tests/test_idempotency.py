@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from app.core.idempotency import InMemoryIdempotencyBackend, StoredResponse
+from app.services.protocols import ProtocolService
+from fakes import FakeClock, auth_headers
+
+
+@pytest.mark.asyncio
+async def test_concurrent_quick_create_duplicates_run_once(fake_openai, api_client, db_session):
+    fake_openai.delay = 0.05
+    headers = {"Idempotency-Key": "quick-1"}
+    headers.update(auth_headers(1))
+    payload = {"text": "Morning: water, vitamins"}
+    first, second = await asyncio.gather(
+        api_client.post("/api/protocols/quick-create", json=payload, headers=headers),
+        api_client.post("/api/protocols/quick-create", json=payload, headers=headers),
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert fake_openai.calls == 1
+    assert len(await ProtocolService(db_session).list(1)) == 1
+    assert "true" in (first.headers.get("Idempotent-Replayed"), second.headers.get("Idempotent-Replayed"))
+
+
+@pytest.mark.asyncio
+async def test_retried_create_is_replayed_and_key_reuse_is_rejected(fake_openai, api_client, db_session):
+    headers = {"Idempotency-Key": "create-1"}
+    api_client.headers.update(auth_headers(1))
+    first = await api_client.post("/api/protocols/", json={"title": "Morning"}, headers=headers)
+    retry = await api_client.post("/api/protocols/", json={"title": "Morning"}, headers=headers)
+    reused = await api_client.post("/api/protocols/", json={"title": "Evening"}, headers=headers)
+    unkeyed = await api_client.post("/api/protocols/", json={"title": "Morning"})
+    # Another user's request with the same key is theirs, not a replay.
+    other = await api_client.post("/api/protocols/", json={"title": "Morning"}, headers={**headers, **auth_headers(2)})
+
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert reused.status_code == 422
+    assert unkeyed.json()["id"] != first.json()["id"]
+    assert [p.title for p in await ProtocolService(db_session).list(1)] == ["Morning", "Morning"]
+    assert "Idempotent-Replayed" not in other.headers
+    assert [p.title for p in await ProtocolService(db_session).list(2)] == ["Morning"]
+
+
+@pytest.mark.asyncio
+async def test_stored_responses_expire():
+    clock = FakeClock()
+    backend = InMemoryIdempotencyBackend(max_keys=2, clock=clock)
+    response = StoredResponse("f", 200, [], b"{}")
+    await backend.set("a", response, ttl=10)
+    clock.now = 9
+    assert await backend.get("a") == response
+    clock.now = 10
+    assert await backend.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_streamed_from_audio_is_replayed(fake_openai, api_client):
+    request = dict(files={"file": ("a.webm", b"audio", "audio/webm")})
+    headers = {"Idempotency-Key": "audio-1", **auth_headers(1)}
+    first = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+    calls = fake_openai.calls
+    retry = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+
+    assert retry.text == first.text
+    assert retry.headers["content-type"] == first.headers["content-type"]
+    assert fake_openai.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_from_audio_is_rerun_after_an_upstream_error(fake_openai, api_client):
+    fake_openai.failures = [503, 503, 503]
+    request = dict(files={"file": ("a.webm", b"audio", "audio/webm")})
+    headers = {"Idempotency-Key": "audio-2", **auth_headers(1)}
+    failed = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+    retry = await api_client.post("/api/protocols/from-audio", headers=headers, **request)
+
+    assert '"event": "error"' in failed.text and '"status": 503' in failed.text
+    assert "Idempotent-Replayed" not in retry.headers
+    assert '"event": "created"' in retry.text
+
+
+@pytest.mark.asyncio
+async def test_client_gone_before_the_stream_starts_releases_the_key(fake_openai, api_client):
+    from app.main import app
+
+    headers = {"Idempotency-Key": "audio-3", **auth_headers(3)}
+    files = {"file": ("a.webm", b"audio", "audio/webm")}
+    request = api_client.build_request("POST", "/api/protocols/from-audio", headers=headers, files=files)
+    messages = [{"type": "http.request", "body": request.read(), "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        # The connection is already gone when the response starts, so the body is never iterated.
+        raise OSError("connection reset")
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/protocols/from-audio",
+        "raw_path": b"/api/protocols/from-audio",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(key.lower(), value) for key, value in request.headers.raw],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    with pytest.raises(ClientDisconnect):
+        await app(scope, receive, send)
+
+    retry = await asyncio.wait_for(api_client.post("/api/protocols/from-audio", headers=headers, files=files), 5)
+    assert retry.status_code == 200 and "Idempotent-Replayed" not in retry.headers
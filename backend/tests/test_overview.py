@@ -0,0 +1,30 @@
+import pytest
+
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.statuses import ItemStatusService
+
+
+@pytest.mark.asyncio
+async def test_overview_counts_items_and_checked(db_session):
+    protocol_service = ProtocolService(db_session)
+    morning = await protocol_service.create(123, "Morning")
+    evening = await protocol_service.create(123, "Evening")
+    await protocol_service.create(456, "Other user")
+
+    item_service = ItemService(db_session)
+    water = await item_service.create(123, morning.id, "Water")
+    await item_service.create(123, morning.id, "Vitamins")
+    await item_service.create(123, evening.id, "Read")
+
+    status_service = ItemStatusService(db_session)
+    await status_service.toggle(123, morning.id, water.id)
+    # Another user's status on the same item must not leak into the counts.
+    await status_service.toggle(456, morning.id, water.id)
+
+    rows = await protocol_service.overview(123)
+    assert [r.title for r in rows] == ["Morning", "Evening"]
+    assert (rows[0].item_count, rows[0].checked_count) == (2, 1)
+    assert rows[0].last_activity_at is not None
+    assert (rows[1].item_count, rows[1].checked_count) == (1, 0)
+    assert rows[1].last_activity_at is None
@@ -0,0 +1,92 @@
+import asyncio
+import dataclasses
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.profiling import LoopLagMonitor, ProfileTrigger, SamplingProfiler, profile_trigger
+from fakes import auth_headers
+
+
+def spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def busy_handler() -> None:
+    for _ in range(5):
+        spin(0.01)
+        await asyncio.sleep(0)
+
+
+async def bystander() -> None:
+    for _ in range(5):
+        spin(0.01)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_profiler_only_counts_the_profiled_task():
+    profiler = SamplingProfiler(interval=0.001)
+
+    async def profiled():
+        profile = profiler.begin("busy")
+        await busy_handler()
+        return profiler.end(profile)
+
+    profile, _ = await asyncio.gather(profiled(), bystander())
+    stacks = list(profile.samples)
+    assert sum(profile.samples.values()) >= 3
+    assert any("busy_handler (tests/test_profiling.py" in stack for stack in stacks)
+    assert not any("bystander" in stack for stack in stacks)
+
+
+@pytest.mark.asyncio
+async def test_admin_header_writes_a_profile(monkeypatch, api_client, tmp_path):
+    monkeypatch.setattr("app.api.deps.settings", dataclasses.replace(settings, admin_token="secret"))
+    monkeypatch.setattr(profile_trigger, "directory", tmp_path / "profiles")
+    api_client.headers.update(auth_headers(1))
+    plain = await api_client.get("/api/protocols/", headers={"X-Profile": "1"})
+    profiled = await api_client.get("/api/protocols/", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+
+    assert plain.status_code == profiled.status_code == 200
+    assert "x-profile-id" not in plain.headers
+    files = list((tmp_path / "profiles").iterdir())
+    assert [f.name for f in files] == [f"{profiled.headers['x-profile-id']}.folded"]
+    assert "GET_api_protocols" in files[0].name
+
+
+@pytest.mark.asyncio
+async def test_sampling_is_off_by_default(tmp_path):
+    trigger = ProfileTrigger(tmp_path)
+    assert not any(trigger.sampled() for _ in range(1000))
+    assert ProfileTrigger(tmp_path, sample_rate=1.0).sampled()
+
+
+@pytest.mark.asyncio
+async def test_lag_monitor_reports_the_blocking_coroutine(caplog):
+    monitor = LoopLagMonitor(threshold=0.05, interval=0.01)
+    monitor.start()
+
+    async def blocking_handler():
+        time.sleep(0.2)
+
+    await asyncio.create_task(blocking_handler(), name="slow-update")
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.stall_count == 1 and monitor.max_lag >= 0.15
+    stall = monitor.stalls[0]
+    assert stall.task == "slow-update"
+    assert "in blocking_handler" in stall.stack
+    assert "Event loop blocked" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_require_the_admin_token(monkeypatch, api_client):
+    monkeypatch.setattr("app.api.deps.settings", dataclasses.replace(settings, admin_token="secret"))
+    for path in ("/metrics/loop-lag", "/metrics/rate-limits"):
+        assert (await api_client.get(path)).status_code == 403
+        assert (await api_client.get(path, headers={"X-Admin-Token": "secret"})).status_code == 200
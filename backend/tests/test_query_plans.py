@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.services.protocols import ProtocolService
+from app.storage.repositories import (
+    ItemRepository,
+    ItemStatusRepository,
+    ProtocolRepository,
+    ScheduleRepository,
+    UserRepository,
+)
+
+
+async def seed(session):
+    protocol_ids, item_ids = [], []
+    for user_id in range(1, 11):
+        for p in range(5):
+            protocol, items = await ProtocolService(session).quick_create(user_id, f"P{p}", [f"I{i}" for i in range(8)])
+            protocol_ids.append(protocol.id)
+            item_ids.extend(i.id for i in items)
+    now = datetime.now(timezone.utc)
+    await ItemStatusRepository(session).upsert_many(
+        [{"user_id": 1, "protocol_id": protocol_ids[0], "item_id": i, "checked": True, "updated_at": now} for i in item_ids[:8]]
+    )
+    await session.commit()
+    return protocol_ids, item_ids
+
+
+def repository_calls(session, protocol_id, item_ids):
+    protocols = ProtocolRepository(session)
+    items = ItemRepository(session)
+    statuses = ItemStatusRepository(session)
+    users = UserRepository(session)
+    schedules = ScheduleRepository(session)
+    now = datetime.now(timezone.utc)
+    return {
+        "protocols.list": lambda: protocols.list(1),
+        "protocols.overview": lambda: protocols.overview(1),
+        "protocols.get": lambda: protocols.get(protocol_id, 1),
+        "protocols.get_version": lambda: protocols.get_version(protocol_id),
+        "protocols.bump_version": lambda: protocols.bump_version(protocol_id),
+        "protocols.bump_version_for_items": lambda: protocols.bump_version_for_items(item_ids[:2]),
+        "protocols.rename": lambda: protocols.rename(protocol_id, "Renamed"),
+        "protocols.reorder": lambda: protocols.reorder([protocol_id]),
+        "protocols.delete": lambda: protocols.delete(protocol_id),
+        "protocols.restore": lambda: protocols.restore(protocol_id, 1, now),
+        "protocols.deleted_before": lambda: protocols.deleted_before(now, limit=10),
+        "protocols.purge": lambda: protocols.purge(protocol_id),
+        "items.get": lambda: items.get(item_ids[0]),
+        "items.list": lambda: items.list(protocol_id),
+        "items.existing_ids": lambda: items.existing_ids(item_ids[:3], 1),
+        "items.rename": lambda: items.rename(item_ids[0], "Renamed"),
+        "items.reorder": lambda: items.reorder(item_ids[:3]),
+        "items.purge_batch": lambda: items.purge_batch(protocol_id, 2),
+        "items.copy_from": lambda: items.copy_from(protocol_id, protocol_id + 1),
+        "statuses.list_for_protocol": lambda: statuses.list_for_protocol(1, protocol_id),
+        "statuses.get": lambda: statuses.get(1, protocol_id, item_ids[0]),
+        "statuses.reset_for_protocol": lambda: statuses.reset_for_protocol(1, protocol_id),
+        "statuses.upsert_many": lambda: statuses.upsert_many(
+            [{"user_id": 1, "protocol_id": protocol_id, "item_id": item_ids[1], "checked": True, "updated_at": now}]
+        ),
+        "schedules.list_for_protocol": lambda: schedules.list_for_protocol(protocol_id),
+        "schedules.list_enabled": lambda: schedules.list_enabled(0, 100),
+        "schedules.changed_since": lambda: schedules.changed_since(now, 0, 100),
+        "users.get": lambda: users.get(1),
+        "users.ensure": lambda: users.ensure(99),
+    }
+
+
+def bad_plan_steps(plan_rows) -> list[str]:
+    # "SCAN <table>" walks a whole table or index; "USE TEMP B-TREE" is an explicit sort or grouping.
+    details = [row[-1] for row in plan_rows]
+    return [d for d in details if d.startswith("SCAN") and d != "SCAN CONSTANT ROW" or "TEMP B-TREE" in d]
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes(db_session):
+    protocol_ids, item_ids = await seed(db_session)
+    protocol_id = protocol_ids[0]
+    engine = db_session.bind.sync_engine
+
+    failures = {}
+    for name, call in repository_calls(db_session, protocol_id, item_ids[:8]).items():
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not statement.startswith("EXPLAIN"):
+                statements.append((statement, parameters[0] if executemany else parameters))
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            await call()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        assert statements, name
+        conn = await db_session.connection()
+        for statement, parameters in statements:
+            plan = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+            bad = bad_plan_steps(plan)
+            if bad:
+                failures[name] = (statement, bad)
+    await db_session.rollback()
+
+    assert not failures, failures
+
+
+def test_plan_check_flags_scans_and_sorts():
+    assert bad_plan_steps([(2, 0, 0, "SCAN items")]) == ["SCAN items"]
+    assert bad_plan_steps([(2, 0, 0, "USE TEMP B-TREE FOR ORDER BY")])
+    assert not bad_plan_steps([(2, 0, 0, "SEARCH items USING INDEX ix_items_protocol_id_order_index (protocol_id=?)")])
@@ -0,0 +1,35 @@
+import pytest
+
+from app.core.ratelimit import InMemoryRateLimitBackend, RateLimiter, RateLimitRule
+from fakes import FakeClock, auth_headers
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    limiter = RateLimiter({"write": RateLimitRule(per_minute=60, burst=2)}, InMemoryRateLimitBackend(clock=clock))
+
+    assert await limiter.check("write", "user:1") == 0
+    assert await limiter.check("write", "user:1") == 0
+    assert await limiter.check("write", "user:1") == pytest.approx(1.0)
+    # Buckets are per key.
+    assert await limiter.check("write", "user:2") == 0
+
+    clock.now = 1.0
+    assert await limiter.check("write", "user:1") == 0
+    assert limiter.snapshot() == {"write": {"allowed": 4, "limited": 1}}
+
+
+@pytest.mark.asyncio
+async def test_api_returns_429_with_retry_after(monkeypatch, api_client):
+    limiter = RateLimiter({"write": RateLimitRule(per_minute=1, burst=1)})
+    monkeypatch.setattr("app.api.deps.rate_limiter", limiter)
+
+    first = await api_client.post("/api/protocols/", json={"title": "Morning"}, headers=auth_headers(1))
+    second = await api_client.post("/api/protocols/", json={"title": "Evening"}, headers=auth_headers(1))
+    other = await api_client.post("/api/protocols/", json={"title": "Evening"}, headers=auth_headers(2))
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["retry-after"]) >= 1
+    assert other.status_code == 200
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.core.ratelimit import RateLimitRule
+from app.services.protocols import ProtocolService
+from app.services.runs import RunStateStore
+from app.services.schedules import ALL_WEEKDAYS, ScheduleService, next_occurrence
+from bot.reminders import ReminderScheduler, ReminderSender
+from fakes import FakeClock, auth_headers, make_bot
+
+MONDAY = 0b0000001
+
+
+def test_next_occurrence_respects_weekdays_timezone_and_dst():
+    # 2026-10-19 is a Monday; Berlin leaves summer time on the 25th.
+    after = datetime(2026, 10, 19, 5, 0, tzinfo=timezone.utc)
+    assert next_occurrence(7 * 60 + 30, MONDAY, "Europe/Berlin", after) == datetime(2026, 10, 19, 5, 30, tzinfo=timezone.utc)
+    after = datetime(2026, 10, 19, 6, 0, tzinfo=timezone.utc)
+    assert next_occurrence(7 * 60 + 30, MONDAY, "Europe/Berlin", after) == datetime(2026, 10, 26, 6, 30, tzinfo=timezone.utc)
+    assert next_occurrence(0, 0, "UTC", after) is None
+
+
+@pytest.fixture
+def reminder_env(session_factory, shards):
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    clock = FakeClock(now)
+    bot = make_bot()
+    sender = ReminderSender(
+        bot, shards, RunStateStore(shards, flush_interval=60), rule=RateLimitRule(per_minute=6000, burst=100)
+    )
+    return ReminderScheduler(session_factory, sender, clock=clock), clock, bot
+
+
+def minute_of_day(moment: datetime) -> int:
+    return moment.hour * 60 + moment.minute
+
+
+@pytest.mark.asyncio
+async def test_due_schedule_sends_items_keyboard(reminder_env, db_session):
+    scheduler, clock, bot = reminder_env
+    protocol, _ = await ProtocolService(db_session).quick_create(1, "Morning", ["Water", "Vitamins"])
+    due = clock.now + timedelta(minutes=10)
+    await ScheduleService(db_session).create(1, protocol.id, minute_of_day(due), ALL_WEEKDAYS, "UTC")
+
+    await scheduler.load()
+    assert scheduler.next_due() == due
+    clock.now = due - timedelta(seconds=1)
+    assert await scheduler.tick() == 0
+    clock.now = due
+    assert await scheduler.tick() == 1
+    await scheduler.sender.flush()
+
+    (sent,) = bot.session.calls("SendMessage")
+    assert sent.chat_id == 1 and "Morning" in sent.text
+    assert [row[0].text for row in sent.reply_markup.inline_keyboard] == ["Water", "Vitamins"]
+    assert scheduler.next_due() == due + timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_reload_picks_up_changes_and_drops_superseded_entries(reminder_env, db_session):
+    scheduler, clock, bot = reminder_env
+    protocol, _ = await ProtocolService(db_session).quick_create(1, "Morning", ["Water"])
+    old_due = clock.now + timedelta(minutes=10)
+    new_due = clock.now + timedelta(minutes=20)
+    service = ScheduleService(db_session)
+    schedule = await service.create(1, protocol.id, minute_of_day(old_due), ALL_WEEKDAYS, "UTC")
+    await scheduler.load()
+
+    await service.update(1, schedule.id, minute_of_day=minute_of_day(new_due))
+    clock.now += timedelta(minutes=1)
+    assert await scheduler.reload() == 1
+    assert await scheduler.reload() == 0
+    assert scheduler.next_due() == new_due
+
+    clock.now = old_due
+    assert await scheduler.tick() == 0
+
+    # Deletes are tombstones, so the reload evicts the entry instead of leaving it to fire daily.
+    await service.delete(1, schedule.id)
+    clock.now += timedelta(minutes=1)
+    assert await scheduler.reload() == 1
+    assert len(scheduler) == 0 and scheduler.next_due() is None
+    clock.now = new_due
+    assert await scheduler.tick() == 0
+    assert await service.get(schedule.id) is None
+
+
+@pytest.mark.asyncio
+async def test_reload_follows_protocol_delete_and_restore(reminder_env, db_session):
+    scheduler, clock, bot = reminder_env
+    protocols = ProtocolService(db_session)
+    protocol, _ = await protocols.quick_create(1, "Morning", ["Water"])
+    due = clock.now + timedelta(minutes=10)
+    await ScheduleService(db_session).create(1, protocol.id, minute_of_day(due), ALL_WEEKDAYS, "UTC")
+    await scheduler.load()
+
+    await protocols.delete(1, protocol.id)
+    clock.now += timedelta(minutes=1)
+    assert await scheduler.reload() == 1
+    assert scheduler.next_due() is None
+
+    await protocols.restore(1, protocol.id)
+    clock.now += timedelta(minutes=1)
+    assert await scheduler.reload() == 1
+    assert scheduler.next_due() == due
+
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_a_failed_initial_load(reminder_env, session_factory, db_session):
+    _, _, bot = reminder_env
+    protocol, _ = await ProtocolService(db_session).quick_create(1, "Morning", ["Water"])
+    await ScheduleService(db_session).create(1, protocol.id, 7 * 60, ALL_WEEKDAYS, "UTC")
+    attempts = 0
+
+    def flaky_factory():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise OSError("database is down")
+        return session_factory()
+
+    sender = ReminderSender(bot, None, None)
+    scheduler = ReminderScheduler(flaky_factory, sender, reload_interval=0.05)
+    scheduler.start()
+    await asyncio.sleep(0.2)
+    await scheduler.stop()
+
+    assert attempts > 1
+    assert len(scheduler) == 1
+
+
+@pytest.mark.asyncio
+async def test_sender_retries_after_flood_control(reminder_env, db_session):
+    scheduler, clock, bot = reminder_env
+    protocol, _ = await ProtocolService(db_session).quick_create(1, "Morning", ["Water"])
+    due = clock.now + timedelta(minutes=1)
+    await ScheduleService(db_session).create(1, protocol.id, minute_of_day(due), ALL_WEEKDAYS, "UTC")
+    method = SendMessage(chat_id=1, text="x")
+    bot.session.failures = [TelegramRetryAfter(method=method, message="Flood control", retry_after=0)]
+
+    await scheduler.load()
+    clock.now = due
+    await scheduler.tick()
+    await scheduler.sender.flush()
+
+    assert len(bot.session.calls("SendMessage")) == 2
+    assert scheduler.sender.stats()["sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_schedule_api_validates_and_reports_next_run(api_client, db_session):
+    protocol = await ProtocolService(db_session).create(1, "Morning")
+
+    api_client.headers.update(auth_headers(1))
+    url = f"/api/protocols/{protocol.id}/schedules"
+    created = await api_client.post(url, json={"time": "07:30", "weekdays": [0, 2, 4], "timezone": "Europe/Berlin"})
+    bad_zone = await api_client.post(url, json={"time": "07:30", "timezone": "Mars/Base"})
+    bad_time = await api_client.post(url, json={"time": "25:00"})
+    not_owner = await api_client.post(url, json={"time": "07:30"}, headers=auth_headers(2))
+    disabled = await api_client.patch(f"/api/schedules/{created.json()['id']}", json={"enabled": False})
+    listed = await api_client.get(url)
+
+    body = created.json()
+    assert (body["time"], body["weekdays"], body["timezone"]) == ("07:30", [0, 2, 4], "Europe/Berlin")
+    assert body["next_run_at"] is not None
+    assert bad_zone.status_code == bad_time.status_code == 422
+    assert not_owner.status_code == 404
+    assert disabled.json()["enabled"] is False and disabled.json()["next_run_at"] is None
+    assert [s["id"] for s in listed.json()] == [body["id"]]
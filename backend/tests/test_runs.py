@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.runs import RunStateStore
+from app.services.statuses import ItemStatusService
+
+
+async def seed(db_session):
+    protocol = await ProtocolService(db_session).create(123, "Morning")
+    item_service = ItemService(db_session)
+    water = await item_service.create(123, protocol.id, "Water")
+    vitamins = await item_service.create(123, protocol.id, "Vitamins")
+    return protocol, water, vitamins
+
+
+async def checked_in_db(session_factory, protocol_id):
+    async with session_factory() as session:
+        statuses = await ItemStatusService(session).list_for_protocol(123, protocol_id)
+    return {s.item_id for s in statuses if s.checked}
+
+
+@pytest.mark.asyncio
+async def test_toggles_are_buffered_and_flushed_in_batches(session_factory, shards, db_session):
+    protocol, water, vitamins = await seed(db_session)
+    store = RunStateStore(shards, flush_interval=60)
+    await store.start_run(123, protocol.id, [water.id, vitamins.id])
+
+    state = await store.toggle(123, protocol.id, water.id)
+    state = await store.toggle(123, protocol.id, vitamins.id)
+    state = await store.toggle(123, protocol.id, vitamins.id)
+    assert state.checked == {water.id}
+    assert await checked_in_db(session_factory, protocol.id) == set()
+
+    await store.close()
+    assert await checked_in_db(session_factory, protocol.id) == {water.id}
+    assert (store.flushes, store.rows_flushed) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_run_completion_flushes_immediately(session_factory, shards, db_session):
+    protocol, water, vitamins = await seed(db_session)
+    store = RunStateStore(shards, flush_interval=60)
+    await store.start_run(123, protocol.id, [water.id, vitamins.id])
+
+    await store.toggle(123, protocol.id, water.id)
+    state = await store.toggle(123, protocol.id, vitamins.id)
+    assert state.complete
+    for _ in range(50):
+        if store.flushes:
+            break
+        await asyncio.sleep(0.01)
+    assert await checked_in_db(session_factory, protocol.id) == {water.id, vitamins.id}
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_reload_overlays_unflushed_taps(session_factory, shards, db_session):
+    protocol, water, vitamins = await seed(db_session)
+    store = RunStateStore(shards, flush_interval=60)
+    await store.toggle(123, protocol.id, water.id)
+
+    # Simulate eviction from the shared backend before the flush happened.
+    await store.backend.delete((123, protocol.id))
+    state = await store.get(123, protocol.id)
+    assert state.checked == {water.id}
+    await store.close()
@@ -0,0 +1,180 @@
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from app.core.db import HashRing, ShardRouter, UserMoving, get_shards, id_base, shard_directory, shard_of
+from app.main import app
+from app.services.protocols import ProtocolService
+from app.services.rebalance import Rebalancer
+from app.services.schedules import ALL_WEEKDAYS, ScheduleService
+from app.storage import models
+from bot.reminders import ReminderScheduler
+from fakes import auth_headers
+
+
+def user_on(router: ShardRouter, shard: int, skip: int = 0) -> int:
+    return [u for u in range(1, 10_000) if router.ring.shard_for(u) == shard][skip]
+
+
+async def count(router: ShardRouter, shard: int, model) -> int:
+    async with router.session(shard) as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest_asyncio.fixture
+async def sharded(tmp_path):
+    router = ShardRouter.from_urls([f"sqlite+aiosqlite:///{tmp_path}/shard{n}.db" for n in range(3)])
+    await router.prepare()
+    app.dependency_overrides[get_shards] = lambda: router
+    yield router
+    app.dependency_overrides.clear()
+    await router.dispose()
+
+
+def test_adding_a_shard_only_moves_users_onto_it():
+    before, after = HashRing(range(3)), HashRing(range(4))
+    users = range(20_000)
+    moved = [u for u in users if before.shard_for(u) != after.shard_for(u)]
+    assert all(after.shard_for(u) == 3 for u in moved)
+    assert 0.15 < len(moved) / len(users) < 0.35
+    shares = [sum(1 for u in users if before.shard_for(u) == shard) / len(users) for shard in range(3)]
+    assert all(0.2 < share < 0.47 for share in shares)
+
+
+@pytest.mark.asyncio
+async def test_api_keeps_each_user_on_their_shard(sharded):
+    alice, bob = user_on(sharded, 1), user_on(sharded, 2)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        client.headers.update(auth_headers(alice))
+        morning = (await client.post("/api/protocols/", json={"title": "Morning"})).json()
+        evening = (await client.post("/api/protocols/", json={"title": "Evening"}, headers=auth_headers(bob))).json()
+        water = (await client.post(f"/api/protocols/{morning['id']}/items", json={"title": "Water"})).json()
+        await client.patch(f"/api/items/{water['id']}", json={"title": "Warm water"})
+        schedule = await client.post(
+            f"/api/protocols/{evening['id']}/schedules", json={"time": "21:00"}, headers=auth_headers(bob)
+        )
+        listed = (await client.get("/api/protocols/")).json()
+        items = (await client.get(f"/api/protocols/{morning['id']}/items")).json()
+
+    assert (shard_of(morning["id"]), shard_of(water["id"]), shard_of(evening["id"])) == (1, 1, 2)
+    assert shard_of(schedule.json()["id"]) == 2
+    assert morning["id"] == id_base(1) + 1
+    assert [p["title"] for p in listed] == ["Morning"]
+    assert [i["title"] for i in items] == ["Warm water"]
+    assert [await count(sharded, shard, models.Protocol) for shard in range(3)] == [0, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_rebalancer_moves_a_user_into_the_target_id_range(sharded):
+    carol, dave = user_on(sharded, 2), user_on(sharded, 1)
+    async with sharded.session_for_user(carol) as session:
+        protocol, _ = await ProtocolService(session).quick_create(carol, "Morning", ["Water", "Stretch"])
+        await ScheduleService(session).create(carol, protocol.id, 7 * 60, 0b1111111, "UTC")
+    async with sharded.session_for_user(dave) as session:
+        await ProtocolService(session).create(dave, "Night")
+
+    # Moving down: SQLite would continue a table's ids after the largest one, so kept ids would leak.
+    assert await Rebalancer(sharded, settle=0).move(carol, 2, 1) == 5
+    assert await sharded.shard_for_user(carol) == 1
+    assert await count(sharded, 2, models.Item) == await count(sharded, 2, models.User) == 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        client.headers.update(auth_headers(carol))
+        listed = (await client.get("/api/protocols/")).json()
+        moved_id = listed[0]["id"]
+        items = (await client.get(f"/api/protocols/{moved_id}/items")).json()
+        schedules = (await client.get(f"/api/protocols/{moved_id}/schedules")).json()
+        stale = await client.get(f"/api/protocols/{protocol.id}/items")
+        own = (await client.post("/api/protocols/", json={"title": "Evening"})).json()
+        native = (await client.post("/api/protocols/", json={"title": "Late"}, headers=auth_headers(dave))).json()
+
+    assert [p["title"] for p in listed] == ["Morning"]
+    assert [i["title"] for i in items] == ["Water", "Stretch"]
+    assert all(shard_of(row["id"]) == 1 for row in [*listed, *items, *schedules]) and len(schedules) == 1
+    assert stale.status_code == 404
+    assert own["id"] == id_base(1) + 3 and native["id"] == id_base(1) + 4
+
+
+@pytest.mark.asyncio
+async def test_move_waits_until_no_process_routes_to_the_source(sharded):
+    carol = user_on(sharded, 2)
+    async with sharded.session_for_user(carol) as session:
+        await ProtocolService(session).create(carol, "Morning")
+    # Another API or bot process, with its own directory cache.
+    other = ShardRouter(sharded.sessionmakers, cache_ttl=0.1)
+    assert await other.shard_for_user(carol) == 2
+
+    move = asyncio.create_task(Rebalancer(sharded, settle=0.3).move(carol, 2, 1))
+    await asyncio.sleep(0.05)
+    # Within its TTL the other process still routes to the source, so nothing has been copied yet.
+    assert await other.shard_for_user(carol) == 2
+    assert await count(sharded, 1, models.Protocol) == 0
+    await asyncio.sleep(0.1)
+    with pytest.raises(UserMoving):
+        await other.shard_for_user(carol)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", headers=auth_headers(carol)
+    ) as client:
+        refused = await client.post("/api/protocols/", json={"title": "Evening"})
+    assert await move == 2
+
+    assert refused.status_code == 503 and refused.headers["Retry-After"] == "5"
+    assert await other.shard_for_user(carol) == 1
+    assert await count(sharded, 2, models.Protocol) == 0
+
+
+@pytest.mark.asyncio
+async def test_reminders_follow_a_moved_user(sharded):
+    carol = user_on(sharded, 2)
+    async with sharded.session_for_user(carol) as session:
+        protocol = await ProtocolService(session).create(carol, "Morning")
+        await ScheduleService(session).create(carol, protocol.id, 7 * 60, ALL_WEEKDAYS, "UTC")
+    # Each shard's bot scheduler; the sender is only needed to fire reminders.
+    source, target = (ReminderScheduler(sharded.sessionmakers[shard], sender=None) for shard in (2, 1))
+    await source.load()
+    await target.load()
+    assert (len(source), len(target)) == (1, 0)
+
+    move = asyncio.create_task(Rebalancer(sharded, settle=0.2).move(carol, 2, 1))
+    await asyncio.sleep(0.1)
+    # Retired on the source while the move settles, before its rows are deleted.
+    assert await source.reload() == 1 and len(source) == 0
+    await move
+
+    assert await target.reload() == 1 and len(target) == 1
+    assert await count(sharded, 2, models.Schedule) == 0
+
+
+@pytest.mark.asyncio
+async def test_new_shard_rollout_pins_then_moves_users(tmp_path):
+    urls = [f"sqlite+aiosqlite:///{tmp_path}/shard{n}.db" for n in range(3)]
+    old = ShardRouter.from_urls(urls[:2])
+    await old.prepare()
+    users = range(1, 41)
+    for user_id in users:
+        async with old.session_for_user(user_id) as session:
+            await ProtocolService(session).create(user_id, f"P{user_id}")
+    await old.dispose()
+
+    new = ShardRouter.from_urls(urls)
+    await new.prepare()
+    rebalancer = Rebalancer(new, settle=0)
+    pinned = await rebalancer.pin_current()
+    moves = await rebalancer.plan()
+    assert pinned == len(moves) > 0 and all(m.target == 2 for m in moves)
+    for user_id in users:
+        async with new.session_for_user(user_id) as session:
+            assert len(await ProtocolService(session).list(user_id)) == 1
+
+    assert await rebalancer.run() == pinned
+    assert await rebalancer.plan() == []
+    async with new.primary() as session:
+        assert await session.scalar(select(func.count()).select_from(shard_directory)) == 0
+    new.forget()
+    for user_id in users:
+        async with new.session_for_user(user_id) as session:
+            assert len(await ProtocolService(session).list(user_id)) == 1
+    await new.dispose()
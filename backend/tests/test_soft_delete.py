@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.purge import Purger
+from app.services.schedules import ALL_WEEKDAYS, ScheduleService
+from app.storage import models
+from app.storage.repositories import ItemStatusRepository
+from fakes import auth_headers
+
+
+async def count(session, model) -> int:
+    return (await session.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_delete_hides_protocol_and_restore_brings_it_back(db_session):
+    service = ProtocolService(db_session)
+    kept = await service.create(1, "Evening")
+    protocol, _ = await service.quick_create(1, "Morning", ["Water", "Vitamins"])
+
+    await service.delete(1, protocol.id)
+    assert [p.id for p in await service.list(1)] == [kept.id]
+    assert [o.id for o in await service.overview(1)] == [kept.id]
+    assert await service.get(protocol.id) is None
+    assert await service.version(protocol.id) is None
+
+    assert await service.restore(1, protocol.id)
+    assert [p.id for p in await service.list(1)] == [kept.id, protocol.id]
+    assert [i.title for i in await ItemService(db_session).list(1, protocol.id)] == ["Water", "Vitamins"]
+
+
+@pytest.mark.asyncio
+async def test_restored_protocol_does_not_share_an_order_index(db_session):
+    service = ProtocolService(db_session)
+    first = await service.create(1, "Morning")
+    deleted = await service.create(1, "Evening")
+    await service.delete(1, deleted.id)
+    created = await service.create(1, "Night")
+    await service.reorder(1, [created.id, first.id])
+
+    assert await service.restore(1, deleted.id)
+    protocols = await service.list(1)
+    assert [p.id for p in protocols] == [created.id, first.id, deleted.id]
+    assert len({p.order_index for p in protocols}) == 3
+
+
+@pytest.mark.asyncio
+async def test_restore_is_refused_after_grace_period(db_session):
+    service = ProtocolService(db_session)
+    protocol = await service.create(1, "Morning")
+    await service.delete(1, protocol.id)
+    await db_session.execute(
+        update(models.Protocol)
+        .where(models.Protocol.id == protocol.id)
+        .values(deleted_at=datetime.now(timezone.utc) - timedelta(days=30))
+    )
+    await db_session.commit()
+
+    assert not await service.restore(1, protocol.id)
+    assert await service.get(protocol.id) is None
+
+
+@pytest.mark.asyncio
+async def test_purger_removes_tombstoned_protocols_in_batches(session_factory, db_session):
+    service = ProtocolService(db_session)
+    kept, kept_items = await service.quick_create(1, "Evening", ["Read"])
+    protocol, items = await service.quick_create(1, "Morning", [f"Step {i}" for i in range(5)])
+    now = datetime.now(timezone.utc)
+    await ItemStatusRepository(db_session).upsert_many(
+        [
+            {"user_id": 1, "protocol_id": p.id, "item_id": i.id, "checked": True, "updated_at": now}
+            for p, i in [(protocol, items[0]), (protocol, items[3]), (kept, kept_items[0])]
+        ]
+    )
+    await db_session.commit()
+    await service.delete(1, protocol.id)
+    schedules = ScheduleService(db_session)
+    await schedules.delete(1, (await schedules.create(1, kept.id, 7 * 60, ALL_WEEKDAYS, "UTC")).id)
+
+    purger = Purger(session_factory, grace=3600, batch_size=2, pause=0)
+    assert await purger.run_once() == 0
+
+    purger.grace = 0
+    assert await purger.run_once() == 1
+    assert purger.items_purged == 5
+    assert purger.protocols_purged == purger.schedules_purged == 1
+    async with session_factory() as session:
+        assert await count(session, models.Protocol) == 1
+        assert await count(session, models.Item) == 1
+        assert await count(session, models.ItemStatus) == 1
+    assert not await service.restore(1, protocol.id)
+
+
+@pytest.mark.asyncio
+async def test_items_of_a_deleted_protocol_are_hidden_and_frozen(db_session, api_client):
+    service = ProtocolService(db_session)
+    protocol, items = await service.quick_create(1, "Morning", ["Water", "Vitamins"])
+    version = await service.version(protocol.id)
+    await service.delete(1, protocol.id)
+
+    item_service = ItemService(db_session)
+    assert await item_service.list(1, protocol.id) is None
+    assert await item_service.create(1, protocol.id, "Stretch") is None
+    assert not await item_service.rename(1, items[0].id, "Tea")
+    assert not await item_service.reorder(1, [items[1].id, items[0].id])
+
+    api_client.headers.update(auth_headers(1))
+    listed = await api_client.get(f"/api/protocols/{protocol.id}/items")
+    created = await api_client.post(f"/api/protocols/{protocol.id}/items", json={"title": "Stretch"})
+    renamed = await api_client.patch(f"/api/items/{items[0].id}", json={"title": "Tea"})
+
+    assert listed.status_code == created.status_code == renamed.status_code == 404
+    assert await service.restore(1, protocol.id)
+    assert await service.version(protocol.id) == version
+    restored = await item_service.list(1, protocol.id)
+    assert [(i.title, i.order_index) for i in restored] == [("Water", 0), ("Vitamins", 1)]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.db import Base, tune_sqlite
+from app.services.protocols import ProtocolService
+from app.storage import models
+
+
+@pytest_asyncio.fixture
+async def tuned(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/tuned.db")
+    queue = tune_sqlite(engine, busy_timeout_ms=2000)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession), queue
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_connections_get_wal_and_tuned_pragmas(tuned):
+    sessionmaker, _ = tuned
+    async with sessionmaker() as session:
+        pragmas = [
+            (await session.execute(text(f"PRAGMA {name}"))).scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size")
+        ]
+    assert pragmas == ["wal", 1, 2000, -64 * 1024]
+
+
+@pytest.mark.asyncio
+async def test_writers_queue_while_readers_keep_going(tuned):
+    sessionmaker, queue = tuned
+
+    async with sessionmaker() as holder:
+        await ProtocolService(holder).create(1, "Seed")
+        await holder.execute(models.Protocol.__table__.update().values(title="Uncommitted"))
+        waiting = asyncio.create_task(_create(sessionmaker, 2, "Queued"))
+        await asyncio.sleep(0.1)
+        assert not waiting.done() and queue.lock.locked()
+
+        async with sessionmaker() as reader:
+            titles = await asyncio.wait_for(reader.scalars(select(models.Protocol.title)), timeout=1)
+            assert list(titles) == ["Seed"]
+        await holder.commit()
+
+    await waiting
+    await asyncio.gather(*(_create(sessionmaker, user_id, f"P{user_id}") for user_id in range(3, 33)))
+    async with sessionmaker() as session:
+        assert await session.scalar(select(func.count()).select_from(models.Protocol)) == 32
+    assert not queue.lock.locked() and queue.queued > 0
+
+
+async def _create(sessionmaker, user_id: int, title: str) -> None:
+    async with sessionmaker() as session:
+        await ProtocolService(session).create(user_id, title)
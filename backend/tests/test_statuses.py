@@ -13,8 +13,8 @@ async def test_toggle_and_reset(db_session):
 
     protocol = await ProtocolService(db_session).create(123, "Morning")
     item_service = ItemService(db_session)
-    item1 = await item_service.create(protocol.id, "Water")
-    item2 = await item_service.create(protocol.id, "Vitamins")
+    item1 = await item_service.create(123, protocol.id, "Water")
+    item2 = await item_service.create(123, protocol.id, "Vitamins")
 
     status_service = ItemStatusService(db_session)
     checked = await status_service.toggle(123, protocol.id, item1.id)
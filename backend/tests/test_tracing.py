@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.tracing import InMemorySpanExporter, JsonLinesSpanExporter, Tracer, tracer
+from fakes import auth_headers
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    return exporter.spans
+
+
+@pytest.mark.asyncio
+async def test_quick_create_trace_covers_llm_repositories_and_sql(fake_openai, api_client, spans):
+    response = await api_client.post(
+        "/api/protocols/quick-create", json={"text": "Morning: water, vitamins"}, headers=auth_headers(1)
+    )
+
+    assert response.status_code == 200
+    by_id = {span.span_id: span for span in spans}
+    root = spans[-1]
+    assert root.name == "POST /api/protocols/quick-create" and root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert {span.trace_id for span in spans} == {root.trace_id}
+
+    def path(span):
+        names = []
+        while span.parent_id is not None:
+            span = by_id[span.parent_id]
+            names.append(span.name)
+        return names
+
+    names = [span.name for span in spans]
+    assert "POST /chat/completions" in names
+    llm = next(span for span in spans if span.name == "POST /chat/completions")
+    assert path(llm)[-2:] == ["ProtocolParser.parse_protocol", root.name]
+    ensure = next(span for span in spans if span.name == "UserRepository.ensure")
+    assert path(ensure) == ["ProtocolService.quick_create", root.name]
+    sql = [span for span in spans if span.name.startswith("sql ")]
+    assert "sql INSERT" in {span.name for span in sql}
+    assert all("Repository." in by_id[span.parent_id].name for span in sql)
+
+
+@pytest.mark.asyncio
+async def test_spans_follow_tasks_and_land_in_jsonl(tmp_path):
+    exporter = JsonLinesSpanExporter(tmp_path / "traces.jsonl")
+    local = Tracer(exporter)
+
+    async def child(n):
+        with local.span("child", n=n):
+            await asyncio.sleep(0)
+
+    with local.span("parent") as parent:
+        await asyncio.gather(*(asyncio.create_task(child(n)) for n in range(3)))
+    with pytest.raises(ValueError):
+        with local.span("failing"):
+            raise ValueError("boom")
+    local.close()
+
+    records = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    children = [r for r in records if r["name"] == "child"]
+    assert len(records) == 5 and len(children) == 3
+    assert all(r["parent_id"] == parent.span_id and r["trace_id"] == parent.trace_id for r in children)
+    assert sorted(r["attributes"]["n"] for r in children) == [0, 1, 2]
+    failing = records[-1]
+    assert failing["error"] == "ValueError: boom" and failing["trace_id"] != parent.trace_id
+
+
+def test_disabled_tracer_hands_out_no_spans():
+    with Tracer().span("anything") as span:
+        assert span is None
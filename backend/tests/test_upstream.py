@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.parser import ProtocolParser
+from app.services.upstream import CircuitBreaker, UpstreamClient, UpstreamError, UpstreamUnavailable, set_upstream
+from fakes import FakeClock, FakeOpenAI
+
+
+def make_client(fake: FakeOpenAI, **kwargs) -> UpstreamClient:
+    kwargs.setdefault("backoff_base", 0.001)
+    return UpstreamClient(
+        "http://fake-openai", "test-key", transport=httpx.ASGITransport(app=fake.app), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_requests_are_collapsed():
+    fake = FakeOpenAI(delay=0.05)
+    client = make_client(fake)
+    results = await asyncio.gather(*(client.post_json("/chat/completions", {"q": 1}, timeout=5) for _ in range(5)))
+    assert fake.calls == 1
+    assert all(r == results[0] for r in results)
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retries_on_5xx_then_succeeds():
+    fake = FakeOpenAI()
+    fake.failures = [503, 429]
+    client = make_client(fake, max_retries=2)
+    data = await client.post_json("/chat/completions", {"q": 1}, timeout=5)
+    assert "choices" in data
+    assert fake.calls == 3
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast():
+    fake = FakeOpenAI()
+    fake.failures = [500] * 10
+    client = make_client(fake, max_retries=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            await client.post_json("/chat/completions", {"q": 1}, timeout=5)
+    calls = fake.calls
+    with pytest.raises(UpstreamUnavailable):
+        await client.post_json("/chat/completions", {"q": 1}, timeout=5)
+    assert fake.calls == calls
+    assert client.breaker.state == "open"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_breaker_closes_after_a_probe_rejected_with_4xx():
+    clock = FakeClock()
+    fake = FakeOpenAI()
+    fake.failures = [503, 400]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = make_client(fake, max_retries=0, breaker=breaker)
+    with pytest.raises(UpstreamUnavailable):
+        await client.post_json("/chat/completions", {"q": 1}, timeout=5)
+    assert breaker.state == "open"
+
+    clock.now += 30
+    with pytest.raises(UpstreamError) as exc_info:
+        await client.post_json("/chat/completions", {"q": 2}, timeout=5)
+    assert exc_info.value.status_code == 400
+    # The upstream answered, so the breaker is closed again rather than stuck waiting on the probe.
+    assert breaker.state == "closed"
+    assert "choices" in await client.post_json("/chat/completions", {"q": 3}, timeout=5)
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_lets_the_next_call_probe():
+    clock = FakeClock()
+    fake = FakeOpenAI()
+    fake.failures = [503]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = make_client(fake, max_retries=0, breaker=breaker)
+    with pytest.raises(UpstreamUnavailable):
+        await client.post_json("/chat/completions", {"q": 1}, timeout=5)
+
+    clock.now += 30
+    fake.delay = 1
+    probe = asyncio.ensure_future(client._request("/chat/completions", 5, json={"q": 2}))
+    await asyncio.sleep(0.05)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    fake.delay = 0
+    assert "choices" in await client.post_json("/chat/completions", {"q": 3}, timeout=5)
+    assert breaker.state == "closed"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_parser_falls_back_to_local_parsing(fake_openai):
+    set_upstream(make_client(fake_openai, max_retries=0))
+    fake_openai.failures = [503]
+    result = await ProtocolParser().parse_protocol("Evening: read, stretch")
+    assert result.title == "Evening"
+    assert result.items == ["read", "stretch"]
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import event
+
+from app.storage.cache import known_users
+from app.storage.repositories import UserRepository
+
+
+@pytest.mark.asyncio
+async def test_ensure_skips_database_for_known_users(db_session):
+    statements = []
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    repo = UserRepository(db_session)
+    await repo.ensure(123, "tester")
+    await repo.ensure(123, "tester")
+    assert len(statements) == 1
+    assert 123 not in known_users
+
+    await db_session.commit()
+    assert 123 in known_users
+    await repo.ensure(123, "tester")
+    assert len(statements) == 1
+
+    # Inserting an existing user is a no-op rather than an integrity error.
+    known_users.clear()
+    await repo.ensure(123, "tester")
+    await db_session.commit()
+    assert await repo.get(123) is not None
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_users_are_not_cached(db_session):
+    await UserRepository(db_session).ensure(456)
+    await db_session.rollback()
+    assert 456 not in known_users
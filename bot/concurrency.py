@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+# Runs jobs on a fixed number of workers; jobs sharing a key run one at a time, in submission order.
+class KeyedTaskPool:
+    def __init__(self, workers: int = 16, max_pending: int = 1000) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queues: dict[Hashable, deque[Callable[[], Awaitable[Any]]]] = {}
+        self._ready: asyncio.Queue[Hashable] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tasks: list[asyncio.Task] = []
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> None:
+        # Backpressure: the feeder (polling loop or webhook) waits once max_pending jobs are queued.
+        await self._slots.acquire()
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        queue = self._queues.get(key)
+        if queue is None:
+            self._queues[key] = deque([job])
+            self._ready.put_nowait(key)
+        else:
+            queue.append(job)
+
+    async def join(self) -> None:
+        await self._ready.join()
+
+    async def stop(self, drain: bool = True) -> None:
+        if drain:
+            await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending_seen": self.max_pending_seen,
+            "active_keys": len(self._queues),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            job = queue.popleft()
+            try:
+                await job()
+            except Exception:  # noqa: BLE001
+                self.failed += 1
+                logger.exception("Update job failed for key %r", key)
+            finally:
+                self.processed += 1
+                self.pending -= 1
+                self._slots.release()
+                # Requeue the key at the back instead of draining it, so one chatty chat
+                # cannot hold a worker while others wait.
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                self._ready.task_done()
+
+
+class OrderedUpdateMiddleware(BaseMiddleware):
+    def __init__(self, pool: KeyedTaskPool) -> None:
+        self.pool = pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is not None:
+            key: Hashable = ("chat", chat.id)
+        elif user is not None:
+            key = ("user", user.id)
+        else:
+            key = ("update", getattr(event, "update_id", id(event)))
+        await self.pool.submit(key, lambda: handler(event, data))
+        return None
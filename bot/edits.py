@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections.abc import Hashable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from app.core.config import settings
+from app.core.ratelimit import InMemoryRateLimitBackend, RateLimitRule
+
+logger = logging.getLogger(__name__)
+
+
+# Debounces keyboard edits per message: only the newest markup seen within the window is sent,
+# paced by global and per-chat send rates and paused whenever Telegram answers with retry_after.
+class EditScheduler:
+    def __init__(
+        self,
+        window: float = 0.3,
+        global_rule: RateLimitRule = RateLimitRule(per_minute=25 * 60, burst=25),
+        chat_rule: RateLimitRule = RateLimitRule(per_minute=60, burst=3),
+        max_attempts: int = 3,
+    ) -> None:
+        self.window = window
+        self.global_rule = global_rule
+        self.chat_rule = chat_rule
+        self.max_attempts = max_attempts
+        self._buckets = InMemoryRateLimitBackend()
+        self._pending: dict[Hashable, tuple[Bot, InlineKeyboardMarkup]] = {}
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self._paused_until = 0.0
+        self.scheduled = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    def schedule(self, bot: Bot, chat_id: int, message_id: int, markup: InlineKeyboardMarkup) -> None:
+        key = (chat_id, message_id)
+        self.scheduled += 1
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = (bot, markup)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._run(key))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "scheduled": self.scheduled,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def flush(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def _run(self, key: Hashable) -> None:
+        try:
+            await self._send_pending(key)
+        finally:
+            # Released synchronously once nothing is pending, so a later schedule() starts a new task.
+            self._tasks.pop(key, None)
+
+    async def _send_pending(self, key: Hashable) -> None:
+        chat_id, message_id = key
+        await asyncio.sleep(self.window)
+        attempts = 0
+        while key in self._pending:
+            await self._wait_for_capacity(chat_id)
+            # Take the newest markup only now, after any rate-limit wait has absorbed more taps.
+            bot, markup = self._pending.pop(key)
+            try:
+                await bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=markup)
+            except TelegramRetryAfter as exc:
+                attempts += 1
+                self.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+                if attempts < self.max_attempts:
+                    self._pending.setdefault(key, (bot, markup))
+                    continue
+                self.failed += 1
+            except TelegramBadRequest as exc:
+                if "message is not modified" in str(exc):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                    logger.warning("Keyboard edit failed for %s: %s", key, exc)
+            except Exception:  # noqa: BLE001
+                self.failed += 1
+                logger.exception("Keyboard edit failed for %s", key)
+            else:
+                self.sent += 1
+            attempts = 0
+
+    async def _wait_for_capacity(self, chat_id: int) -> None:
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = await self._buckets.acquire(f"chat:{chat_id}", self.chat_rule)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            wait = await self._buckets.acquire("global", self.global_rule)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            return
+
+
+edit_scheduler = EditScheduler(
+    window=settings.bot_edit_window_ms / 1000,
+    global_rule=RateLimitRule(per_minute=settings.bot_edits_per_second * 60, burst=settings.bot_edits_per_second),
+    chat_rule=RateLimitRule(per_minute=settings.bot_chat_edits_per_minute, burst=3),
+)
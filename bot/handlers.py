@@ -1,26 +1,30 @@
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import AsyncSessionLocal
+from app.core.db import shards
 from app.core.config import settings
 from app.services.items import ItemService
 from app.services.protocols import ProtocolService
-from app.services.statuses import ItemStatusService
+from app.services.runs import RunStateStore
 from app.storage.repositories import UserRepository
-from bot.keyboards import items_keyboard, main_menu_keyboard, protocols_keyboard
+from bot.edits import edit_scheduler
+from bot.keyboards import (
+    cached_items_keyboard,
+    decode_page,
+    decode_toggle,
+    main_menu_keyboard,
+    page_of,
+    protocols_keyboard,
+    rerender_items_keyboard,
+)
 
 router = Router()
-
-
-async def _get_session() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
-        yield session
+run_store = RunStateStore(shards, flush_interval=settings.run_flush_interval_ms / 1000)
 
 
 @router.message(F.text == "/start")
 async def start_handler(message: Message) -> None:
-    async with AsyncSessionLocal() as session:
+    async with shards.session_for_user(message.from_user.id) as session:
         await UserRepository(session).ensure(message.from_user.id, message.from_user.username)
         await session.commit()
     if not settings.webapp_url:
@@ -35,7 +39,7 @@ async def start_handler(message: Message) -> None:
 @router.message(F.text == "/protocols")
 async def protocols_handler(message: Message) -> None:
     user_id = message.from_user.id
-    async with AsyncSessionLocal() as session:
+    async with shards.session_for_user(user_id) as session:
         await UserRepository(session).ensure(user_id, message.from_user.username)
         await session.commit()
         service = ProtocolService(session)
@@ -53,36 +57,82 @@ async def protocols_button_handler(message: Message) -> None:
 async def protocol_selected(call: CallbackQuery) -> None:
     user_id = call.from_user.id
     protocol_id = int(call.data.split(":")[1])
-    async with AsyncSessionLocal() as session:
-        status_service = ItemStatusService(session)
-        item_service = ItemService(session)
-        protocol_service = ProtocolService(session)
-        await status_service.reset_protocol(user_id, protocol_id)
-        items = await item_service.list(protocol_id)
-        protocol = await protocol_service.get(protocol_id)
-    data = [(i.id, i.title, False) for i in items]
+    async with shards.session_for_user(user_id) as session:
+        protocol = await ProtocolService(session).get(protocol_id)
+        if protocol is None:
+            await call.answer("Protocol not found")
+            return
+        # Reopening an unchanged protocol costs only this primary-key lookup.
+        items = await ItemService(session).titles(protocol_id, protocol.version)
+        title, version = protocol.title, protocol.version
+    await run_store.start_run(user_id, protocol_id, [item_id for item_id, _ in items])
     await call.message.delete()
-    title = protocol.title if protocol else "Checklist"
     line = "━" * 26
-    await call.message.answer(f"{line}\n{title}\n{line}", reply_markup=items_keyboard(data, protocol_id))
+    await call.message.answer(
+        f"{line}\n{title}\n{line}", reply_markup=cached_items_keyboard(items, protocol_id, version)
+    )
 
 
-@router.callback_query(F.data.startswith("t:"))
+async def _current_items(user_id: int, protocol_id: int) -> tuple[int | None, tuple[tuple[int, str], ...]]:
+    async with shards.session_for_user(user_id) as session:
+        version = await ProtocolService(session).version(protocol_id)
+        if version is None:
+            return None, ()
+        return version, await ItemService(session).titles(protocol_id, version)
+
+
+async def _reloaded_items_keyboard(user_id: int, protocol_id: int, item_id: int):
+    await run_store.reload(user_id, protocol_id)
+    state = await run_store.toggle(user_id, protocol_id, item_id)
+    version, items = await _current_items(user_id, protocol_id)
+    if version is None:
+        return None
+    return cached_items_keyboard(items, protocol_id, version, state.checked, page_of(items, item_id))
+
+
+@router.callback_query(F.data.startswith("c:"))
 async def toggle_item(call: CallbackQuery) -> None:
-    parts = call.data.split(":")
-    protocol_id = int(parts[1])
-    item_id = int(parts[2])
+    protocol_id, item_id, version = decode_toggle(call.data)
     user_id = call.from_user.id
+    # Answer first so the tap spinner clears immediately; the keyboard edit is debounced below.
+    await call.answer()
+
+    async with shards.session_for_user(user_id) as session:
+        current_version = await ProtocolService(session).version(protocol_id)
+    if current_version is None:
+        return
+    markup = getattr(call.message, "reply_markup", None)
+    if current_version == version and markup is not None:
+        # The message's own keyboard already carries every id and title; the checked flags come
+        # from the run store, which also covers taps whose edits are still debounced.
+        state = await run_store.toggle(user_id, protocol_id, item_id)
+        new_markup = rerender_items_keyboard(markup, state.checked)
+    else:
+        # Items changed in the Mini App since this keyboard was rendered.
+        new_markup = await _reloaded_items_keyboard(user_id, protocol_id, item_id)
+        if new_markup is None:
+            return
+
+    edit_scheduler.schedule(call.bot, call.message.chat.id, call.message.message_id, new_markup)
 
-    async with AsyncSessionLocal() as session:
-        status_service = ItemStatusService(session)
-        item_service = ItemService(session)
-        await status_service.toggle(user_id, protocol_id, item_id)
-        items = await item_service.list(protocol_id)
-        statuses = await status_service.list_for_protocol(user_id, protocol_id)
 
-    status_map = {(s.item_id): s.checked for s in statuses}
-    items_with_status = [(i.id, i.title, status_map.get(i.id, False)) for i in items]
+@router.callback_query(F.data.startswith("t:"))
+async def legacy_toggle_item(call: CallbackQuery) -> None:
+    # Keyboards sent before the compact callback format carry no version; always reload them.
+    _, protocol_id, item_id = call.data.split(":")
+    await call.answer()
+    new_markup = await _reloaded_items_keyboard(call.from_user.id, int(protocol_id), int(item_id))
+    if new_markup is not None:
+        edit_scheduler.schedule(call.bot, call.message.chat.id, call.message.message_id, new_markup)
 
-    await call.message.edit_reply_markup(reply_markup=items_keyboard(items_with_status, protocol_id))
+
+@router.callback_query(F.data.startswith("n:"))
+async def page_items(call: CallbackQuery) -> None:
+    protocol_id, page, _ = decode_page(call.data)
     await call.answer()
+    version, items = await _current_items(call.from_user.id, protocol_id)
+    if version is None:
+        return
+    state = await run_store.get(call.from_user.id, protocol_id)
+    new_markup = cached_items_keyboard(items, protocol_id, version, state.checked, page)
+    edit_scheduler.schedule(call.bot, call.message.chat.id, call.message.message_id, new_markup)
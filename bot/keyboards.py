@@ -5,10 +5,21 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
     WebAppInfo,
 )
+from collections.abc import Sequence
+from functools import lru_cache
 from urllib.parse import urlencode, urlparse, urlunparse, parse_qs
 
+from app.core.config import settings
+from app.storage.cache import protocol_content
+
 
 def protocols_keyboard(protocols: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    return _protocols_keyboard(tuple(protocols))
+
+
+@lru_cache(maxsize=4096)
+def _protocols_keyboard(protocols: tuple[tuple[int, str], ...]) -> InlineKeyboardMarkup:
+    # Keyed by the rows themselves, so any rename, reorder or delete is a different key.
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text=title, callback_data=f"p:{protocol_id}")]
@@ -17,14 +28,113 @@ def protocols_keyboard(protocols: list[tuple[int, str]]) -> InlineKeyboardMarkup
     )
 
 
-def items_keyboard(items: list[tuple[int, str, bool]], protocol_id: int) -> InlineKeyboardMarkup:
+CHECK_MARK = "✅ "
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _b36(value: int) -> str:
+    if value == 0:
+        return "0"
+    out = []
+    while value:
+        value, rem = divmod(value, 36)
+        out.append(_DIGITS[rem])
+    return "".join(reversed(out))
+
+
+def encode_toggle(protocol_id: int, item_id: int, version: int) -> str:
+    # Compact base36 ids keep callback_data well under Telegram's 64-byte limit.
+    return f"c:{_b36(protocol_id)}:{_b36(item_id)}:{_b36(version)}"
+
+
+def decode_toggle(data: str) -> tuple[int, int, int]:
+    _, protocol_id, item_id, version = data.split(":")
+    return int(protocol_id, 36), int(item_id, 36), int(version, 36)
+
+
+def encode_page(protocol_id: int, page: int, version: int) -> str:
+    return f"n:{_b36(protocol_id)}:{_b36(page)}:{_b36(version)}"
+
+
+def decode_page(data: str) -> tuple[int, int, int]:
+    _, protocol_id, page, version = data.split(":")
+    return int(protocol_id, 36), int(page, 36), int(version, 36)
+
+
+def _item_label(title: str, checked: bool) -> str:
+    return f"{CHECK_MARK}{title}" if checked else title
+
+
+def page_of(items: Sequence[tuple], item_id: int, page_size: int | None = None) -> int:
+    page_size = page_size or settings.bot_items_per_page
+    for index, item in enumerate(items):
+        if item[0] == item_id:
+            return index // page_size
+    return 0
+
+
+def items_keyboard(
+    items: list[tuple[int, str, bool]],
+    protocol_id: int,
+    version: int = 0,
+    page: int = 0,
+    page_size: int | None = None,
+) -> InlineKeyboardMarkup:
+    # Telegram caps inline keyboards at 100 buttons, so long protocols are split into pages.
+    page_size = page_size or settings.bot_items_per_page
+    pages = max(1, -(-len(items) // page_size))
+    page = min(max(page, 0), pages - 1)
     buttons = []
-    for item_id, title, checked in items:
-        label = f"✅ {title}" if checked else title
-        buttons.append([InlineKeyboardButton(text=label, callback_data=f"t:{protocol_id}:{item_id}")])
+    for item_id, title, checked in items[page * page_size : (page + 1) * page_size]:
+        label = _item_label(title, checked)
+        buttons.append([InlineKeyboardButton(text=label, callback_data=encode_toggle(protocol_id, item_id, version))])
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="‹", callback_data=encode_page(protocol_id, page - 1, version)))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=encode_page(protocol_id, page, version)))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(text="›", callback_data=encode_page(protocol_id, page + 1, version)))
+        buttons.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def cached_items_keyboard(
+    items: Sequence[tuple[int, str]],
+    protocol_id: int,
+    version: int,
+    checked: set[int] | frozenset[int] = frozenset(),
+    page: int = 0,
+) -> InlineKeyboardMarkup:
+    # The unchecked keyboard is rendered once per (protocol, version, page) and shared by every
+    # user; a run's checked items are laid over a copy only when there are any.
+    key = (protocol_id, version, "keyboard", page)
+    markup = protocol_content.get(key)
+    if markup is None:
+        markup = items_keyboard([(item_id, title, False) for item_id, title in items], protocol_id, version, page)
+        protocol_content.set(key, markup)
+    if not checked:
+        return markup
+    return rerender_items_keyboard(markup, checked)
+
+
+def rerender_items_keyboard(markup: InlineKeyboardMarkup, checked: set[int]) -> InlineKeyboardMarkup:
+    # Rebuilds an items keyboard from the one already on the message: ids and titles come from the
+    # buttons, so only the checked flags need to be known.
+    rows = []
+    for row in markup.inline_keyboard:
+        buttons = []
+        for button in row:
+            data = button.callback_data or ""
+            if data.startswith("c:"):
+                _, item_id, _ = decode_toggle(data)
+                title = button.text.removeprefix(CHECK_MARK)
+                button = InlineKeyboardButton(text=_item_label(title, item_id in checked), callback_data=data)
+            buttons.append(button)
+        rows.append(buttons)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 def _with_user_id(url: str, user_id: int) -> str:
     parsed = urlparse(url)
     query = parse_qs(parsed.query)
@@ -12,11 +12,34 @@ if str(BACKEND) not in sys.path:
 from aiogram import Bot, Dispatcher
 
 from app.core.config import settings
-from bot.handlers import router
+from app.core.db import shards
+from app.core.profiling import loop_monitor
+from app.core.ratelimit import RateLimitRule, rate_limiter
+from app.core.tracing import tracer
+from bot.concurrency import KeyedTaskPool, OrderedUpdateMiddleware
+from bot.edits import edit_scheduler
+from bot.handlers import router, run_store
+from bot.middlewares import (
+    DeduplicateUpdatesMiddleware,
+    ProfilingMiddleware,
+    RateLimitMiddleware,
+    TracingMiddleware,
+)
+from bot.reminders import ReminderScheduler, ReminderSender
+from bot.webhook import run_webhook
 
 
-def create_dispatcher() -> Dispatcher:
+def create_dispatcher(pool: KeyedTaskPool | None = None) -> Dispatcher:
     dp = Dispatcher()
+    dp.update.outer_middleware(DeduplicateUpdatesMiddleware())
+    if pool is not None:
+        dp.update.outer_middleware(OrderedUpdateMiddleware(pool))
+    dp.update.outer_middleware(ProfilingMiddleware())
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.message.outer_middleware(RateLimitMiddleware(rate_limiter))
+    dp.callback_query.outer_middleware(RateLimitMiddleware(rate_limiter))
+    dp.message.middleware(TracingMiddleware())
+    dp.callback_query.middleware(TracingMiddleware())
     dp.include_router(router)
     return dp
 
@@ -25,8 +48,48 @@ async def main() -> None:
     if not settings.bot_token:
         raise RuntimeError("BOT_TOKEN is required")
     bot = Bot(settings.bot_token)
-    dp = create_dispatcher()
-    await dp.start_polling(bot)
+    pool = None
+    if settings.bot_workers > 0:
+        pool = KeyedTaskPool(workers=settings.bot_workers, max_pending=settings.bot_max_pending)
+        pool.start()
+    dp = create_dispatcher(pool)
+    if settings.loop_lag_threshold_ms > 0:
+        loop_monitor.start()
+    schedulers = []
+    if settings.reminders_enabled:
+        # Run reminders in exactly one bot process; set REMINDERS_ENABLED=0 on other replicas.
+        sender = ReminderSender(
+            bot,
+            shards,
+            run_store,
+            concurrency=settings.reminder_concurrency,
+            rule=RateLimitRule(
+                per_minute=settings.reminder_sends_per_second * 60, burst=settings.reminder_sends_per_second
+            ),
+        )
+        # One scheduler per shard; they share the sender and so its send rate.
+        schedulers = [
+            ReminderScheduler(sessionmaker, sender, reload_interval=settings.reminder_reload_seconds)
+            for sessionmaker in shards.sessionmakers
+        ]
+        for scheduler in schedulers:
+            scheduler.start()
+    try:
+        if settings.bot_mode == "webhook":
+            await run_webhook(dp, bot, pooled=pool is not None)
+        else:
+            # With the keyed pool handling concurrency, polling itself can stay sequential.
+            await dp.start_polling(bot, handle_as_tasks=pool is None)
+    finally:
+        for scheduler in schedulers:
+            await scheduler.stop()
+        if pool is not None:
+            await pool.stop(drain=True)
+        await loop_monitor.stop()
+        await edit_scheduler.flush()
+        await run_store.close()
+        await bot.session.close()
+        await asyncio.to_thread(tracer.close)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from app.core.profiling import ProfileTrigger, profile_trigger
+from app.core.ratelimit import RateLimiter
+from app.core.tracing import Tracer, tracer
+from app.storage.cache import LRUSet
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    def __init__(self, limiter: RateLimiter, route_class: str = "bot") -> None:
+        self.limiter = limiter
+        self.route_class = route_class
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        wait = await self.limiter.check(self.route_class, f"user:{user.id}")
+        if wait <= 0:
+            return await handler(event, data)
+        if isinstance(event, CallbackQuery):
+            await event.answer(f"Too many taps, try again in {max(1, round(wait))} s")
+        return None
+
+
+class DeduplicateUpdatesMiddleware(BaseMiddleware):
+    # Telegram redelivers webhook updates it did not see acknowledged; drop ones already taken.
+    # The set is per process, which is why webhook mode runs as a single replica.
+    def __init__(self, max_size: int = 10_000) -> None:
+        self.seen = LRUSet(max_size)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            if event.update_id in self.seen:
+                return None
+            self.seen.add(event.update_id)
+        return await handler(event, data)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    # Profiles a PROFILE_SAMPLE_RATE share of updates. Registered after the ordering middleware so
+    # it runs inside the worker task that handles the update.
+    def __init__(self, trigger: ProfileTrigger = profile_trigger) -> None:
+        self.trigger = trigger
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update) or not self.trigger.sampled():
+            return await handler(event, data)
+        profile = self.trigger.begin(f"update-{event.update_id}-{event.event_type}")
+        try:
+            return await handler(event, data)
+        finally:
+            await self.trigger.finish(profile)
+
+
+class TracingMiddleware(BaseMiddleware):
+    # As an outer update middleware it opens the update's root span; as an inner middleware it adds
+    # a span named after the handler that matched.
+    def __init__(self, tracer: Tracer = tracer) -> None:
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if self.tracer.exporter is None:
+            return await handler(event, data)
+        if isinstance(event, Update):
+            user = data.get("event_from_user")
+            attributes = {"bot.update_id": event.update_id, "bot.user_id": user.id if user is not None else None}
+            name = f"bot {event.event_type}"
+        else:
+            callback = getattr(data.get("handler"), "callback", None)
+            attributes = {}
+            name = f"handler {getattr(callback, '__name__', type(event).__name__)}"
+        with self.tracer.span(name, **attributes):
+            return await handler(event, data)
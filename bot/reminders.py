@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.db import ShardRouter
+from app.core.ratelimit import InMemoryRateLimitBackend, RateLimitRule
+from app.services.items import ItemService
+from app.services.protocols import ProtocolService
+from app.services.runs import RunStateStore
+from app.services.schedules import next_occurrence
+from app.storage.repositories import ScheduleRepository
+from bot.keyboards import cached_items_keyboard
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back naive; they are stored in UTC.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class ScheduleEntry:
+    id: int
+    user_id: int
+    protocol_id: int
+    minute_of_day: int
+    weekdays: int
+    timezone: str
+    revision: datetime
+
+    @classmethod
+    def from_row(cls, row) -> "ScheduleEntry":
+        return cls(
+            id=row.id,
+            user_id=row.user_id,
+            protocol_id=row.protocol_id,
+            minute_of_day=row.minute_of_day,
+            weekdays=row.weekdays,
+            timezone=row.timezone,
+            revision=_as_utc(row.updated_at),
+        )
+
+    def next_after(self, moment: datetime) -> datetime | None:
+        return next_occurrence(self.minute_of_day, self.weekdays, self.timezone, moment)
+
+
+# Sends due reminders concurrently under a global send rate, backing off on retry_after.
+class ReminderSender:
+    def __init__(
+        self,
+        bot: Bot,
+        shards: ShardRouter,
+        run_store: RunStateStore,
+        concurrency: int = 8,
+        rule: RateLimitRule = RateLimitRule(per_minute=20 * 60, burst=20),
+        max_attempts: int = 3,
+    ) -> None:
+        self.bot = bot
+        self.shards = shards
+        self.run_store = run_store
+        self.rule = rule
+        self.max_attempts = max_attempts
+        self._slots = asyncio.Semaphore(concurrency)
+        self._buckets = InMemoryRateLimitBackend()
+        self._tasks: set[asyncio.Task] = set()
+        self._paused_until = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, entry: ScheduleEntry) -> None:
+        task = asyncio.create_task(self._send(entry))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "skipped": self.skipped, "failed": self.failed, "pending": len(self._tasks)}
+
+    async def _send(self, entry: ScheduleEntry) -> None:
+        async with self._slots:
+            try:
+                await self._deliver(entry)
+            except Exception:  # noqa: BLE001
+                self.failed += 1
+                logger.exception("Reminder %s failed", entry.id)
+
+    async def _deliver(self, entry: ScheduleEntry) -> None:
+        async with self.shards.session_for_user(entry.user_id) as session:
+            # Heap entries are hints; the row decides whether the reminder still applies. A user moved
+            # to another shard has their schedules under new ids there, so the old entry finds nothing.
+            schedule = await ScheduleRepository(session).get(entry.id)
+            if schedule is None or not schedule.enabled or _as_utc(schedule.updated_at) != entry.revision:
+                self.skipped += 1
+                return
+            protocol = await ProtocolService(session).get(entry.protocol_id)
+            if protocol is None:
+                self.skipped += 1
+                return
+            items = await ItemService(session).titles(protocol.id, protocol.version)
+            title, version = protocol.title, protocol.version
+        if not items:
+            self.skipped += 1
+            return
+        await self.run_store.start_run(entry.user_id, entry.protocol_id, [item_id for item_id, _ in items])
+        markup = cached_items_keyboard(items, entry.protocol_id, version)
+        line = "━" * 26
+        for attempt in range(1, self.max_attempts + 1):
+            await self._wait_for_capacity()
+            try:
+                await self.bot.send_message(entry.user_id, f"{line}\n{title}\n{line}", reply_markup=markup)
+            except TelegramRetryAfter as exc:
+                self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+                if attempt == self.max_attempts:
+                    raise
+                continue
+            except TelegramForbiddenError:
+                # The user blocked the bot; nothing to retry.
+                self.skipped += 1
+                return
+            self.sent += 1
+            return
+
+    async def _wait_for_capacity(self) -> None:
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = await self._buckets.acquire("reminders", self.rule)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+# Keeps one heap entry per enabled schedule of one shard: its next occurrence. Changes are picked up
+# by polling updated_at; superseded heap entries are skipped lazily when they surface.
+class ReminderScheduler:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        sender: ReminderSender,
+        clock: Callable[[], datetime] = _utcnow,
+        reload_interval: float = 30,
+        batch_size: int = 1000,
+        reload_overlap: timedelta = timedelta(seconds=5),
+    ) -> None:
+        self.session_factory = session_factory
+        self.sender = sender
+        self.clock = clock
+        self.reload_interval = reload_interval
+        self.batch_size = batch_size
+        # Re-read a few seconds before the watermark: a transaction that commits late can carry
+        # an updated_at older than rows already seen.
+        self.reload_overlap = reload_overlap
+        self._heap: list[tuple[datetime, int, datetime]] = []
+        self._entries: dict[int, ScheduleEntry] = {}
+        self._watermark: datetime | None = None
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self) -> None:
+        started = self.clock()
+        self._heap.clear()
+        self._entries.clear()
+        after_id = 0
+        while True:
+            async with self.session_factory() as session:
+                rows = await ScheduleRepository(session).list_enabled(after_id, self.batch_size)
+            for row in rows:
+                self._track(ScheduleEntry.from_row(row), started)
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1].id
+        heapq.heapify(self._heap)
+        self._watermark = started
+
+    async def reload(self) -> int:
+        if self._watermark is None:
+            await self.load()
+            return len(self._entries)
+        now = self.clock()
+        # A schedule saved moments ago should still fire for a time that has just passed, so
+        # recently changed entries count from their save time, bounded by one reload period.
+        earliest = now - timedelta(seconds=self.reload_interval) - self.reload_overlap
+        changed = 0
+        since, after_id = self._watermark - self.reload_overlap, 0
+        while True:
+            async with self.session_factory() as session:
+                rows = await ScheduleRepository(session).changed_since(since, after_id, self.batch_size)
+            for row, active in rows:
+                entry = ScheduleEntry.from_row(row)
+                current = self._entries.get(row.id)
+                if current is None or current.revision != entry.revision:
+                    changed += 1
+                    if active:
+                        self._track(entry, max(min(entry.revision, now), earliest), push=True)
+                    else:
+                        self._entries.pop(row.id, None)
+                if entry.revision > self._watermark:
+                    self._watermark = entry.revision
+            if len(rows) < self.batch_size:
+                break
+            last = rows[-1][0]
+            since, after_id = _as_utc(last.updated_at), last.id
+        return changed
+
+    async def tick(self) -> int:
+        # Dispatches every entry due at or before now and queues each schedule's next occurrence.
+        now = self.clock()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, schedule_id, revision = heapq.heappop(self._heap)
+            entry = self._entries.get(schedule_id)
+            if entry is None or entry.revision != revision:
+                continue
+            self.sender.submit(entry)
+            fired += 1
+            # Counting from now rather than `due` avoids a burst of catch-up sends after a stall.
+            following = entry.next_after(max(due, now))
+            if following is not None:
+                heapq.heappush(self._heap, (following, entry.id, entry.revision))
+        self.fired += fired
+        return fired
+
+    def next_due(self) -> datetime | None:
+        while self._heap:
+            _, schedule_id, revision = self._heap[0]
+            entry = self._entries.get(schedule_id)
+            if entry is not None and entry.revision == revision:
+                return self._heap[0][0]
+            heapq.heappop(self._heap)
+        return None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.sender.flush()
+
+    def _track(self, entry: ScheduleEntry, after: datetime, push: bool = False) -> None:
+        due = entry.next_after(after)
+        self._entries[entry.id] = entry
+        if due is None:
+            return
+        if push:
+            heapq.heappush(self._heap, (due, entry.id, entry.revision))
+        else:
+            self._heap.append((due, entry.id, entry.revision))
+
+    async def _run(self) -> None:
+        # The first reload is the full load; like every later pass it is retried after a failure,
+        # so a database that is down at startup only delays reminders.
+        next_reload = self.clock()
+        while not self._stopping.is_set():
+            try:
+                if self.clock() >= next_reload:
+                    next_reload = self.clock() + timedelta(seconds=self.reload_interval)
+                    await self.reload()
+                await self.tick()
+            except Exception:  # noqa: BLE001
+                logger.exception("Reminder scheduler pass failed")
+            wake_at = next_reload
+            due = self.next_due()
+            if due is not None:
+                wake_at = min(wake_at, due)
+            timeout = max(0.0, (wake_at - self.clock()).total_seconds())
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
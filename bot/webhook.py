@@ -0,0 +1,69 @@
+import asyncio
+import contextlib
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, *, secret_token: str, path: str, pooled: bool) -> web.Application:
+    app = web.Application()
+    # With the keyed pool in front of the handlers, feeding an update only enqueues it, so the
+    # request is acknowledged quickly while still applying the pool's backpressure. Without the
+    # pool, aiogram's own background tasks keep the acknowledgement fast.
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token or None,
+        handle_in_background=not pooled,
+    ).register(app, path=path)
+    app.router.add_get("/healthz", _healthz)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def ensure_webhook(bot: Bot, dp: Dispatcher, url: str, secret_token: str) -> None:
+    # Runs on every startup. setWebhook is idempotent, and getWebhookInfo does not
+    # report the secret, so always setting it is the only way a rotated WEBHOOK_SECRET (or a new
+    # handler's update type) reaches Telegram.
+    await bot.set_webhook(
+        url,
+        secret_token=secret_token or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False,
+    )
+    logger.info("Webhook set to %s", url)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, *, pooled: bool) -> None:
+    if not settings.webhook_base_url:
+        raise RuntimeError("WEBHOOK_BASE_URL is required in webhook mode")
+    if not settings.webhook_secret:
+        raise RuntimeError("WEBHOOK_SECRET is required in webhook mode")
+    path = settings.webhook_path
+    app = create_webhook_app(dp, bot, secret_token=settings.webhook_secret, path=path, pooled=pooled)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+    try:
+        # The webhook is never deleted on shutdown: during a deploy the replacement process serves it.
+        await ensure_webhook(bot, dp, settings.webhook_base_url.rstrip("/") + path, settings.webhook_secret)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+    finally:
+        await runner.cleanup()
@@ -15,6 +15,11 @@ export const API_BASE =
 
 export type Protocol = { id: number; title: string; order_index: number };
 export type Item = { id: number; title: string; order_index: number };
+export type ProtocolOverview = Protocol & {
+  item_count: number;
+  checked_count: number;
+  last_activity_at: string | null;
+};
 
 export function getUserId(): number {
   const params = new URLSearchParams(window.location.search);
@@ -26,23 +31,84 @@ export function getUserId(): number {
   return tg?.initDataUnsafe?.user?.id ?? 123;
 }
 
-export async function fetchProtocols(userId: number): Promise<Protocol[]> {
-  const res = await fetch(`${API_BASE}/protocols/?user_id=${userId}`);
+// Requests authenticate with a short-lived session token obtained from Telegram's signed initData;
+// outside Telegram (local dev with AUTH_DEV_LOGIN on the backend) the user_id fallback is sent instead.
+let sessionToken: Promise<string> | null = null;
+
+async function login(): Promise<string> {
+  const initData: string | undefined = (window as any).Telegram?.WebApp?.initData;
+  const res = await fetch(`${API_BASE}/auth/session`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(initData ? { init_data: initData } : { user_id: getUserId() })
+  });
+  if (!res.ok) throw new Error("Failed to sign in");
+  const data = await res.json();
+  return data.token as string;
+}
+
+function session(): Promise<string> {
+  if (!sessionToken) {
+    sessionToken = login().catch((err) => {
+      sessionToken = null;
+      throw err;
+    });
+  }
+  return sessionToken;
+}
+
+// Signs in on first use and once more when the server rejects an expired token.
+async function authFetch(url: string, init: RequestInit = {}): Promise<Response> {
+  for (let attempt = 1; ; attempt++) {
+    const token = await session();
+    const headers = new Headers(init.headers);
+    headers.set("Authorization", `Bearer ${token}`);
+    const res = await fetch(url, { ...init, headers });
+    if (res.status !== 401 || attempt >= 2) return res;
+    // Concurrent requests share one re-login: only drop the token if nobody has replaced it yet.
+    if ((await sessionToken?.catch(() => null)) === token) sessionToken = null;
+  }
+}
+
+// Create-style POSTs carry one Idempotency-Key across retries, so a request whose response was
+// lost on a flaky connection is replayed by the server instead of creating a duplicate.
+async function createRequest(url: string, init: RequestInit, attempts = 3): Promise<Response> {
+  const headers = new Headers(init.headers);
+  headers.set("Idempotency-Key", crypto.randomUUID());
+  for (let attempt = 1; ; attempt++) {
+    try {
+      const res = await authFetch(url, { ...init, headers });
+      if (res.status < 500 || attempt >= attempts) return res;
+    } catch (err) {
+      if (attempt >= attempts) throw err;
+    }
+    await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+  }
+}
+
+export async function fetchProtocols(): Promise<Protocol[]> {
+  const res = await authFetch(`${API_BASE}/protocols/`);
+  if (!res.ok) throw new Error("Failed to load protocols");
+  return res.json();
+}
+
+export async function fetchProtocolOverview(): Promise<ProtocolOverview[]> {
+  const res = await authFetch(`${API_BASE}/protocols/overview`);
   if (!res.ok) throw new Error("Failed to load protocols");
   return res.json();
 }
 
 export async function fetchItems(protocolId: number): Promise<Item[]> {
-  const res = await fetch(`${API_BASE}/protocols/${protocolId}/items`);
+  const res = await authFetch(`${API_BASE}/protocols/${protocolId}/items`);
   if (!res.ok) throw new Error("Failed to load items");
   return res.json();
 }
 
 export async function createProtocol(title: string): Promise<Protocol> {
-  const res = await fetch(`${API_BASE}/protocols/`, {
+  const res = await createRequest(`${API_BASE}/protocols/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ user_id: getUserId(), title })
+    body: JSON.stringify({ title })
   });
   if (!res.ok) throw new Error("Failed to create protocol");
   return res.json();
@@ -52,10 +118,10 @@ export async function quickCreateProtocol(text: string): Promise<{
   protocol: Protocol;
   items: Item[];
 }> {
-  const res = await fetch(`${API_BASE}/protocols/quick-create`, {
+  const res = await createRequest(`${API_BASE}/protocols/quick-create`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ user_id: getUserId(), text })
+    body: JSON.stringify({ text })
   });
   if (!res.ok) {
     const detail = await res.json().catch(() => ({}));
@@ -64,8 +130,51 @@ export async function quickCreateProtocol(text: string): Promise<{
   return res.json();
 }
 
+export type FromAudioEvent =
+  | { event: "transcribed"; text: string }
+  | { event: "parsed"; title: string; items: string[] }
+  | { event: "created"; protocol: Protocol; items: Item[] }
+  | { event: "error"; status: number; detail: unknown };
+
+export async function createProtocolFromAudio(
+  file: Blob,
+  onEvent: (event: FromAudioEvent) => void
+): Promise<{ protocol: Protocol; items: Item[] }> {
+  const form = new FormData();
+  form.append("file", file, "audio.webm");
+  const res = await createRequest(`${API_BASE}/protocols/from-audio`, { method: "POST", body: form });
+  if (!res.ok || !res.body) {
+    const detail = await res.json().catch(() => ({}));
+    throw new Error(detail?.detail || "Failed to create protocol from audio");
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let created: { protocol: Protocol; items: Item[] } | null = null;
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (value) buffer += decoder.decode(value, { stream: !done });
+    let newline = buffer.indexOf("\n");
+    while (newline >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      newline = buffer.indexOf("\n");
+      if (!line) continue;
+      const event = JSON.parse(line) as FromAudioEvent;
+      onEvent(event);
+      if (event.event === "error") {
+        throw new Error(typeof event.detail === "string" ? event.detail : "Failed to create protocol from audio");
+      }
+      if (event.event === "created") created = { protocol: event.protocol, items: event.items };
+    }
+    if (done) break;
+  }
+  if (!created) throw new Error("Failed to create protocol from audio");
+  return created;
+}
+
 export async function renameProtocol(id: number, title: string): Promise<void> {
-  const res = await fetch(`${API_BASE}/protocols/${id}`, {
+  const res = await authFetch(`${API_BASE}/protocols/${id}`, {
     method: "PATCH",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ title })
@@ -74,12 +183,45 @@ export async function renameProtocol(id: number, title: string): Promise<void> {
 }
 
 export async function deleteProtocol(id: number): Promise<void> {
-  const res = await fetch(`${API_BASE}/protocols/${id}`, { method: "DELETE" });
+  const res = await authFetch(`${API_BASE}/protocols/${id}`, { method: "DELETE" });
   if (!res.ok) throw new Error("Failed to delete protocol");
 }
 
+export async function cloneProtocol(id: number, title?: string): Promise<Protocol> {
+  const res = await createRequest(`${API_BASE}/protocols/${id}/clone`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ title })
+  });
+  if (!res.ok) throw new Error("Failed to duplicate protocol");
+  return res.json();
+}
+
+export type Template = { id: number; title: string; item_count: number };
+
+export async function fetchTemplates(): Promise<Template[]> {
+  const res = await authFetch(`${API_BASE}/templates/`);
+  if (!res.ok) throw new Error("Failed to load templates");
+  return res.json();
+}
+
+export async function instantiateTemplate(id: number, title?: string): Promise<Protocol> {
+  const res = await createRequest(`${API_BASE}/templates/${id}/instantiate`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ title })
+  });
+  if (!res.ok) throw new Error("Failed to create protocol from template");
+  return res.json();
+}
+
+export async function restoreProtocol(id: number): Promise<void> {
+  const res = await authFetch(`${API_BASE}/protocols/${id}/restore`, { method: "POST" });
+  if (!res.ok) throw new Error("Failed to restore protocol");
+}
+
 export async function reorderProtocols(orderedIds: number[]): Promise<void> {
-  const res = await fetch(`${API_BASE}/protocols/reorder`, {
+  const res = await authFetch(`${API_BASE}/protocols/reorder`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ ordered_ids: orderedIds })
@@ -88,7 +230,7 @@ export async function reorderProtocols(orderedIds: number[]): Promise<void> {
 }
 
 export async function createItem(protocolId: number, title: string): Promise<Item> {
-  const res = await fetch(`${API_BASE}/protocols/${protocolId}/items`, {
+  const res = await createRequest(`${API_BASE}/protocols/${protocolId}/items`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ title })
@@ -98,7 +240,7 @@ export async function createItem(protocolId: number, title: string): Promise<Ite
 }
 
 export async function quickCreateItems(protocolId: number, text: string): Promise<Item[]> {
-  const res = await fetch(`${API_BASE}/protocols/${protocolId}/items/quick-create`, {
+  const res = await createRequest(`${API_BASE}/protocols/${protocolId}/items/quick-create`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ text })
@@ -114,7 +256,7 @@ export async function quickCreateItems(protocolId: number, text: string): Promis
 export async function transcribeAudio(file: Blob): Promise<string> {
   const form = new FormData();
   form.append("file", file, "audio.webm");
-  const res = await fetch(`${API_BASE}/audio/transcribe`, { method: "POST", body: form });
+  const res = await authFetch(`${API_BASE}/audio/transcribe`, { method: "POST", body: form });
   if (!res.ok) {
     const detail = await res.json().catch(() => ({}));
     throw new Error(detail?.detail || "Failed to transcribe audio");
@@ -124,7 +266,7 @@ export async function transcribeAudio(file: Blob): Promise<string> {
 }
 
 export async function renameItem(id: number, title: string): Promise<void> {
-  const res = await fetch(`${API_BASE}/items/${id}`, {
+  const res = await authFetch(`${API_BASE}/items/${id}`, {
     method: "PATCH",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ title })
@@ -133,15 +275,64 @@ export async function renameItem(id: number, title: string): Promise<void> {
 }
 
 export async function deleteItem(id: number): Promise<void> {
-  const res = await fetch(`${API_BASE}/items/${id}`, { method: "DELETE" });
+  const res = await authFetch(`${API_BASE}/items/${id}`, { method: "DELETE" });
   if (!res.ok) throw new Error("Failed to delete item");
 }
 
 export async function reorderItems(orderedIds: number[]): Promise<void> {
-  const res = await fetch(`${API_BASE}/items/reorder`, {
+  const res = await authFetch(`${API_BASE}/items/reorder`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ ordered_ids: orderedIds })
   });
   if (!res.ok) throw new Error("Failed to reorder items");
 }
+
+export type Schedule = {
+  id: number;
+  protocol_id: number;
+  time: string;
+  weekdays: number[];
+  timezone: string;
+  enabled: boolean;
+  next_run_at: string | null;
+};
+
+export async function fetchSchedules(protocolId: number): Promise<Schedule[]> {
+  const res = await authFetch(`${API_BASE}/protocols/${protocolId}/schedules`);
+  if (!res.ok) throw new Error("Failed to load reminders");
+  return res.json();
+}
+
+export async function createSchedule(
+  protocolId: number,
+  time: string,
+  weekdays: number[],
+  timezone = Intl.DateTimeFormat().resolvedOptions().timeZone
+): Promise<Schedule> {
+  const res = await createRequest(`${API_BASE}/protocols/${protocolId}/schedules`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ time, weekdays, timezone })
+  });
+  if (!res.ok) throw new Error("Failed to create reminder");
+  return res.json();
+}
+
+export async function updateSchedule(
+  id: number,
+  changes: Partial<Pick<Schedule, "time" | "weekdays" | "timezone" | "enabled">>
+): Promise<Schedule> {
+  const res = await authFetch(`${API_BASE}/schedules/${id}`, {
+    method: "PATCH",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(changes)
+  });
+  if (!res.ok) throw new Error("Failed to update reminder");
+  return res.json();
+}
+
+export async function deleteSchedule(id: number): Promise<void> {
+  const res = await authFetch(`${API_BASE}/schedules/${id}`, { method: "DELETE" });
+  if (!res.ok) throw new Error("Failed to delete reminder");
+}
@@ -1,13 +1,15 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import {
+  createProtocolFromAudio,
+  cloneProtocol,
   deleteProtocol,
-  fetchProtocols,
-  getUserId,
+  restoreProtocol,
+  fetchProtocolOverview,
   Protocol,
+  ProtocolOverview,
   quickCreateProtocol,
   renameProtocol,
-  reorderProtocols,
-  transcribeAudio
+  reorderProtocols
 } from "../api/client";
 import {
   DndContext,
@@ -29,11 +31,13 @@ function SortableRow({
   protocol,
   onOpen,
   onDelete,
+  onDuplicate,
   onRename
 }: {
-  protocol: Protocol;
+  protocol: Protocol & Partial<ProtocolOverview>;
   onOpen: (id: number) => void;
   onDelete: (id: number) => void;
+  onDuplicate: (id: number) => void;
   onRename: (id: number, title: string) => void;
 }) {
   const { attributes, listeners, setNodeRef, transform, transition } = useSortable({
@@ -53,6 +57,11 @@ function SortableRow({
       <button className="title-button list-title" onClick={() => onOpen(protocol.id)}>
         {protocol.title}
       </button>
+      {protocol.item_count !== undefined && protocol.item_count > 0 && (
+        <span className="subtle">
+          {protocol.checked_count ?? 0}/{protocol.item_count}
+        </span>
+      )}
       <div className="inline-actions">
         <button
           className="icon-action"
@@ -69,6 +78,14 @@ function SortableRow({
             />
           </svg>
         </button>
+        <button className="icon-action" onClick={() => onDuplicate(protocol.id)} aria-label="Duplicate protocol">
+          <svg viewBox="0 0 24 24" aria-hidden="true">
+            <path
+              d="M8 8h11v13H8V8Zm2 2v9h7v-9h-7ZM5 3h11v3h-2V5H7v11h1v2H5V3Z"
+              fill="currentColor"
+            />
+          </svg>
+        </button>
         <button className="icon-action danger" onClick={() => onDelete(protocol.id)} aria-label="Delete protocol">
           <svg viewBox="0 0 24 24" aria-hidden="true">
             <path
@@ -83,10 +100,11 @@ function SortableRow({
 }
 
 export default function Protocols({ onOpen }: { onOpen: (id: number) => void }) {
-  const [protocols, setProtocols] = useState<Protocol[]>([]);
+  const [protocols, setProtocols] = useState<(Protocol & Partial<ProtocolOverview>)[]>([]);
   const [error, setError] = useState<string | null>(null);
   const [saving, setSaving] = useState<string | null>(null);
   const [input, setInput] = useState("");
+  const [deleted, setDeleted] = useState<(Protocol & Partial<ProtocolOverview>) | null>(null);
   const [recording, setRecording] = useState(false);
   const recorderRef = useRef<MediaRecorder | null>(null);
   const chunksRef = useRef<BlobPart[]>([]);
@@ -98,7 +116,7 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
   const ids = useMemo(() => protocols.map((p) => p.id), [protocols]);
 
   useEffect(() => {
-    fetchProtocols(getUserId())
+    fetchProtocolOverview()
       .then(setProtocols)
       .catch((err) => setError(err.message));
   }, []);
@@ -138,12 +156,20 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
       stream.getTracks().forEach((t) => t.stop());
       setRecording(false);
       const blob = new Blob(chunksRef.current, { type: "audio/webm" });
+      setSaving("Transcribing...");
       try {
-        const text = await transcribeAudio(blob);
-        setInput(text);
-        await handleAdd(text);
+        const created = await createProtocolFromAudio(blob, (event) => {
+          if (event.event === "transcribed") {
+            setInput(event.text);
+            setSaving("Saving...");
+          }
+        });
+        setProtocols((prev) => [...prev, created.protocol]);
+        setInput("");
       } catch (err: any) {
         setError(err.message);
+      } finally {
+        setSaving(null);
       }
     };
     setRecording(true);
@@ -155,6 +181,7 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
     setSaving("Saving...");
     try {
       await deleteProtocol(id);
+      setDeleted(protocols.find((p) => p.id === id) ?? null);
       setProtocols((prev) => prev.filter((p) => p.id !== id));
     } catch (err: any) {
       setError(err.message);
@@ -163,6 +190,36 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
     }
   }
 
+  async function handleDuplicate(id: number) {
+    const source = protocols.find((p) => p.id === id);
+    if (!source) return;
+    const title = window.prompt("Name of the copy", `${source.title} (copy)`);
+    if (!title) return;
+    setSaving("Saving...");
+    try {
+      const created = await cloneProtocol(id, title);
+      setProtocols((prev) => [...prev, { ...created, item_count: source.item_count, checked_count: 0 }]);
+    } catch (err: any) {
+      setError(err.message);
+    } finally {
+      setSaving(null);
+    }
+  }
+
+  async function handleUndoDelete() {
+    if (!deleted) return;
+    setSaving("Saving...");
+    try {
+      await restoreProtocol(deleted.id);
+      setProtocols((prev) => [...prev, deleted].sort((a, b) => a.order_index - b.order_index));
+      setDeleted(null);
+    } catch (err: any) {
+      setError(err.message);
+    } finally {
+      setSaving(null);
+    }
+  }
+
   async function handleRename(id: number, title: string) {
     setSaving("Saving...");
     try {
@@ -190,7 +247,7 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
       await reorderProtocols(next.map((p) => p.id));
     } catch (err: any) {
       setError(err.message);
-      const fresh = await fetchProtocols(getUserId());
+      const fresh = await fetchProtocolOverview();
       setProtocols(fresh);
     }
   }
@@ -225,6 +282,11 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
         </div>
         <div className="row">
           {saving && <div className="status">{saving}</div>}
+          {deleted && !saving && (
+            <button className="icon-action" onClick={handleUndoDelete}>
+              Undo delete
+            </button>
+          )}
         </div>
         {error && <p style={{ color: "var(--danger)" }}>{error}</p>}
         <DndContext sensors={sensors} collisionDetection={closestCenter} onDragEnd={handleDragEnd}>
@@ -236,6 +298,7 @@ export default function Protocols({ onOpen }: { onOpen: (id: number) => void })
                 protocol={p}
                 onOpen={onOpen}
                 onDelete={handleDelete}
+                onDuplicate={handleDuplicate}
                 onRename={handleRename}
               />
             ))}